@@ -1,90 +1,291 @@
 import streamlit as st
-import json
-import os
+from concurrent.futures import ThreadPoolExecutor
 from database import Database
-import threading
-import time
+from control import notify_bot
+from feed_import import parse_feed_list, import_feeds, export_opml, export_csv
+from scheduler import circuit_open
+from config import APP_PAGE_SIZE, APP_CACHE_TTL, SEARCH_PAGE_SIZE
 import asyncio
 
-# Initialize database
-db = Database()
-
 # Page config
 st.set_page_config(page_title="RSS Feed Manager", page_icon="📡", layout="wide")
 
+@st.cache_resource
+def get_database():
+    """One Database for all sessions (tables are created once; connections are per thread)"""
+    return Database()
+
+@st.cache_data(ttl=APP_CACHE_TTL, show_spinner=False)
+def load_feeds(query, page):
+    """One page of feeds matching query; cleared whenever the app changes a feed"""
+    return get_database().search_feeds(query, APP_PAGE_SIZE, page * APP_PAGE_SIZE)
+
+@st.cache_data(ttl=APP_CACHE_TTL, show_spinner=False)
+def load_history(query, page):
+    """One page of delivered posts matching query (only that page is queried)"""
+    return get_database().search_history(query, limit=SEARCH_PAGE_SIZE * 2, offset=page * SEARCH_PAGE_SIZE * 2)
+
+# Initialize database
+db = get_database()
+
+if 'page' not in st.session_state:
+    st.session_state.page = 0
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
+if 'removed' not in st.session_state:
+    st.session_state.removed = set()
+
+def reset_page():
+    st.session_state.page = 0
+
+def change_page(step):
+    st.session_state.page = max(0, st.session_state.page + step)
+
+def reset_history_page():
+    st.session_state.history_page = 0
+
+def change_history_page(step):
+    st.session_state.history_page = max(0, st.session_state.history_page + step)
+
 st.title("📡 RSS Feed Manager")
 st.markdown("---")
 
-# Function to trigger channel creation
-def trigger_channel_creation(feed_id, channel_name):
-    """Signal the bot to create a channel for new feed"""
-    try:
-        # Create a flag file that the bot will monitor
-        flag_file = f"create_channel_{feed_id}. flag"
-        with open(flag_file, 'w') as f:
-            f.write(channel_name)
-        return True
-    except Exception as e:
-        print(f"Error creating flag: {e}")
-        return False
-
 # Add RSS Feed Section
-st.header("Add New RSS Feed")
-
-col1, col2 = st. columns([3, 1])
-
-with col1:
-    rss_url = st.text_input("RSS Feed URL", placeholder="https://example.com/feed. rss")
-
-with col2:
-    st.write("")
-    st.write("")
-    add_button = st.button("➕ Add Feed", use_container_width=True)
-
-if add_button:
-    if rss_url:
-        result = db.add_feed(rss_url)
-        if result['success']:
-            # Trigger immediate channel creation
-            trigger_channel_creation(result['feed_id'], result['channel_name'])
-            st.success(f"✅ Feed added successfully! Creating channel: {result['channel_name']}")
-            time.sleep(1)
-            st.rerun()
+@st.fragment
+def add_feed_form():
+    st.header("Add New RSS Feed")
+
+    col1, col2 = st. columns([3, 1])
+
+    with col1:
+        rss_url = st.text_input("RSS Feed URL", placeholder="https://example.com/feed. rss")
+        guild_input = st.text_input("Discord Server ID (optional)", placeholder="Default server")
+
+    with col2:
+        st.write("")
+        st.write("")
+        add_button = st.button("➕ Add Feed", use_container_width=True)
+
+    if add_button:
+        if rss_url and guild_input and not guild_input.strip().isdigit():
+            st.warning("⚠️ Server ID must be a number")
+        elif rss_url:
+            result = db.add_feed(rss_url, int(guild_input) if guild_input else None)
+            if result['success']:
+                # Tell the bot to create the channel and poll the feed right away
+                notify_bot(db, 'feed_added', result['feed_id'], {'channel_name': result['channel_name']})
+                load_feeds.clear()
+                st.toast(f"✅ Feed added successfully! Creating channel: {result['channel_name']}")
+                st.rerun()
+            else:
+                st. error(f"❌ Error: {result['message']}")
         else:
-            st. error(f"❌ Error: {result['message']}")
-    else:
-        st.warning("⚠️ Please enter an RSS feed URL")
+            st.warning("⚠️ Please enter an RSS feed URL")
 
-st.markdown("---")
+# Bulk import/export (OPML or CSV)
+@st.fragment
+def import_export():
+    with st.expander("📥 Import / 📤 Export feeds"):
+        uploaded = st.file_uploader("OPML or CSV file", type=['opml', 'xml', 'csv'])
+        guild_input = st.text_input("Discord Server ID (optional)", placeholder="Default server",
+                                    key='import_guild')
+
+        if st.button("📥 Import Feeds", disabled=uploaded is None):
+            if guild_input and not guild_input.strip().isdigit():
+                st.warning("⚠️ Server ID must be a number")
+                return
+            try:
+                feeds = parse_feed_list(uploaded.getvalue().decode('utf-8-sig'), uploaded.name)
+            except Exception as e:
+                st.error(f"❌ Could not read {uploaded.name}: {str(e)}")
+                return
+
+            progress = st.progress(0.0, text=f"Validating {len(feeds)} feeds...")
+            errors = st.empty()
+            failed = []
+
+            def on_result(result, done, total):
+                progress.progress(done / total, text=f"Validated {done}/{total}: {result['url']}")
+                if not result['ok']:
+                    failed.append(f"❌ {result['url']}: {result['error']}")
+                    errors.text('\n'.join(failed[-10:]))
+
+            # Parse in threads: the app server should not start a process pool per import
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                summary = asyncio.run(import_feeds(
+                    db, feeds, int(guild_input) if guild_input else None,
+                    executor=executor, on_result=on_result
+                ))
+
+            feed_ids = [feed['feed_id'] for feed in summary['added']] + summary['subscribed']
+            if feed_ids:
+                notify_bot(db, 'feeds_imported', payload={'feed_ids': feed_ids})
+                load_feeds.clear()
+            progress.progress(1.0, text="Import finished")
+            st.success(f"✅ Added {len(summary['added'])}, subscribed {len(summary['subscribed'])}, "
+                       f"skipped {len(summary['skipped'])} existing, {len(summary['failed'])} failed")
+            if summary['failed']:
+                with st.expander(f"❌ {len(summary['failed'])} feeds failed"):
+                    st.text('\n'.join(f"{feed['url']}: {feed['error']}" for feed in summary['failed']))
+
+        st.markdown("---")
+        fmt = st.radio("Export format", ['OPML', 'CSV'], horizontal=True)
+        if st.button("📤 Prepare Export"):
+            feeds = db.get_all_feeds()
+            data = export_opml(feeds) if fmt == 'OPML' else export_csv(feeds)
+            st.download_button(f"⬇️ Download {len(feeds)} feeds", data,
+                               file_name=f"feeds.{fmt.lower()}",
+                               mime='text/x-opml' if fmt == 'OPML' else 'text/csv')
 
-# Display Active Feeds
-st.header("Active RSS Feeds")
+def health_status(feed):
+    """One-line health summary from the feed's last polls"""
+    failures = feed['consecutive_failures']
+    last_ok = f"last OK {feed['last_success']} UTC" if feed['last_success'] else "never polled OK"
+    if circuit_open(failures):
+        return f"🔴 Circuit open after {failures} failures ({last_ok}): {feed['last_error']}"
+    if failures:
+        return f"🟡 {failures} failed poll{'s' if failures > 1 else ''} ({last_ok}): {feed['last_error']}"
+    if feed['last_success'] is None:
+        return "⚪ Not polled yet"
+    if feed['latency_ms'] is None:
+        return "🟢 Healthy"
+    return f"🟢 Healthy · {feed['latency_ms']:.0f} ms average download"
 
-feeds = db.get_all_feeds()
+def remove_feed(feed):
+    db.remove_feed(feed['id'])
+    notify_bot(db, 'feed_removed', feed['id'], {'channel_name': feed['channel_name']})
+    load_feeds.clear()
+    st.session_state.removed.add(feed['id'])
 
-if feeds:
-    for feed in feeds:
-        col1, col2, col3 = st.columns([3, 2, 1])
-        
+# One feed; its buttons only rerun this row
+@st.fragment
+def feed_row(feed):
+    if feed['id'] in st.session_state.removed:
+        st.caption(f"🗑️ Removed **{feed['title']}**")
+        return
+
+    col1, col2, col3 = st.columns([3, 2, 1])
+
+    with col1:
+        st. write(f"**{feed['title']}**")
+        st.caption(feed['url'])
+
+    with col2:
+        st.write(f"📺 Channel: `{feed['channel_name']}`")
+        st.caption(f"Posts tracked: {feed['posts_count']} · Servers: {feed['subscribers']}")
+        st.caption(health_status(feed))
+
+    with col3:
+        if st.button("🔄 Refresh", key=f"refresh_{feed['id']}"):
+            notify_bot(db, 'refresh', feed['id'])
+            st.success("Refresh requested!")
+        st.button("🗑️ Remove", key=f"remove_{feed['id']}", on_click=remove_feed, args=(feed,))
+
+    # Rules are only loaded for the feeds whose editor is open
+    if st.toggle("⚙️ Filters & routing", key=f"rules_open_{feed['id']}"):
+        feed_rules(feed)
+
+def feed_rules(feed):
+    rules = db.get_rules([feed['id']]).get(feed['id'], [])
+    if not rules:
+        st.caption("No rules: every new post goes to the feed's channel.")
+    for rule in rules:
+        col1, col2 = st.columns([5, 1])
         with col1:
-            st. write(f"**{feed['title']}**")
-            st.caption(feed['url'])
-        
+            target = f" → `#{rule['channel_name']}`" if rule['action'] == 'route' else ""
+            kind = "regex" if rule['regex'] else "keyword"
+            st.write(f"**{rule['action']}** {kind} `{rule['pattern']}`{target}")
         with col2:
-            st.write(f"📺 Channel: `{feed['channel_name']}`")
-            st.caption(f"Posts tracked: {feed['posts_count']}")
-        
+            st.button("✖️", key=f"remove_rule_{rule['id']}", on_click=db.remove_rule, args=(rule['id'],))
+
+    with st.form(key=f"add_rule_{feed['id']}", clear_on_submit=True):
+        col1, col2, col3, col4 = st.columns([1, 2, 1, 2])
+        with col1:
+            action = st.selectbox("Action", ['include', 'exclude', 'route'])
+        with col2:
+            pattern = st.text_input("Keyword or regex", placeholder="e.g. python")
         with col3:
-            if st.button("🗑️ Remove", key=f"remove_{feed['id']}"):
-                db.remove_feed(feed['id'])
-                st.success("Feed removed!")
-                time.sleep(1)
-                st.rerun()
-        
-        st.markdown("---")
-else:
-    st.info("📭 No RSS feeds added yet.  Add your first feed above!")
+            regex = st.checkbox("Regex")
+        with col4:
+            channel_name = st.text_input("Route to channel", placeholder="Only for route rules")
+        if st.form_submit_button("➕ Add Rule"):
+            result = db.add_rule(feed['id'], action, pattern, regex, channel_name.strip() or None)
+            if result['success']:
+                st.rerun(scope="fragment")
+            st.error(f"❌ {result['message']}")
+
+# Display Active Feeds (search and paging only rerun the list)
+@st.fragment
+def feed_list():
+    st.header("Active RSS Feeds")
+
+    query = st.text_input("🔍 Search feeds", placeholder="Title, URL or channel", key="feed_query",
+                          on_change=reset_page).strip()
+    result = load_feeds(query, st.session_state.page)
+    pages = max(1, -(-result['total'] // APP_PAGE_SIZE))
+    if st.session_state.page >= pages:
+        # Feeds were removed from the last page
+        st.session_state.page = pages - 1
+        result = load_feeds(query, st.session_state.page)
+
+    if result['feeds']:
+        for feed in result['feeds']:
+            feed_row(feed)
+            st.markdown("---")
+
+        col1, col2, col3 = st.columns([1, 3, 1])
+        with col1:
+            st.button("⬅️ Previous", on_click=change_page, args=(-1,),
+                      disabled=st.session_state.page == 0, use_container_width=True)
+        with col2:
+            st.caption(f"Page {st.session_state.page + 1} of {pages} · {result['total']} feeds")
+        with col3:
+            st.button("Next ➡️", on_click=change_page, args=(1,),
+                      disabled=st.session_state.page >= pages - 1, use_container_width=True)
+    elif query:
+        st.info(f"🔍 No feeds match \"{query}\"")
+    else:
+        st.info("📭 No RSS feeds added yet.  Add your first feed above!")
+
+# Search delivered posts (full-text, best match first)
+@st.fragment
+def post_search():
+    st.header("Search Posts")
+
+    query = st.text_input("🔎 Search posts", placeholder='Words, "a phrase" or prefix*', key="post_query",
+                          on_change=reset_history_page).strip()
+    if not query:
+        return
+    page = st.session_state.history_page
+    result = load_history(query, page)
+
+    for post in result['posts']:
+        title = f"[{post['title']}]({post['link']})" if post['link'] else post['title']
+        st.markdown(f"**{title}**")
+        st.caption(f"{post['feed_title']}" + (f" · {post['published'][:16]}" if post['published'] else ""))
+        if post['snippet']:
+            st.markdown(post['snippet'])
+
+    if not result['posts'] and page == 0:
+        st.info(f"🔎 No posts match \"{query}\"")
+        return
+    col1, col2, col3 = st.columns([1, 3, 1])
+    with col1:
+        st.button("⬅️ Previous", key="history_previous", on_click=change_history_page, args=(-1,),
+                  disabled=page == 0, use_container_width=True)
+    with col2:
+        st.caption(f"Page {page + 1}")
+    with col3:
+        st.button("Next ➡️", key="history_next", on_click=change_history_page, args=(1,),
+                  disabled=not result['has_more'], use_container_width=True)
+
+add_feed_form()
+import_export()
+st.markdown("---")
+feed_list()
+st.markdown("---")
+post_search()
 
 # Footer
 st.markdown("---")
-st.caption("💡 The Discord bot will automatically create channels and post updates when new articles are published.")
\ No newline at end of file
+st.caption("💡 The Discord bot will automatically create channels and post updates when new articles are published.")
@@ -0,0 +1,99 @@
+"""Adding feeds and the bot's first poll: unseeded (the old add_feed) vs
+seeded from the validation fetch, plus re-validating through the fetch cache.
+
+Usage: python -m benchmarks.bench_add [--feeds 100] [--entries 50]
+"""
+import argparse
+import asyncio
+import time
+from database import Database
+from rss_monitor import RSSMonitor
+from fetch_cache import FETCH_CACHE
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db
+
+def unseed(db):
+    """Drop what seeding stored, leaving feeds as the old add_feed did"""
+    with db.get_connection() as conn:
+        conn.execute('''
+            UPDATE feeds SET etag = NULL, last_modified = NULL, content_hash = NULL,
+                             content_length = NULL, entry_count = NULL
+        ''')
+        conn.execute('DELETE FROM posts')
+
+async def first_poll(db):
+    # Unseeded feeds post their whole first sync, as the old add_feed did
+    monitor = RSSMonitor(db, backlog_max_posts=0)
+    try:
+        new_posts = await monitor.check_feeds(db.get_all_feeds())
+    finally:
+        await monitor.fetcher.close()
+    return sum(len(posts) for posts in new_posts.values()), monitor.last_cycle_stats
+
+def run(server, urls, seeded, publish):
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        FETCH_CACHE.entries.clear()
+        FETCH_CACHE.used_bytes = 0
+        requests, sent = server.requests, server.bytes_sent
+
+        start = time.perf_counter()
+        for url in urls:
+            db.add_feed(url)
+        add_elapsed = time.perf_counter() - start
+        if not seeded:
+            unseed(db)
+
+        server.publish(publish)
+        start = time.perf_counter()
+        posts, stats = asyncio.run(first_poll(db))
+        poll_elapsed = time.perf_counter() - start
+        db.close()
+        return {
+            'add': add_elapsed, 'poll': poll_elapsed, 'posts': posts,
+            'not_modified': stats['not_modified'], 'requests': server.requests - requests,
+            'bytes': server.bytes_sent - sent
+        }
+    finally:
+        remove_db(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=100)
+    parser.add_argument('--entries', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    with FeedServer(feeds=args.feeds, entries=args.entries, latency=args.latency) as server:
+        urls = server.urls()
+        print(f"{args.feeds} feeds x {args.entries} entries")
+        print(f"{'':>26} {'add':>8} {'poll':>8} {'posted':>8} {'304s':>6} {'requests':>9} {'sent':>9}")
+        for label, seeded, publish in [('unseeded, no new entries', False, 0),
+                                       ('seeded, no new entries', True, 0),
+                                       ('seeded, 2 new each', True, 2)]:
+            result = run(server, urls, seeded, publish)
+            print(f"{label:>26} {result['add']:7.2f}s {result['poll']:7.2f}s {result['posts']:8} "
+                  f"{result['not_modified']:6} {result['requests']:9} {result['bytes'] / 1e6:8.2f}MB")
+
+        # Adding the same URLs again within FETCH_CACHE_TTL (e.g. after a failed insert) needs no request
+        path = temp_db_path()
+        try:
+            db = Database(path)
+            for url in urls:
+                db.add_feed(url)
+            db.close()
+            remove_db(path)
+            db = Database(path)
+            requests = server.requests
+            FETCH_CACHE.stats['hits'] = 0
+            start = time.perf_counter()
+            for url in urls:
+                db.add_feed(url)
+            print(f"re-adding through the fetch cache: {time.perf_counter() - start:.2f}s, "
+                  f"{server.requests - requests} requests, {FETCH_CACHE.stats['hits']} cache hits")
+            db.close()
+        finally:
+            remove_db(path)
+
+if __name__ == "__main__":
+    main()
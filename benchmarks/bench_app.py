@@ -0,0 +1,78 @@
+"""Streamlit dashboard with thousands of feeds: the old render-everything
+script vs the cached, paginated app.
+
+Runs both scripts headless with Streamlit's AppTest against a seeded
+database (no network or bot needed).
+
+Usage: python -m benchmarks.bench_app [--feeds 5000]
+"""
+import argparse
+import os
+import time
+from benchmarks.fixtures import temp_db_path, remove_db
+
+# The dashboard before caching and pagination: new Database per run, every feed rendered
+LEGACY_SCRIPT = '''
+import streamlit as st
+from database import Database
+db = Database()
+st.set_page_config(page_title="RSS Feed Manager", page_icon="📡", layout="wide")
+st.title("📡 RSS Feed Manager")
+st.header("Active RSS Feeds")
+for feed in db.get_all_feeds():
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        st.write(f"**{feed['title']}**")
+        st.caption(feed['url'])
+    with col2:
+        st.write(f"📺 Channel: `{feed['channel_name']}`")
+        st.caption(f"Posts tracked: {feed['posts_count']}")
+    with col3:
+        st.button("🔄 Refresh", key=f"refresh_{feed['id']}")
+        st.button("🗑️ Remove", key=f"remove_{feed['id']}")
+    st.markdown("---")
+'''
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=5000)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    os.environ['DATABASE_FILE'] = db_path
+    try:
+        from streamlit.testing.v1 import AppTest
+        from database import Database
+        from benchmarks.fixtures import seed_feeds
+        db = Database(db_path)
+        seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])
+
+        legacy = AppTest.from_string(LEGACY_SCRIPT, default_timeout=600)
+        first = timed(legacy.run)
+        rerun = timed(legacy.run)
+        print(f"{args.feeds} feeds")
+        print(f"{'':>18} {'first run':>10} {'rerun':>10} {'search':>10} {'remove':>10}")
+        # Removing a feed was a full rerun after a one second sleep
+        print(f"{'legacy':>18} {first:9.2f}s {rerun:9.2f}s {'-':>10} {rerun + 1:9.2f}s")
+
+        app = AppTest.from_file('../app.py', default_timeout=600)
+        first = timed(app.run)
+        rerun = timed(app.run)
+        app.text_input(key='feed_query').input('feed 12')
+        search = timed(app.run)
+        matches = app.caption[-2].value if len(app.caption) > 1 else ''
+        button = next(button for button in app.button if (button.key or '').startswith('remove_'))
+        remove = timed(button.click().run)
+        print(f"{'cached + paginated':>18} {first:9.2f}s {rerun:9.2f}s {search:9.2f}s {remove:9.2f}s")
+        print(f"search 'feed 12': {matches}")
+        db.close()
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
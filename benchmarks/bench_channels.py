@@ -0,0 +1,84 @@
+"""Channel resolution: linear discord.utils.get scans vs the ChannelIndex.
+
+A fake guild holds --channels text channels; --missing of the --feeds feeds
+have no channel yet, and creating one takes --create-latency seconds. Each
+path runs a first sweep (which creates the missing channels) and a
+steady-state sweep (the indexed sweeps include reading the feeds back from the
+database, since that is where the resolved channel IDs live).
+
+Usage: python -m benchmarks.bench_channels [--feeds 500] [--channels 500]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+import discord
+from channels import ChannelIndex
+from database import Database
+from benchmarks.fixtures import FakeGuild, temp_db_path, remove_db, seed_feeds
+
+async def legacy_sweep(guild, feeds):
+    """The old path: a scan of guild.channels per feed, channels created one at a time"""
+    channels = {}
+    for feed in feeds:
+        channel = discord.utils.get(guild.channels, name=feed['channel_name'])
+        if channel is None:
+            channel = await guild.create_text_channel(name=feed['channel_name'])
+        channels[feed['id']] = channel
+    return channels
+
+async def indexed_sweep(db, index, guild):
+    subscriptions = db.get_subscriptions(guild_ids=[guild.id])
+    channels, changed = await index.resolve(guild, subscriptions)
+    db.set_subscription_channels({(feed_id, guild.id): channel_id for feed_id, channel_id in changed.items()})
+    return channels
+
+def make_guild(feeds, args):
+    # Channels for all but --missing feeds exist; the rest of the guild is unrelated
+    names = [feed['channel_name'] for feed in feeds[args.missing:]]
+    names += [f"other-{i}" for i in range(max(0, args.channels - len(names)))]
+    return FakeGuild(channel_names=names, create_latency=args.create_latency)
+
+def timed(coro):
+    start = time.perf_counter()
+    result = asyncio.run(coro)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=500)
+    parser.add_argument('--channels', type=int, default=500)
+    parser.add_argument('--missing', type=int, default=50, help='feeds without a channel yet')
+    parser.add_argument('--create-latency', type=float, default=0.2, help='channel create round trip (s)')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        db = Database(db_path)
+        feeds = seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])
+
+        guild = make_guild(feeds, args)
+        print(f"{args.feeds} feeds, {len(guild.channels)} channels, {args.missing} to create")
+        _, legacy_first = timed(legacy_sweep(guild, feeds))
+        legacy_creates = guild.creates
+        _, legacy_steady = timed(legacy_sweep(guild, feeds))
+
+        guild = make_guild(feeds, args)
+        db.adopt_feeds(guild.id)
+        index = ChannelIndex()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, first = timed(indexed_sweep(db, index, guild))
+        channels, steady = timed(indexed_sweep(db, index, guild))
+        assert len(channels) == args.feeds
+
+        print(f"{'':>14} {'first sweep':>12} {'steady':>10} {'creates':>8} {'parallel':>9}")
+        print(f"{'linear scan':>14} {legacy_first * 1000:10.1f}ms {legacy_steady * 1000:8.2f}ms "
+              f"{legacy_creates:>8} {1:>9}")
+        print(f"{'index + ids':>14} {first * 1000:10.1f}ms {steady * 1000:8.2f}ms "
+              f"{guild.creates:>8} {guild.peak_in_flight:>9}")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
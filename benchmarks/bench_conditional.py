@@ -0,0 +1,55 @@
+"""Bandwidth and parse savings from conditional GET and body hashing.
+
+Runs two sweeps against a local server: a cold one, then a warm one where every
+feed is unchanged. With --no-validators the server omits ETag/Last-Modified so
+only the body-hash path can skip parsing.
+
+Usage: python -m benchmarks.bench_conditional [--feeds 500] [--no-validators]
+"""
+import argparse
+import asyncio
+import time
+from database import Database
+from feed_fetcher import FeedFetcher
+from rss_monitor import RSSMonitor
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db, seed_feeds
+
+async def sweep(monitor, db):
+    start = time.perf_counter()
+    await monitor.check_feeds(db.get_all_feeds())
+    return time.perf_counter() - start
+
+async def run(db, concurrency):
+    monitor = RSSMonitor(db, FeedFetcher(concurrency=concurrency, per_host=concurrency))
+    try:
+        for label in ('cold', 'warm'):
+            elapsed = await sweep(monitor, db)
+            stats = monitor.last_cycle_stats
+            print(f"{label}: {elapsed:6.2f}s  downloaded={stats['bytes_downloaded']:>10}B  "
+                  f"saved={stats['bytes_saved']:>10}B  not_modified={stats['not_modified']:>5}  "
+                  f"parses_avoided={stats['parses_avoided']:>5}")
+    finally:
+        await monitor.fetcher.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=500)
+    parser.add_argument('--entries', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--no-validators', action='store_true')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(feeds=args.feeds, entries=args.entries,
+                        validators=not args.no_validators) as server:
+            db = Database(db_path)
+            seed_feeds(db, server.urls())
+            asyncio.run(run(db, args.concurrency))
+            print(f"server: requests={server.requests} 304s={server.not_modified} "
+                  f"bytes_sent={server.bytes_sent}")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
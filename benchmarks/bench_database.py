@@ -0,0 +1,66 @@
+"""Database throughput: connect-per-call (legacy) vs pooled WAL connections.
+
+Usage: python -m benchmarks.bench_database [--ops 5000] [--feeds 200]
+"""
+import argparse
+import hashlib
+import sqlite3
+import time
+from database import Database
+from benchmarks.fixtures import temp_db_path, remove_db, seed_feeds, seed_posts
+
+class LegacyDatabase(Database):
+    """Opens a fresh, untuned connection for every call like the original code"""
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_file)
+
+def run(db, feeds, ops):
+    feed_id = feeds[0]['id']
+    ids = [hashlib.md5(f"bench-{n}".encode()).hexdigest() for n in range(ops)]
+    timings = {}
+
+    start = time.perf_counter()
+    for post_id in ids:
+        db.add_post(feed_id, post_id)
+    timings['add_post'] = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for post_id in ids:
+        db.post_exists(feed_id, post_id)
+    timings['post_exists'] = ops / (time.perf_counter() - start)
+
+    calls = max(ops // 100, 10)
+    start = time.perf_counter()
+    for _ in range(calls):
+        db.get_all_feeds()
+    timings['get_all_feeds'] = calls / (time.perf_counter() - start)
+
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--feeds', type=int, default=200)
+    parser.add_argument('--posts-per-feed', type=int, default=100)
+    args = parser.parse_args()
+
+    results = {}
+    for label, cls in (('legacy', LegacyDatabase), ('pooled', Database)):
+        path = temp_db_path()
+        try:
+            db = cls(path)
+            feeds = seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])
+            seed_posts(db, [feed['id'] for feed in feeds], args.posts_per_feed)
+            results[label] = run(db, feeds, args.ops)
+            db.close()
+        finally:
+            remove_db(path)
+
+    print(f"{'op/s':>14} {'legacy':>12} {'pooled':>12} {'speedup':>8}")
+    for op in results['legacy']:
+        before, after = results['legacy'][op], results['pooled'][op]
+        print(f"{op:>14} {before:12.0f} {after:12.0f} {after / before:7.1f}x")
+
+if __name__ == "__main__":
+    main()
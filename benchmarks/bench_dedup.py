@@ -0,0 +1,62 @@
+"""Per-entry post_exists/add_post vs batched record_new_posts.
+
+Seeds a database with --rows existing posts, then replays feed polls where
+each feed serves --entries entries of which --new are unseen.
+
+Usage: python -m benchmarks.bench_dedup [--rows 1000000] [--polls 200]
+"""
+import argparse
+import hashlib
+import time
+from database import Database
+from benchmarks.fixtures import temp_db_path, remove_db, seed_feeds, seed_posts
+
+def poll_ids(feed_id, round_no, entries, new, per_feed):
+    """IDs a feed serves on one poll: `new` fresh ones plus the newest seen ones"""
+    fresh = [f"{feed_id}-new-{round_no}-{n}" for n in range(new)]
+    seen = [f"{feed_id}-{n}" for n in range(per_feed - 1, per_feed - 1 - (entries - new), -1)]
+    return [hashlib.md5(key.encode()).hexdigest() for key in fresh + seen]
+
+def per_entry(db, feed_id, post_ids):
+    new_ids = []
+    for post_id in post_ids:
+        if not db.post_exists(feed_id, post_id):
+            db.add_post(feed_id, post_id)
+            new_ids.append(post_id)
+    return new_ids
+
+def batched(db, feed_id, post_ids):
+    return db.record_new_posts(feed_id, post_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--feeds', type=int, default=1000)
+    parser.add_argument('--entries', type=int, default=50)
+    parser.add_argument('--new', type=int, default=2)
+    parser.add_argument('--polls', type=int, default=200)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        db = Database(db_path)
+        feeds = seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])
+        per_feed = args.rows // args.feeds
+        print(f"seeding {per_feed * args.feeds} posts...")
+        seed_posts(db, [feed['id'] for feed in feeds], per_feed)
+
+        for round_no, (label, strategy) in enumerate((('per-entry', per_entry), ('batched', batched))):
+            start = time.perf_counter()
+            found = 0
+            for poll in range(args.polls):
+                feed_id = feeds[poll % len(feeds)]['id']
+                ids = poll_ids(feed_id, f"{round_no}-{poll}", args.entries, args.new, per_feed)
+                found += len(strategy(db, feed_id, ids))
+            elapsed = time.perf_counter() - start
+            entries = args.polls * args.entries
+            print(f"{label:>9}: {elapsed:7.2f}s  {entries / elapsed:10.0f} entries/s  {found} new")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
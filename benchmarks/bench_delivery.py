@@ -0,0 +1,107 @@
+"""Backlog delivery: one message per post vs the batched, rate-limited DeliveryQueue.
+
+A fake channel enforces Discord's per-channel route limit (--limit messages
+per --per seconds, scaled down so the run stays short) and counts API calls,
+429 responses and per-post latency from enqueue to send.
+
+Usage: python -m benchmarks.bench_delivery [--posts 100] [--channels 4]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from datetime import datetime
+from database import Database
+from delivery import DeliveryQueue, build_post_embed
+from benchmarks.fixtures import FakeChannel, temp_db_path, remove_db, seed_feeds
+
+def make_posts(count, feed_index):
+    return [{
+        'post_id': f"{feed_index}-{n}",
+        'title': f"Feed {feed_index} post {n}",
+        'link': f"http://example.com/{feed_index}/{n}",
+        'author': 'Author',
+        'summary': 'Lorem ipsum dolor sit amet. ' * 10,
+        'published_date': datetime(2024, 1, 1),
+        'image': None
+    } for n in range(count)]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+def latencies(channels, start):
+    result = []
+    for channel in channels:
+        for sent_at, embeds in channel.messages:
+            result += [sent_at - start] * len(embeds)
+    return result
+
+async def one_by_one(channels, posts):
+    """The old path: one send per post, waiting out every 429 like discord.py does"""
+    start = time.monotonic()
+
+    async def deliver(channel, feed_posts):
+        import discord
+        for post in feed_posts:
+            while True:
+                try:
+                    await channel.send(embed=build_post_embed(post, 'Feed'))
+                    break
+                except discord.HTTPException as e:
+                    await asyncio.sleep(float(e.response.headers['Retry-After']))
+
+    # Feeds were processed one after another, so channels were served serially
+    for channel in channels:
+        await deliver(channel, posts[channel.id])
+    return start
+
+async def queued(channels, posts, db, feeds, rate, burst):
+    by_id = {channel.id: channel for channel in channels}
+    delivery = DeliveryQueue(db, by_id.get, channel_rate=rate, channel_burst=burst)
+    start = time.monotonic()
+    for channel, feed in zip(channels, feeds):
+        delivery.enqueue(channel.id, feed['id'], feed['title'], posts[channel.id])
+    await delivery.flush()
+    await delivery.close()
+    return start
+
+def report(label, channels, start):
+    lat = latencies(channels, start)
+    calls = sum(c.calls for c in channels)
+    limited = sum(c.rate_limited for c in channels)
+    print(f"{label:>11}: {max(lat):7.2f}s total  {calls:5} API calls  {limited:4} 429s  "
+          f"latency p50={percentile(lat, 50):6.2f}s p95={percentile(lat, 95):6.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100, help='backlog per channel')
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--per', type=float, default=0.5, help='route window (Discord: 5s)')
+    parser.add_argument('--latency', type=float, default=0.01, help='API round trip (s)')
+    args = parser.parse_args()
+    posts = {i: make_posts(args.posts, i) for i in range(args.channels)}
+
+    channels = [FakeChannel(i, limit=args.limit, per=args.per, latency=args.latency)
+                for i in range(args.channels)]
+    report('one-by-one', channels, asyncio.run(one_by_one(channels, posts)))
+
+    db_path = temp_db_path()
+    try:
+        db = Database(db_path)
+        feeds = seed_feeds(db, [f"http://example.com/{i}" for i in range(args.channels)])
+        channels = [FakeChannel(i, limit=args.limit, per=args.per, latency=args.latency)
+                    for i in range(args.channels)]
+        # Bucket sized so burst + rate x window stays within the route limit
+        burst = max(1, args.limit // 2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = asyncio.run(queued(channels, posts, db, feeds, (args.limit - burst) / args.per, burst))
+        report('queued', channels, start)
+        print(f"{'':>11}  outbox rows left: {len(db.get_outbox())}")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
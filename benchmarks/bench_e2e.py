@@ -0,0 +1,266 @@
+"""End-to-end polling and delivery benchmark, reported as JSON.
+
+Runs the real DiscordBot pipeline (scheduler, fetch, parse, dedup, outbox and
+rate-limited delivery) against a local FeedServer and a fake Discord gateway
+whose channels record every send. Each scenario runs in a fresh process on a
+fresh database:
+
+  cold_start     every feed is new: one cycle delivers their newest entries
+                 (BACKLOG_MAX_POSTS each)
+  steady_state   --churn of the feeds publish --new entries per cycle, the
+                 rest answer 304 (and --error-rate of them answer 503)
+  sweep          the same with --sweep-feeds feeds and --latency per request
+  backlog_burst  a few feeds publish a burst of entries at once; measures how
+                 long the rate-limited channels take to drain it
+
+Per scenario the report has cycle latency percentiles (polling, and delivery
+until every post is sent), feed and post throughput, HTTP counts, database
+method calls and the peak RSS of the bot process (the parsing pool's worker
+processes are not included). Churn and errors are drawn from --seed, so two
+runs with the same arguments do the same work and their reports can be
+diffed key by key.
+
+Usage: python -m benchmarks.bench_e2e [--feeds 200] [--sweep-feeds 1000] [--output report.json]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+SCENARIOS = ('cold_start', 'steady_state', 'sweep', 'backlog_burst')
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda pct: values[min(len(values) - 1, int(len(values) * pct / 100))]
+    return {
+        'p50': round(pick(50), 4), 'p90': round(pick(90), 4), 'p99': round(pick(99), 4),
+        'max': round(values[-1], 4), 'mean': round(statistics.fmean(values), 4)
+    }
+
+def peak_rss_mb():
+    """High-water resident memory of this process, or None where getrusage is missing"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def db_calls():
+    """Database method calls so far, by method"""
+    from metrics import DB_QUERY_SECONDS
+    return {key[0]: state[2] for key, state in DB_QUERY_SECONDS._items()}
+
+class Harness:
+    """A DiscordBot wired to a FeedServer and a one-guild fake gateway"""
+
+    def __init__(self, args, server, db_path):
+        from bot import DiscordBot
+        from database import Database
+        from delivery import DeliveryQueue
+        from benchmarks.fixtures import FakeGateway, seed_feeds
+
+        self.server = server
+        # The fake channels allow what the queue's token bucket sends, so 429s mean the queue overran
+        self.gateway = FakeGateway(1, limit=max(1, int(args.channel_rate)), per=1.0)
+        self.bot = DiscordBot(None, db=Database(db_path), control=False)
+        self.bot.bot = self.gateway.client()
+        self.bot.delivery = DeliveryQueue(
+            self.bot.db, self.bot.resolve_channel, channel_rate=args.channel_rate,
+            global_rate=args.global_rate, global_burst=int(args.global_rate), owner=self.bot.partitions.owner
+        )
+        seed_feeds(self.bot.db, server.urls())
+        self.cycles = []
+        self.baseline = None
+
+    async def start(self):
+        self.bot.renew_partitions()
+        await self.bot.create_channels_for_existing_feeds()
+
+    def delivered(self):
+        return [sent_at for channel in self.gateway.channels()
+                for sent_at, embeds in channel.messages for _ in embeds]
+
+    async def cycle(self, record=True):
+        """Make every feed due, poll them and wait until their posts are delivered"""
+        bot, server = self.bot, self.server
+        feeds = bot.db.get_all_feeds(bot.partitions.owned, bot.partitions.count)
+        bot.scheduler.sync(feed['id'] for feed in feeds)
+        for feed in feeds:
+            bot.scheduler.poll_now(feed['id'])
+
+        before = len(self.delivered())
+        requests, not_modified, errors = server.requests, server.not_modified, server.errors
+        started = time.monotonic()
+        await bot.process_feeds()
+        polled = time.monotonic()
+        await bot.delivery.flush()
+        finished = time.monotonic()
+
+        sent = sorted(self.delivered())[before:]
+        cycle = {
+            'feeds': len(feeds),
+            'poll_seconds': polled - started,
+            'total_seconds': finished - started,
+            'posts': len(sent),
+            'post_latencies': [sent_at - started for sent_at in sent],
+            'requests': server.requests - requests,
+            'not_modified': server.not_modified - not_modified,
+            'errors': server.errors - errors
+        }
+        if record:
+            self.cycles.append(cycle)
+        return cycle
+
+    async def close(self):
+        await self.bot.delivery.close()
+        await self.bot.rss_monitor.fetcher.close()
+        self.bot.db.close()
+
+    def mark(self):
+        """Start counting database calls, bytes and Discord sends for the report from here"""
+        channels = self.gateway.channels()
+        self.baseline = {
+            'calls': db_calls(),
+            'bytes': self.server.bytes_sent,
+            'messages': sum(len(channel.messages) for channel in channels),
+            'rate_limited': sum(channel.rate_limited for channel in channels)
+        }
+
+    def report(self):
+        cycles, baseline = self.cycles, self.baseline
+        poll_time = sum(cycle['poll_seconds'] for cycle in cycles)
+        total_time = sum(cycle['total_seconds'] for cycle in cycles)
+        posts = sum(cycle['posts'] for cycle in cycles)
+        calls = {name: count - baseline['calls'].get(name, 0) for name, count in db_calls().items()}
+        calls = {name: count for name, count in sorted(calls.items()) if count}
+        channels = self.gateway.channels()
+        return {
+            'feeds': cycles[0]['feeds'] if cycles else 0,
+            'cycles': len(cycles),
+            'poll_seconds': percentiles([cycle['poll_seconds'] for cycle in cycles]),
+            'cycle_seconds': percentiles([cycle['total_seconds'] for cycle in cycles]),
+            'post_latency_seconds': percentiles([t for cycle in cycles for t in cycle['post_latencies']]),
+            'throughput': {
+                'feeds_per_second': round(sum(cycle['feeds'] for cycle in cycles) / poll_time, 1) if poll_time else None,
+                'posts_per_second': round(posts / total_time, 1) if total_time and posts else None
+            },
+            'posts_delivered': posts,
+            'discord': {
+                'messages': sum(len(channel.messages) for channel in channels) - baseline['messages'],
+                'rate_limited': sum(channel.rate_limited for channel in channels) - baseline['rate_limited']
+            },
+            'http': {
+                'requests': sum(cycle['requests'] for cycle in cycles),
+                'not_modified': sum(cycle['not_modified'] for cycle in cycles),
+                'errors': sum(cycle['errors'] for cycle in cycles),
+                'bytes': self.server.bytes_sent - baseline['bytes']
+            },
+            'db_calls': dict(calls, total=sum(calls.values())),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+async def run_scenario(name, args, server, db_path):
+    rng = random.Random(f"{args.seed}-{name}")
+    harness = Harness(args, server, db_path)
+    try:
+        await harness.start()
+        if name != 'cold_start':
+            # Every other scenario starts from feeds that have all been seen once
+            await harness.cycle(record=False)
+        harness.mark()
+
+        if name == 'backlog_burst':
+            server.publish(server.entries, rng.sample(range(server.feeds), args.burst_feeds))
+            await harness.cycle()
+        elif name != 'cold_start':
+            server.error_rate = args.error_rate
+            for _ in range(args.cycles):
+                server.publish(args.new, rng.sample(range(server.feeds), round(server.feeds * args.churn)))
+                await harness.cycle()
+        else:
+            await harness.cycle()
+        return harness.report()
+    finally:
+        await harness.close()
+
+def scenario_process(name, args):
+    """Run one scenario in this (fresh) process and return its report"""
+    from benchmarks.fixtures import FeedServer, temp_db_path, remove_db
+
+    logging.disable(logging.CRITICAL)
+    server_options = {'feeds': args.feeds, 'entries': args.entries}
+    if name == 'sweep':
+        server_options.update(feeds=args.sweep_feeds, latency=args.latency)
+    elif name == 'backlog_burst':
+        server_options.update(entries=args.burst_entries)
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(**server_options) as server, contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(run_scenario(name, args, server, db_path))
+    finally:
+        remove_db(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset to run')
+    parser.add_argument('--feeds', type=int, default=200)
+    parser.add_argument('--entries', type=int, default=20, help='entries per feed')
+    parser.add_argument('--cycles', type=int, default=10, help='measured cycles of steady_state and sweep')
+    parser.add_argument('--churn', type=float, default=0.1, help='fraction of feeds publishing each cycle')
+    parser.add_argument('--new', type=int, default=2, help='entries a churning feed publishes')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='fraction of feeds answering 503')
+    parser.add_argument('--sweep-feeds', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05, help='server latency in sweep (s)')
+    parser.add_argument('--burst-feeds', type=int, default=5)
+    parser.add_argument('--burst-entries', type=int, default=100)
+    parser.add_argument('--channel-rate', type=float, default=20, help='messages/s per channel (scaled up)')
+    parser.add_argument('--global-rate', type=float, default=500, help='messages/s overall (scaled up)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {
+        'config': {key: value for key, value in sorted(vars(args).items()) if key != 'output'},
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': multiprocessing.cpu_count()
+        },
+        'scenarios': {}
+    }
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            report['scenarios'][name] = executor.submit(scenario_process, name, args).result()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""One feed at a time (check_feed) vs the concurrent aiohttp fetch engine.
+
+Usage: python -m benchmarks.bench_fetch [--feeds 1000] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import time
+from database import Database
+from feed_fetcher import FeedFetcher
+from rss_monitor import RSSMonitor
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db, seed_feeds, clear_posts
+
+def run_serial(monitor, feeds):
+    new_posts = 0
+    for feed in feeds:
+        new_posts += len(monitor.check_feed(feed['url'], feed['id']))
+    return new_posts
+
+async def run_concurrent(monitor, feeds):
+    try:
+        results = await monitor.check_feeds(feeds)
+    finally:
+        await monitor.fetcher.close()
+    return sum(len(posts) for posts in results.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=1000)
+    parser.add_argument('--entries', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated server latency (s)')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--skip-serial', action='store_true')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(feeds=args.feeds, entries=args.entries, latency=args.latency) as server:
+            db = Database(db_path)
+            feeds = seed_feeds(db, server.urls())
+
+            if not args.skip_serial:
+                monitor = RSSMonitor(db)
+                start = time.perf_counter()
+                posts = run_serial(monitor, feeds)
+                elapsed = time.perf_counter() - start
+                print(f"serial:     {elapsed:8.2f}s  {len(feeds) / elapsed:8.1f} feeds/s  {posts} posts")
+                clear_posts(db)
+
+            fetcher = FeedFetcher(concurrency=args.concurrency, per_host=args.concurrency)
+            monitor = RSSMonitor(db, fetcher)
+            start = time.perf_counter()
+            posts = asyncio.run(run_concurrent(monitor, feeds))
+            elapsed = time.perf_counter() - start
+            print(f"concurrent: {elapsed:8.2f}s  {len(feeds) / elapsed:8.1f} feeds/s  {posts} posts")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Content dedup: precision on a labelled corpus and near-duplicate lookups at millions of posts.
+
+The corpus (benchmarks/dedup_corpus.json) pairs syndicated copies of a story
+(tracking parameters, FeedBurner links, footers, datelines, edits) with
+look-alike stories that must not be merged (next releases, templated
+advisories, recurring digests). The lookup benchmark fills the fingerprint
+index with --posts posts and compares the banded index with scanning the
+window.
+
+Usage: python -m benchmarks.bench_fingerprint [--posts 1000000] [--lookups 2000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from database import Database
+from feed_parser import clean_html
+from fingerprint import fingerprint, canonical_link, bands, distance, to_signed, MAX_DISTANCE
+from benchmarks.fixtures import temp_db_path, remove_db
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'dedup_corpus.json')
+
+INSERT_SQL = '''
+    INSERT INTO fingerprints (guild_id, feed_id, link_hash, simhash, band0, band1, band2, band3, seen_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def post_fingerprint(post):
+    return fingerprint(canonical_link(post), clean_html(post['title']), clean_html(post.get('summary', '')))
+
+def bench_corpus(db):
+    with open(CORPUS, encoding='utf-8') as f:
+        pairs = json.load(f)
+
+    counts = {'tp': 0, 'fp': 0, 'fn': 0, 'tn': 0}
+    mistakes = []
+    for guild_id, pair in enumerate(pairs, start=1):
+        # Each pair gets its own guild so pairs cannot match each other
+        db.claim_fingerprints(guild_id, 1, [post_fingerprint(pair['a'])])
+        duplicate = not db.claim_fingerprints(guild_id, 2, [post_fingerprint(pair['b'])])[0]
+        key = ('t' if duplicate == pair['duplicate'] else 'f') + ('p' if duplicate else 'n')
+        counts[key] += 1
+        if duplicate != pair['duplicate']:
+            mistakes.append(f"{'missed' if pair['duplicate'] else 'false match'}: {pair['note']}")
+
+    precision = counts['tp'] / max(counts['tp'] + counts['fp'], 1)
+    recall = counts['tp'] / max(counts['tp'] + counts['fn'], 1)
+    print(f"corpus: {len(pairs)} pairs, precision {precision:.2f}, recall {recall:.2f} "
+          f"({counts['tp']} merged, {counts['fp']} false matches, {counts['fn']} missed)")
+    for mistake in mistakes:
+        print(f"  {mistake}")
+
+def fill_index(path, posts, guild_id, now, rng):
+    """Insert posts random fingerprints spread over the last two days"""
+    conn = sqlite3.connect(path)
+    batch = []
+    for n in range(posts):
+        simhash = rng.getrandbits(64)
+        batch.append((guild_id, n % 1000, rng.randbytes(16), to_signed(simhash), *bands(simhash),
+                      now - rng.uniform(0, 2 * 86400)))
+        if len(batch) == 50000:
+            conn.executemany(INSERT_SQL, batch)
+            batch = []
+    if batch:
+        conn.executemany(INSERT_SQL, batch)
+    conn.commit()
+    conn.close()
+
+def scan_window(db, guild_id, target, window, now):
+    """The naive check: every fingerprint in the window against the new post"""
+    cursor = db.get_connection().cursor()
+    cursor.execute('SELECT simhash FROM fingerprints WHERE guild_id = ? AND seen_at >= ?',
+                   (guild_id, now - window))
+    return any(distance(target, simhash) <= MAX_DISTANCE for (simhash,) in cursor if simhash is not None)
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def bench_lookups(db, path, posts, lookups, seed):
+    rng = random.Random(seed)
+    now = time.time()
+    window = 3 * 86400
+    guild_id = 10 ** 6
+
+    start = time.perf_counter()
+    fill_index(path, posts, guild_id, now, rng)
+    print(f"index: {posts} posts inserted in {time.perf_counter() - start:.1f}s, "
+          f"{os.path.getsize(path) / posts:.0f} bytes/post on disk")
+
+    # Half the lookups are near-duplicates (2 bits off an indexed post), half are new
+    cursor = db.get_connection().cursor()
+    cursor.execute('SELECT simhash FROM fingerprints WHERE guild_id = ? ORDER BY RANDOM() LIMIT ?',
+                   (guild_id, lookups // 2))
+    existing = [simhash & ((1 << 64) - 1) for (simhash,) in cursor.fetchall()]
+    targets = [value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value in existing]
+    targets += [rng.getrandbits(64) for _ in range(lookups - len(targets))]
+
+    timings, found = [], 0
+    for target in targets:
+        started = time.perf_counter()
+        found += db.is_near_duplicate(cursor, guild_id, {'link_hash': None, 'simhash': target}, now - window)
+        timings.append(time.perf_counter() - started)
+    print(f"banded lookup: p50 {percentile(timings, 50) * 1000:.3f}ms, "
+          f"p99 {percentile(timings, 99) * 1000:.3f}ms; {found}/{len(existing)} near-duplicates found")
+
+    timings = []
+    for target in targets:
+        started = time.perf_counter()
+        db.claim_fingerprints(guild_id, 1, [{'link_hash': rng.randbytes(16), 'simhash': target}], window, now)
+        timings.append(time.perf_counter() - started)
+    print(f"claim (lookup, insert and commit): p50 {percentile(timings, 50) * 1000:.3f}ms, "
+          f"p99 {percentile(timings, 99) * 1000:.3f}ms")
+
+    scans = 3
+    started = time.perf_counter()
+    for target in targets[:scans]:
+        scan_window(db, guild_id, target, window, now)
+    print(f"scanning the window: {(time.perf_counter() - started) / scans * 1000:.0f}ms per lookup")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        bench_corpus(db)
+        bench_lookups(db, path, args.posts, args.lookups, args.seed)
+        db.close()
+    finally:
+        remove_db(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Bulk import: add_feed one URL at a time vs the concurrent OPML import,
+and channel name probing vs the single-query resolver.
+
+Usage: python -m benchmarks.bench_import [--feeds 500] [--latency 0.05] [--duplicates 2000]
+"""
+import argparse
+import asyncio
+import sqlite3
+import time
+from database import Database
+from feed_import import parse_opml, export_opml, import_feeds
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db
+
+def legacy_channel_name(cursor, channel_name):
+    """The old per-counter probing loop from add_feed; returns (name, queries run)"""
+    cursor.execute('SELECT id FROM feeds WHERE channel_name = ? ', (channel_name,))
+    if not cursor.fetchone():
+        return channel_name, 1
+    counter = 1
+    while True:
+        new_channel_name = f"{channel_name}-{counter}"
+        cursor.execute('SELECT id FROM feeds WHERE channel_name = ? ', (new_channel_name,))
+        if not cursor.fetchone():
+            return new_channel_name, counter + 1
+        counter += 1
+
+def bench_channel_names(duplicates, new):
+    """duplicates existing 'news' channels, then name new feeds also titled 'News'"""
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        conn = sqlite3.connect(path)
+        conn.executemany(
+            'INSERT INTO feeds (url, title, channel_name) VALUES (?, ?, ?)',
+            [(f"http://example.com/{i}", 'News', 'news' if i == 0 else f"news-{i}") for i in range(duplicates)]
+        )
+        conn.commit()
+        cursor = conn.cursor()
+
+        start = time.perf_counter()
+        legacy, queries = [], 0
+        for i in range(new):
+            name, ran = legacy_channel_name(cursor, 'news')
+            queries += ran
+            # Reserve it as the old code would have by inserting the feed
+            cursor.execute('INSERT INTO feeds (url, title, channel_name) VALUES (?, ?, ?)',
+                           (f"http://example.com/new/{i}", 'News', name))
+            legacy.append(name)
+        legacy_elapsed = time.perf_counter() - start
+        conn.rollback()
+        conn.close()
+
+        start = time.perf_counter()
+        names = db.unique_channel_names(db.get_connection().cursor(), ['news'] * new)
+        elapsed = time.perf_counter() - start
+        assert names == legacy, "resolver disagrees with the probing loop"
+        db.close()
+        return legacy_elapsed, queries, elapsed
+    finally:
+        remove_db(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=500)
+    parser.add_argument('--broken', type=int, default=20, help='URLs in the list that return 404')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated server latency (s)')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duplicates', type=int, default=2000, help="existing 'news' channels")
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    with FeedServer(feeds=args.feeds, latency=args.latency) as server:
+        # The list round-trips through OPML like a real migration
+        listed = [{'url': server.url(i), 'title': ''} for i in range(args.feeds + args.broken)]
+        feeds = parse_opml(export_opml(listed))
+        print(f"{len(feeds)} feeds in the OPML list ({args.broken} broken), {args.latency * 1000:.0f}ms latency")
+
+        if not args.skip_legacy:
+            path = temp_db_path()
+            try:
+                db = Database(path)
+                start = time.perf_counter()
+                added = sum(db.add_feed(feed['url'])['success'] for feed in feeds)
+                elapsed = time.perf_counter() - start
+                print(f"add_feed loop: {elapsed:7.2f}s  {added} added")
+                db.close()
+            finally:
+                remove_db(path)
+
+        path = temp_db_path()
+        try:
+            db = Database(path)
+            first = []
+
+            def on_result(result, done, total):
+                if done == 1:
+                    first.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            # One local server stands in for many hosts, so lift the per-host limit
+            summary = asyncio.run(import_feeds(
+                db, feeds, concurrency=args.concurrency, per_host=args.concurrency, on_result=on_result
+            ))
+            elapsed = time.perf_counter() - start
+            print(f"OPML import:   {elapsed:7.2f}s  {len(summary['added'])} added, "
+                  f"{len(summary['failed'])} failed, first result after {first[0] * 1000:.0f}ms")
+
+            start = time.perf_counter()
+            summary = asyncio.run(import_feeds(
+                db, feeds, guild_id=42, concurrency=args.concurrency, per_host=args.concurrency
+            ))
+            print(f"re-import for another server: {time.perf_counter() - start:.2f}s, "
+                  f"{len(summary['subscribed'])} subscribed")
+            db.close()
+        finally:
+            remove_db(path)
+
+    new = 100
+    legacy_elapsed, queries, elapsed = bench_channel_names(args.duplicates, new)
+    print(f"{new} new 'news' channels beside {args.duplicates} existing: "
+          f"probing {legacy_elapsed * 1000:.0f}ms ({queries} queries), resolver {elapsed * 1000:.1f}ms (1 query)")
+
+if __name__ == "__main__":
+    main()
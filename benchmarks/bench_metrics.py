@@ -0,0 +1,97 @@
+"""Cost of the instrumentation: metric updates and log calls on the hot path,
+and a /metrics scrape after a real fetch cycle.
+
+Usage: python -m benchmarks.bench_metrics [--feeds 500] [--calls 200000]
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+import urllib.request
+from contextlib import redirect_stdout
+from database import Database
+from feed_fetcher import FeedFetcher
+from rss_monitor import RSSMonitor
+from control import ControlServer
+from metrics import REGISTRY, Histogram, Registry
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db, seed_feeds
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e9
+
+def hot_path_costs(calls, feeds):
+    enabled, disabled = Registry(enabled=True), Registry(enabled=False)
+    on = Histogram('bench_on_seconds', 'enabled', ['feed'], registry=enabled)
+    off = Histogram('bench_off_seconds', 'disabled', ['feed'], registry=disabled)
+    log = logging.getLogger('bench')
+    log.setLevel(logging.WARNING)
+    sink = io.StringIO()
+
+    def printed(i):
+        with redirect_stdout(sink):
+            print(f"✅ Posted {i} posts to channel {i}")
+
+    def timed(i):
+        with on.time(feed=i % feeds):
+            pass
+
+    return {
+        'observe (enabled)': per_call(lambda i: on.observe(0.01, feed=i % feeds), calls),
+        'observe (disabled)': per_call(lambda i: off.observe(0.01, feed=i % feeds), calls),
+        'timer (enabled)': per_call(timed, calls),
+        'log below level': per_call(lambda i: log.info("✅ Posted %d posts to channel %s", i, i), calls),
+        'print (old)': per_call(printed, calls)
+    }
+
+async def scrape(db, urls, port):
+    feeds = seed_feeds(db, urls)
+    monitor = RSSMonitor(db, FeedFetcher(concurrency=100, per_host=100))
+    server = ControlServer(lambda: None, port=port)
+    await server.start()
+    try:
+        start = time.perf_counter()
+        await monitor.check_feeds(feeds)
+        cycle = time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = await asyncio.to_thread(
+            lambda: urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read()
+        )
+        return cycle, time.perf_counter() - start, body.decode()
+    finally:
+        await monitor.fetcher.close()
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=500)
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    print(f"{'hot path call':>20} {'ns/call':>10}")
+    for label, cost in hot_path_costs(args.calls, args.feeds).items():
+        print(f"{label:>20} {cost:10.0f}")
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(feeds=args.feeds) as feed_server:
+            db = Database(db_path)
+            REGISTRY.enabled = True
+            cycle, elapsed, body = asyncio.run(scrape(db, feed_server.urls(), args.port))
+            db.close()
+        series = [line for line in body.splitlines() if line and not line.startswith('#')]
+        print(f"fetch cycle of {args.feeds} feeds: {cycle:.2f}s")
+        print(f"/metrics scrape: {elapsed * 1000:.1f}ms, {len(body) / 1024:.0f} KB, {len(series)} series")
+        for name in ('rss_fetch_seconds_count', 'rss_parse_seconds_count', 'rss_dedup_seconds_count',
+                     'rss_http_responses_total', 'rss_db_query_seconds_count'):
+            print(f"  {name:<28} {sum(1 for line in series if line.startswith(name))} series")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Parsing throughput: in-process parsing vs the parsing process pool.
+
+Builds a corpus of large synthetic RSS and Atom documents and pushes it
+through the parse stage the way a polling cycle does (all feeds at once),
+then extracts posts for the --new-fraction of entries that would be new.
+Each configuration runs in a fresh interpreter so peak RSS is its own.
+Also reports the worst event-loop stall seen while parsing.
+
+Usage: python -m benchmarks.bench_parse [--files 8] [--entries 1000] [--workers N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from feed_fetcher import FeedFetcher
+from feed_parser import extract_post
+from benchmarks.fixtures import make_rss, make_atom
+
+def make_corpus(files, entries, summary_size):
+    return [
+        (make_atom if i % 2 else make_rss)(i, entries, summary_size=summary_size)
+        for i in range(files)
+    ]
+
+async def run_stage(corpus, executor, new_fraction):
+    fetcher = FeedFetcher(executor=executor)
+    stalls = []
+
+    async def ticker():
+        # Anything parsing on the loop's own thread delays these wake-ups
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - start - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    feeds = await asyncio.gather(*(fetcher.parse(body) for body in corpus))
+    posts = 0
+    for feed in feeds:
+        new = feed['entries'][:int(len(feed['entries']) * new_fraction)]
+        posts += len([extract_post(record['entry']) for record in new])
+    elapsed = time.perf_counter() - start
+    tick.cancel()
+    entries = sum(len(feed['entries']) for feed in feeds)
+    return entries, posts, elapsed, max(stalls, default=0)
+
+def run_one(args):
+    """Run one configuration in this process and print its result as JSON"""
+    corpus = make_corpus(args.files, args.entries, args.summary_size)
+    if args.run == 'inline':
+        # Parsing on a thread of the bot's own process, sharing its GIL
+        executor = ThreadPoolExecutor(max_workers=4)
+    else:
+        executor = FeedFetcher(parse_workers=int(args.run)).get_executor()
+
+    async def main():
+        result = await run_stage(corpus, executor, args.new_fraction)
+        executor.shutdown(wait=True)
+        return result
+
+    entries, posts, elapsed, stall = asyncio.run(main())
+    print(json.dumps({
+        'entries': entries,
+        'posts': posts,
+        'elapsed': elapsed,
+        'stall': stall,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'worker_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--entries', type=int, default=1000, help='entries per file')
+    parser.add_argument('--summary-size', type=int, default=1000, help='HTML bytes per entry')
+    parser.add_argument('--new-fraction', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args)
+        return
+
+    size = sum(len(body) for body in make_corpus(args.files, args.entries, args.summary_size))
+    print(f"corpus: {args.files} files, {args.files * args.entries} entries, {size / 1e6:.1f} MB "
+          f"({os.cpu_count()} CPUs)")
+    print(f"{'':>12} {'entries/s':>10} {'time':>8} {'loop stall':>11} {'main RSS':>9} {'worker RSS':>11}")
+    runs = [('in-process', 'inline'), ('1 worker', '1')]
+    if args.workers > 1:
+        runs.append((f"{args.workers} workers", str(args.workers)))
+    for label, run in runs:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_parse', '--run', run,
+             '--files', str(args.files), '--entries', str(args.entries),
+             '--summary-size', str(args.summary_size), '--new-fraction', str(args.new_fraction)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        worker_rss = f"{result['worker_rss_mb']:9.0f}MB" if run != 'inline' else f"{'-':>11}"
+        print(f"{label:>12} {result['entries'] / result['elapsed']:10.0f} {result['elapsed']:7.2f}s "
+              f"{result['stall'] * 1000:9.0f}ms {result['rss_mb']:7.0f}MB {worker_rss}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""First sync of a 10k-entry feed: eager post dicts vs lazy Post records and the backlog cap.
+
+Parses one large synthetic feed, then runs its first sync through
+RSSMonitor.process_entries on a fresh database and builds the embed payload
+of every post it returns, as delivery does. Compares:
+
+  eager dicts   every entry extracted to a dict (HTML cleaned, dates and
+                images resolved) and an embed built per post (the old path)
+  lazy, no cap  Post records; fields are extracted when the embed reads them
+  lazy, capped  Post records with the first-sync cap (BACKLOG_MAX_POSTS)
+
+Reports CPU time and the Python memory held by the posts and payloads
+(tracemalloc, measured in a separate run so timings are not slowed by it).
+
+Usage: python -m benchmarks.bench_posts [--entries 10000] [--summary-size 2000] [--cap 10]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from database import Database
+from delivery import build_post_embed, post_payload
+from feed_parser import parse_feed, extract_post
+from rss_monitor import RSSMonitor
+from benchmarks.fixtures import make_rss, temp_db_path, remove_db, seed_feeds
+
+def eager(monitor, feed, feed_id):
+    """The old path: a full dict per new entry, then an embed per post"""
+    posts = []
+    for post in monitor.process_entries(feed, 'http://example.com/0', feed_id):
+        data = extract_post(post.entry)
+        data['post_id'] = post.post_id
+        posts.append(data)
+    payloads = []
+    for post in posts:
+        embed = build_post_embed(post, 'Feed 0')
+        payload = embed.to_dict()
+        payloads.append((payload, json.dumps(payload), len(embed)))
+    return posts, payloads
+
+def lazy(monitor, feed, feed_id):
+    posts = monitor.process_entries(feed, 'http://example.com/0', feed_id, first_sync=True)
+    return posts, [post_payload(post, 'Feed 0') for post in posts]
+
+def run(label, feed, cap, path, trace):
+    remove_db(path)
+    db = Database(path)
+    feed_id = seed_feeds(db, ['http://example.com/0'])[0]['id']
+    monitor = RSSMonitor(db, history=False, backlog_max_posts=cap)
+    if trace:
+        tracemalloc.start()
+    started = time.process_time()
+    posts, payloads = (eager if label == 'eager dicts' else lazy)(monitor, feed, feed_id)
+    elapsed = time.process_time() - started
+    held = None
+    if trace:
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    db.close()
+    return elapsed, held, len(posts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--summary-size', type=int, default=2000)
+    parser.add_argument('--cap', type=int, default=10)
+    args = parser.parse_args()
+
+    body = make_rss(0, args.entries, summary_size=args.summary_size)
+    feed = parse_feed(body)
+    print(f"feed: {args.entries} entries, {len(body) / 1e6:.1f} MB")
+
+    path = temp_db_path()
+    try:
+        print(f"{'':>14} {'CPU':>8} {'memory held':>12} {'posts':>7}")
+        for label, cap in (('eager dicts', 0), ('lazy, no cap', 0), ('lazy, capped', args.cap)):
+            elapsed, _, count = run(label, feed, cap, path, trace=False)
+            _, held, _ = run(label, feed, cap, path, trace=True)
+            print(f"{label:>14} {elapsed * 1000:6.0f}ms {held / 1e6:10.1f}MB {count:>7}")
+    finally:
+        remove_db(path)
+
+if __name__ == "__main__":
+    main()
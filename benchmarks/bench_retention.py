@@ -0,0 +1,98 @@
+"""Posts table at scale: legacy TEXT IDs + aggregate listing vs BLOB IDs,
+maintained posts_count and retention compaction.
+
+Usage: python -m benchmarks.bench_retention [--rows 10000000] [--feeds 2000]
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from database import Database
+from benchmarks.fixtures import temp_db_path, remove_db, seed_feeds
+
+LEGACY_SCHEMA = [
+    '''CREATE TABLE feeds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE NOT NULL, title TEXT NOT NULL,
+        channel_name TEXT UNIQUE NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, feed_id INTEGER NOT NULL, post_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE, UNIQUE(feed_id, post_id))'''
+]
+
+LEGACY_LISTING = '''
+    SELECT f.id, f.url, f.title, f.channel_name, COUNT(p.id) as posts_count
+    FROM feeds f LEFT JOIN posts p ON f.id = p.feed_id GROUP BY f.id
+'''
+
+def db_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+def fill(conn, feeds, per_feed, digest, old_fraction):
+    """Insert rows spread over feeds; the oldest old_fraction of each feed is backdated"""
+    batch = []
+    for feed_id in range(1, feeds + 1):
+        for n in range(per_feed):
+            post_id = hashlib.md5(f"{feed_id}-{n}".encode())
+            created = '2020-01-01 00:00:00' if n < per_feed * old_fraction else '2099-01-01 00:00:00'
+            batch.append((feed_id, post_id.digest() if digest else post_id.hexdigest(), created))
+            if len(batch) >= 100000:
+                conn.executemany('INSERT INTO posts (feed_id, post_id, created_at) VALUES (?, ?, ?)', batch)
+                batch = []
+    if batch:
+        conn.executemany('INSERT INTO posts (feed_id, post_id, created_at) VALUES (?, ?, ?)', batch)
+    conn.commit()
+
+def timed(fn, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--feeds', type=int, default=2000)
+    parser.add_argument('--old-fraction', type=float, default=0.8,
+                        help='share of each feed older than the retention window')
+    args = parser.parse_args()
+    per_feed = args.rows // args.feeds
+    urls = [f"http://example.com/{i}" for i in range(args.feeds)]
+
+    legacy_path, path = temp_db_path(), temp_db_path()
+    try:
+        print(f"seeding {per_feed * args.feeds} rows into each schema...")
+        conn = sqlite3.connect(legacy_path)
+        for statement in LEGACY_SCHEMA:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO feeds (url, title, channel_name) VALUES (?, ?, ?)',
+                         [(url, f"Feed {i}", f"feed-{i}") for i, url in enumerate(urls)])
+        fill(conn, args.feeds, per_feed, False, args.old_fraction)
+        legacy_listing = timed(lambda: conn.execute(LEGACY_LISTING).fetchall())
+        conn.close()
+
+        db = Database(path)
+        seed_feeds(db, urls)
+        fill(db.get_connection(), args.feeds, per_feed, True, args.old_fraction)
+        db.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        listing = timed(db.get_all_feeds)
+
+        print(f"{'':>20} {'legacy':>12} {'current':>12}")
+        print(f"{'bytes/row':>20} {db_size(legacy_path) / args.rows:12.1f} {db_size(path) / args.rows:12.1f}")
+        print(f"{'list feeds (ms)':>20} {legacy_listing * 1000:12.1f} {listing * 1000:12.1f}")
+
+        before = db_size(path)
+        start = time.perf_counter()
+        deleted = db.compact_posts()
+        elapsed = time.perf_counter() - start
+        db.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        print(f"compaction: deleted {deleted} rows in {elapsed:.1f}s, "
+              f"size {before / 1e6:.0f} MB -> {db_size(path) / 1e6:.0f} MB")
+        db.close()
+    finally:
+        remove_db(legacy_path)
+        remove_db(path)
+
+if __name__ == "__main__":
+    main()
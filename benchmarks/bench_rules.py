@@ -0,0 +1,108 @@
+"""Feed rules: one regex per rule vs the per-feed combined matcher.
+
+Builds --rules rules for one feed (mostly keywords, --regex-fraction regexes;
+includes, a few excludes and routes to --channels channels) and matches
+--entries synthetic titles and summaries against them. The per-rule loop
+runs over a sample of the entries (it is far slower) and is scaled up;
+both matchers must agree on every sampled entry.
+
+Usage: python -m benchmarks.bench_rules [--rules 1000] [--entries 100000]
+"""
+import argparse
+import random
+import re
+import time
+from filters import FeedRules
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'shi', 'po', 've', 'da', 'zu', 'ri', 'gen', 'tor', 'bal']
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+def make_rules(count, channels, regex_fraction, rng):
+    rules = []
+    for n in range(count):
+        action = 'exclude' if n % 20 == 0 else 'route' if n % 5 == 0 else 'include'
+        if rng.random() < regex_fraction:
+            pattern, regex = f"{make_word(rng)}\\s+\\w*{rng.choice(SYLLABLES)}", True
+        else:
+            pattern, regex = make_word(rng), False
+        rules.append({'action': action, 'pattern': pattern, 'regex': regex,
+                      'channel_name': f"route-{n % channels}" if action == 'route' else None})
+    return rules
+
+def make_entries(count, rng):
+    vocabulary = [make_word(rng) for _ in range(20000)]
+    return [
+        ' '.join(rng.choices(vocabulary, k=rng.randint(6, 12))) + '\n'
+        + ' '.join(rng.choices(vocabulary, k=rng.randint(40, 80)))
+        for _ in range(count)
+    ]
+
+class PerRule:
+    """Every rule compiled on its own and tried against every entry"""
+
+    def __init__(self, rules):
+        self.rules = [
+            (rule, re.compile(rule['pattern'] if rule['regex'] else rf"(?<!\w){re.escape(rule['pattern'])}(?!\w)",
+                              re.IGNORECASE))
+            for rule in rules
+        ]
+
+    def match(self, text):
+        include, matched_include, routes = False, False, []
+        for rule, pattern in self.rules:
+            include = include or rule['action'] == 'include'
+            if not pattern.search(text):
+                continue
+            if rule['action'] == 'exclude':
+                return None
+            if rule['action'] == 'include':
+                matched_include = True
+            elif rule['channel_name'] not in routes:
+                routes.append(rule['channel_name'])
+        if include and not matched_include:
+            return None
+        return routes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=1000)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--channels', type=int, default=5)
+    parser.add_argument('--regex-fraction', type=float, default=0.1)
+    parser.add_argument('--sample', type=int, default=2000, help='entries matched by the per-rule loop')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    rules = make_rules(args.rules, args.channels, args.regex_fraction, rng)
+    entries = make_entries(args.entries, rng)
+    print(f"{args.rules} rules ({sum(rule['regex'] for rule in rules)} regexes), {args.entries} entries")
+
+    started = time.perf_counter()
+    combined = FeedRules(rules)
+    print(f"compile: {(time.perf_counter() - started) * 1000:.0f}ms combined")
+
+    per_rule = PerRule(rules)
+    sample = entries[:args.sample]
+    started = time.perf_counter()
+    expected = [per_rule.match(text) for text in sample]
+    per_rule_rate = len(sample) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = [combined.match(text) for text in entries]
+    combined_rate = len(entries) / (time.perf_counter() - started)
+
+    mismatches = sum(
+        (a is None) != (b is None) or (a is not None and sorted(a) != sorted(b))
+        for a, b in zip(expected, results)
+    )
+    kept = sum(result is not None for result in results)
+    routed = sum(bool(result) for result in results)
+    print(f"{'per rule':>10}: {per_rule_rate:10,.0f} entries/s ({args.entries / per_rule_rate:6.1f}s for all)")
+    print(f"{'combined':>10}: {combined_rate:10,.0f} entries/s ({args.entries / combined_rate:6.1f}s for all)")
+    print(f"kept {kept}, routed {routed}, {mismatches} mismatches in {len(sample)} sampled entries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Post history: batched inserts, index size, and full-text search at millions of posts.
+
+Fills the history with --posts synthetic posts (Zipf-distributed words over
+--feeds feeds), then times search_history for rare, common, multi-word,
+phrase and prefix queries, for a guild subscribed to every feed and one
+subscribed to a few, and compares with a LIKE scan of the same table.
+Finally trims the history to half its size as compaction would.
+
+Usage: python -m benchmarks.bench_search [--posts 1000000] [--feeds 1000]
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+from database import Database
+from benchmarks.fixtures import temp_db_path, remove_db, seed_feeds
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'shi', 'po', 've', 'da', 'zu', 'ri', 'gen', 'tor', 'bal']
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+def make_posts(count, feeds, words, cum_weights, rng, start=0):
+    posts = []
+    for n in range(start, start + count):
+        title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 10))).capitalize()
+        summary = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(30, 70))) + '.'
+        posts.append((feeds[n % len(feeds)], {
+            'post_id': f"{n:032x}", 'title': title, 'link': f"https://example.com/posts/{n}",
+            'author': rng.choice(words).capitalize(), 'summary': summary, 'image': None,
+            'published_date': datetime(2024, 1, 1 + n % 28)
+        }))
+    return posts
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def bench_inserts(db, feeds, words, weights, rng, count=2000, batch=200):
+    """Per-post transactions vs one transaction per polling cycle"""
+    posts = make_posts(count, feeds, words, weights, rng, start=10 ** 9)
+    started = time.perf_counter()
+    for post in posts[:count // 2]:
+        db.add_history([post])
+    single = (count // 2) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    rest = posts[count // 2:]
+    for n in range(0, len(rest), batch):
+        db.add_history(rest[n:n + batch])
+    batched = len(rest) / (time.perf_counter() - started)
+    print(f"inserts: {single:,.0f} posts/s one per transaction, {batched:,.0f} posts/s batched by {batch}")
+
+def time_query(db, query, guild_id, runs):
+    timings, result = [], None
+    for page in range(runs):
+        started = time.perf_counter()
+        result = db.search_history(query, guild_id, limit=5, offset=(page % 3) * 5)
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+def like_scan(db, word):
+    cursor = db.get_connection().cursor()
+    started = time.perf_counter()
+    cursor.execute('''
+        SELECT id FROM history WHERE title LIKE ? OR summary LIKE ? ORDER BY id DESC LIMIT 5
+    ''', (f"%{word}%", f"%{word}%"))
+    cursor.fetchall()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1_000_000)
+    parser.add_argument('--feeds', type=int, default=1000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    words = vocabulary(args.vocabulary, rng)
+    # Zipf: the nth most common word is n times rarer than the first
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        feed_ids = [feed['id'] for feed in seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])]
+        conn = sqlite3.connect(path)
+        conn.executemany('INSERT INTO subscriptions (feed_id, guild_id) VALUES (?, 1)', [(f,) for f in feed_ids])
+        conn.executemany('INSERT INTO subscriptions (feed_id, guild_id) VALUES (?, 2)', [(f,) for f in feed_ids[:10]])
+        conn.commit()
+        conn.close()
+
+        bench_inserts(db, feed_ids, words, weights, rng)
+
+        started = time.perf_counter()
+        for n in range(0, args.posts, 10000):
+            db.add_history(make_posts(min(10000, args.posts - n), feed_ids, words, weights, rng, start=n))
+        elapsed = time.perf_counter() - started
+        db.checkpoint()
+        print(f"history: {args.posts:,} posts in {elapsed:.0f}s (including generating them), "
+              f"{os.path.getsize(path) / args.posts:.0f} bytes/post on disk")
+
+        summary = db.get_connection().execute(
+            'SELECT summary FROM history WHERE id = ?', (args.posts // 2,)
+        ).fetchone()[0]
+        phrase = ' '.join(summary.split()[3:6])
+        queries = [
+            ('rare word', words[len(words) // 2]),
+            ('common word', words[2]),
+            ('two common words', f"{words[1]} {words[3]}"),
+            ('phrase', f'"{phrase}"'),
+            ('prefix', words[40][:3] + '*')
+        ]
+        print(f"{'':>18} {'all feeds p50':>14} {'p99':>8} {'10 feeds p50':>13} {'p99':>8}   results")
+        for label, query in queries:
+            everything, result = time_query(db, query, 1, args.runs)
+            few, few_result = time_query(db, query, 2, args.runs)
+            print(f"{label:>18} {percentile(everything, 50) * 1000:12.2f}ms {percentile(everything, 99) * 1000:6.2f}ms "
+                  f"{percentile(few, 50) * 1000:11.2f}ms {percentile(few, 99) * 1000:6.2f}ms   "
+                  f"{len(result['posts'])}{'+' if result['has_more'] else ''} / "
+                  f"{len(few_result['posts'])}{'+' if few_result['has_more'] else ''}")
+
+        print(f"LIKE scan: rare word {like_scan(db, words[-1]) * 1000:.0f}ms, "
+              f"common word {like_scan(db, words[2]) * 1000:.1f}ms (stops at the first 5 matches, unranked)")
+
+        started = time.perf_counter()
+        db.compact_posts(history_max_posts=args.posts // 2)
+        remaining = db.get_connection().execute('SELECT COUNT(*) FROM history').fetchone()[0]
+        print(f"retention: trimmed to {remaining:,} posts in {time.perf_counter() - started:.1f}s")
+        db.close()
+    finally:
+        remove_db(path)
+
+if __name__ == "__main__":
+    main()
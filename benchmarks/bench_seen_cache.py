@@ -0,0 +1,59 @@
+"""Seen-post dedup with and without the in-memory Bloom cache.
+
+Seeds --feeds x --entries seen posts, then polls every feed with --new fresh
+entries on top of the ones it already serves: once against SQLite alone, then
+twice through the cache (right after warm-up, then steady state).
+
+Usage: python -m benchmarks.bench_seen_cache [--feeds 10000] [--entries 100]
+"""
+import argparse
+import time
+from database import Database
+from rss_monitor import RSSMonitor
+from seen_cache import SeenPostCache
+from benchmarks.fixtures import temp_db_path, remove_db, seed_feeds, seed_posts
+from benchmarks.bench_dedup import poll_ids
+
+def sweep(feeds, record, entries, new, label):
+    start = time.perf_counter()
+    found = 0
+    for feed in feeds:
+        found += len(record(feed['id'], poll_ids(feed['id'], label, entries, new, entries)))
+    return time.perf_counter() - start, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=10000)
+    parser.add_argument('--entries', type=int, default=100)
+    parser.add_argument('--new', type=int, default=2)
+    parser.add_argument('--budget-mb', type=float, default=256)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        db = Database(db_path)
+        feeds = seed_feeds(db, [f"http://example.com/{i}" for i in range(args.feeds)])
+        print(f"seeding {args.feeds * args.entries} posts...")
+        seed_posts(db, [feed['id'] for feed in feeds], args.entries)
+
+        total = args.feeds * args.entries
+        elapsed, found = sweep(feeds, db.record_new_posts, args.entries, args.new, 'db')
+        print(f"sqlite only: {elapsed:7.2f}s  {total / elapsed:9.0f} entries/s  {found} new")
+
+        cache = SeenPostCache(budget_bytes=int(args.budget_mb * 1024 * 1024))
+        monitor = RSSMonitor(db, seen_cache=cache)
+        start = time.perf_counter()
+        monitor.warm_seen_cache()
+        print(f"warm-up:     {time.perf_counter() - start:7.2f}s  {len(cache.feeds)} feeds  "
+              f"{cache.used_bytes / 1024 / 1024:.1f} MB")
+
+        for sweep_no in range(2):
+            elapsed, found = sweep(feeds, monitor.record_new_posts, args.entries, args.new,
+                                   f"cache-{sweep_no}")
+            print(f"bloom cache: {elapsed:7.2f}s  {total / elapsed:9.0f} entries/s  {found} new")
+            print(f"  stats: {cache.stats}")
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Service startup and graceful shutdown.
+
+Measures the import cost of the runtime in fresh interpreters (feedparser is
+now imported lazily by the parsing pool; streamlit only by the dashboard
+process), then starts the runtime on a seeded database without logging in to
+Discord: time until /health answers 200, and how long shutdown takes to
+flush the posts restored from the outbox to rate-limited fake channels. The
+first shutdown has a short timeout and keeps the undelivered rest in the
+outbox; the second start restores and flushes it.
+
+Usage: python -m benchmarks.bench_startup [--feeds 2000] [--posts 50] [--outbox 200]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import aiohttp
+from database import Database
+from delivery import DeliveryQueue
+from control import ControlServer
+from benchmarks.fixtures import FakeChannel, temp_db_path, remove_db, seed_feeds, seed_posts
+
+IMPORTS = [
+    ('interpreter only', 'pass'),
+    ('runtime (lazy feedparser)', 'import bot'),
+    ('runtime, eager feedparser (before)', 'import feedparser, bot'),
+    ('runtime + streamlit in-process', 'import streamlit, bot')
+]
+
+def import_seconds(statement, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', statement], capture_output=True)
+        timings.append(time.perf_counter() - started)
+        if result.returncode:
+            return None
+    return statistics.median(timings)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def fill_outbox(db, posts, channels):
+    payload = json.dumps({'title': 'Queued post', 'description': 'Lorem ipsum dolor sit amet. ' * 10})
+    for n in range(posts):
+        db.add_outbox(1000 + n % channels, 1, [payload])
+
+async def run(path, args, timeout):
+    # Imported here so its cost is not counted twice with the subprocess runs above
+    from bot import DiscordBot
+
+    fake_channels = {}
+    def resolve(channel_id):
+        return fake_channels.setdefault(channel_id, FakeChannel(channel_id, limit=1000, latency=args.latency))
+
+    started = time.perf_counter()
+    bot = DiscordBot('unused', db=Database(path))
+    bot.delivery = DeliveryQueue(bot.db, resolve, channel_rate=args.rate, channel_burst=args.rate,
+                                 global_rate=args.rate * args.channels, global_burst=args.rate,
+                                 owner=bot.partitions.owner)
+    port = free_port()
+    bot.control = ControlServer(bot.handle_actions, port=port, status=bot.status)
+    constructed = time.perf_counter() - started
+
+    await bot.control.start()
+    await bot.startup()
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/health") as response:
+            status = response.status
+            health = await response.json()
+    ready = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await bot.shutdown(timeout)
+    shutdown = time.perf_counter() - started
+
+    delivered = sum(len(embeds) for channel in fake_channels.values() for _, embeds in channel.messages)
+    return {'constructed': constructed, 'ready': ready, 'status': status, 'health': health,
+            'shutdown': shutdown, 'delivered': delivered}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=50, help='seen posts per feed')
+    parser.add_argument('--outbox', type=int, default=600, help='posts queued at startup')
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=2, help='messages per second per channel')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per send')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"import cost (median of {args.runs} fresh interpreters):")
+    for label, statement in IMPORTS:
+        seconds = import_seconds(statement, args.runs)
+        print(f"  {label:>36}: " + (f"{seconds * 1000:6.0f}ms" if seconds is not None else 'not installed'))
+
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        feeds = seed_feeds(db, [f"http://example.invalid/{i}" for i in range(args.feeds)])
+        seed_posts(db, [feed['id'] for feed in feeds], args.posts)
+        fill_outbox(db, args.outbox, args.channels)
+        db.close()
+        print(f"{args.feeds} feeds x {args.posts} seen posts, {args.outbox} posts queued in "
+              f"{args.channels} channels")
+
+        # The second start restores what the first shutdown left in the outbox
+        left = args.outbox
+        for label, timeout in [('1s shutdown timeout', 1.0), ('restart, full flush', 60.0)]:
+            restored = left
+            result = asyncio.run(run(path, args, timeout))
+            db = Database(path)
+            left = len(db.get_outbox())
+            db.close()
+            print(f"  {label}: constructed in {result['constructed'] * 1000:.0f}ms, /health {result['status']} "
+                  f"after {result['ready'] * 1000:.0f}ms with {restored} posts restored; shutdown "
+                  f"{result['shutdown']:.2f}s, {result['delivered']} delivered, {left} kept in the outbox")
+    finally:
+        remove_db(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Streaming parse vs full parse on large, newest-first feeds.
+
+A local server trickles --feeds feeds of about 5 MB each at --bandwidth.
+After a first full poll, --new entries are published to every feed and the
+feeds are polled once with full parsing and once (after another publish)
+with streaming, which stops after a run of already-seen entries.
+
+Usage: python -m benchmarks.bench_stream [--feeds 4] [--entries 2500] [--new 2]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from database import Database
+from rss_monitor import RSSMonitor
+from config import STREAM_ORDERED_POLLS
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db, seed_feeds
+
+async def poll(monitor, db, server):
+    feeds = db.get_all_feeds()
+    before = server.bytes_sent
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        new_posts = await monitor.check_feeds(feeds)
+    elapsed = time.perf_counter() - start
+    await monitor.fetcher.close()
+    return {
+        'elapsed': elapsed,
+        'bytes_read': monitor.last_cycle_stats['bytes_downloaded'],
+        'bytes_sent': server.bytes_sent - before,
+        'new': sum(len(posts) for posts in new_posts.values()),
+        'streamed': monitor.last_cycle_stats['streamed']
+    }
+
+def report(label, result, feeds):
+    print(f"{label:>12} {result['elapsed']:7.2f}s {result['elapsed'] / feeds * 1000:9.0f}ms "
+          f"{result['bytes_read'] / 1e6:9.2f}MB {result['bytes_sent'] / 1e6:9.2f}MB "
+          f"{result['new']:>5} {result['streamed']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=2500, help='entries per feed')
+    parser.add_argument('--summary-size', type=int, default=1800, help='HTML bytes per entry')
+    parser.add_argument('--new', type=int, default=2, help='entries published between polls')
+    parser.add_argument('--bandwidth', type=float, default=50e6, help='server bytes/s per feed')
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(feeds=args.feeds, entries=args.entries, summary_size=args.summary_size,
+                        bandwidth=args.bandwidth) as server:
+            db = Database(db_path)
+            feeds = seed_feeds(db, server.urls())
+            monitor = RSSMonitor(db, stream=True)
+            print(f"{args.feeds} feeds of {len(server.body(0)) / 1e6:.1f} MB, "
+                  f"{args.new} new entries per poll")
+
+            first = asyncio.run(poll(monitor, db, server))
+            ordered = sum(feed['ordered_polls'] > 0 for feed in db.get_all_feeds())
+            print(f"first poll: {first['new']} posts, {ordered}/{args.feeds} feeds detected newest-first")
+
+            print(f"{'':>12} {'total':>8} {'per feed':>10} {'read':>11} {'sent':>11} {'new':>5} {'stopped':>9}")
+            server.publish(args.new)
+            monitor.stream = False
+            report('full parse', asyncio.run(poll(monitor, db, server)), args.feeds)
+
+            # Skip the detection warm-up: mark the feeds as proven newest-first
+            db.get_connection().execute('UPDATE feeds SET ordered_polls = ?', (STREAM_ORDERED_POLLS,))
+            db.get_connection().commit()
+            server.publish(args.new)
+            monitor.stream = True
+            report('streaming', asyncio.run(poll(monitor, db, server)), args.feeds)
+            db.close()
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Shared fixtures for the benchmarks: a local feed server and database helpers"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from aiohttp import web
+
+def make_rss(feed_index, entries=20, start=0, summary_size=200):
+    """Build a synthetic RSS 2.0 document, newest entry first"""
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    items = []
+    for n in range(start + entries - 1, start - 1, -1):
+        published = format_datetime(now + timedelta(minutes=n))
+        summary = ('<p>Lorem ipsum <b>dolor</b> sit amet. </p>' * (summary_size // 40 + 1))[:summary_size]
+        items.append(
+            f"<item><title>Feed {feed_index} post {n}</title>"
+            f"<link>http://example.com/{feed_index}/{n}</link>"
+            f"<guid>feed-{feed_index}-post-{n}</guid>"
+            f"<pubDate>{published}</pubDate>"
+            f"<description><![CDATA[{summary}]]></description></item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rss version="2.0"><channel>'
+        f'<title>Feed {feed_index}</title><link>http://example.com/{feed_index}</link>'
+        f'<description>Synthetic feed {feed_index}</description>'
+        + ''.join(items) +
+        '</channel></rss>'
+    ).encode()
+
+def make_atom(feed_index, entries=20, start=0, summary_size=200):
+    """Build a synthetic Atom 1.0 document, newest entry first"""
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    items = []
+    for n in range(start + entries - 1, start - 1, -1):
+        updated = (now + timedelta(minutes=n)).isoformat()
+        summary = ('<p>Lorem ipsum <b>dolor</b> sit amet. </p>' * (summary_size // 40 + 1))[:summary_size]
+        items.append(
+            f"<entry><title>Feed {feed_index} post {n}</title>"
+            f'<link href="http://example.com/{feed_index}/{n}"/>'
+            f"<id>urn:feed-{feed_index}-post-{n}</id>"
+            f"<updated>{updated}</updated>"
+            f"<author><name>Author {n % 7}</name></author>"
+            f'<link rel="enclosure" type="image/png" href="http://example.com/{feed_index}/{n}.png"/>'
+            f'<summary type="html"><![CDATA[{summary}]]></summary></entry>'
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title>Feed {feed_index}</title><id>urn:feed-{feed_index}</id>'
+        f'<updated>{now.isoformat()}</updated>'
+        + ''.join(items) +
+        '</feed>'
+    ).encode()
+
+class FeedServer:
+    """aiohttp server serving synthetic feeds at /feed/<n>, run on a background thread.
+
+    faults ({index: 'hang' | 'error' | 'truncate'}) makes some feeds never
+    answer, answer 503, or drop the connection half-way through the body.
+    error_rate answers 503 for that fraction of feeds, picked afresh (but
+    reproducibly) each time new entries are published. sizes ({index: entries})
+    serves some feeds with more (or fewer) entries than the rest.
+    """
+
+    def __init__(self, feeds=1000, entries=20, latency=0.0, validators=True,
+                 host='127.0.0.1', port=0, summary_size=200, bandwidth=None, faults=None,
+                 error_rate=0.0, sizes=None):
+        self.feeds = feeds
+        self.faults = dict(faults or {})
+        self.error_rate = error_rate
+        self.errors = 0
+        self.entries = entries
+        self.sizes = dict(sizes or {})
+        self.latency = latency
+        self.summary_size = summary_size
+        self.bandwidth = bandwidth  # bytes/s; None sends each body in one write
+        self.published = 0
+        self.churned = {}  # Entries published to single feeds, on top of published
+        self.validators = validators
+        self.not_modified = 0
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bodies = {}
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def version(self, index):
+        """Number of entries published to a feed so far"""
+        return self.published + self.churned.get(index, 0)
+
+    def body(self, index):
+        if index not in self.bodies:
+            self.bodies[index] = make_rss(
+                index, self.sizes.get(index, self.entries), start=self.version(index), summary_size=self.summary_size
+            )
+        return self.bodies[index]
+
+    def publish(self, count=1, indexes=None):
+        """Add count new entries to the top of every feed, or of the given ones (the oldest drop off)"""
+        if indexes is None:
+            self.published += count
+            self.bodies = {}
+            return
+        for index in indexes:
+            self.churned[index] = self.churned.get(index, 0) + count
+            self.bodies.pop(index, None)
+
+    def failing(self, index):
+        """Whether error_rate picks this feed to fail at its current version"""
+        digest = hashlib.md5(f"{index}-{self.version(index)}".encode()).digest()
+        return int.from_bytes(digest[:4], 'big') < self.error_rate * 2 ** 32
+
+    async def handle_feed(self, request):
+        self.requests += 1
+        index = int(request.match_info['index'])
+        if index >= self.feeds:
+            raise web.HTTPNotFound()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        fault = self.faults.get(index)
+        if fault:
+            return await self.handle_fault(request, fault, self.body(index))
+        if self.error_rate and self.failing(index):
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+        body = self.body(index)
+        headers = {}
+        if self.validators:
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            last_modified = format_datetime(
+                datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=self.version(index)),
+                usegmt=True
+            )
+            headers = {'ETag': etag, 'Last-Modified': last_modified}
+            if (request.headers.get('If-None-Match') == etag
+                    or request.headers.get('If-Modified-Since') == last_modified):
+                self.not_modified += 1
+                return web.Response(status=304, headers=headers)
+        if not self.bandwidth:
+            self.bytes_sent += len(body)
+            return web.Response(body=body, content_type='application/rss+xml', headers=headers)
+
+        # Trickle the body out so clients can stop reading part-way
+        response = web.StreamResponse(headers=headers)
+        response.content_type = 'application/rss+xml'
+        response.content_length = len(body)
+        await response.prepare(request)
+        chunk = 16384
+        try:
+            for start in range(0, len(body), chunk):
+                await response.write(body[start:start + chunk])
+                self.bytes_sent += len(body[start:start + chunk])
+                await asyncio.sleep(chunk / self.bandwidth)
+        except (ConnectionResetError, ConnectionError):
+            pass
+        return response
+
+    async def handle_fault(self, request, fault, body):
+        if fault == 'error':
+            raise web.HTTPServiceUnavailable()
+        if fault == 'hang':
+            # Accept the request and say nothing until the client gives up
+            while request.transport is not None and not request.transport.is_closing():
+                await asyncio.sleep(0.05)
+            return web.Response()
+
+        # truncate: promise the whole body, send half of it and hang up
+        response = web.StreamResponse()
+        response.content_type = 'application/rss+xml'
+        response.content_length = len(body)
+        await response.prepare(request)
+        await response.write(body[:len(body) // 2])
+        self.bytes_sent += len(body) // 2
+        request.transport.close()
+        return response
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/feed/{index}', self.handle_feed)
+        return app
+
+    def url(self, index):
+        return f"http://{self.host}:{self.port}/feed/{index}"
+
+    def urls(self):
+        return [self.url(i) for i in range(self.feeds)]
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port, backlog=4096)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def temp_db_path():
+    """Return a path for a throwaway SQLite database"""
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='rss-bench-')
+    os.close(fd)
+    os.remove(path)
+    return path
+
+def remove_db(path):
+    """Delete a benchmark database along with its WAL files"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def seed_feeds(db, urls):
+    """Insert feeds directly, skipping the validation fetch; returns feed dicts"""
+    conn = sqlite3.connect(db.db_file)
+    conn.executemany(
+        'INSERT INTO feeds (url, title, channel_name) VALUES (?, ?, ?)',
+        [(url, f"Feed {i}", f"feed-{i}") for i, url in enumerate(urls)]
+    )
+    conn.commit()
+    conn.close()
+    return db.get_all_feeds()
+
+def clear_posts(db):
+    conn = sqlite3.connect(db.db_file)
+    conn.execute('DELETE FROM posts')
+    conn.commit()
+    conn.close()
+
+def seed_posts(db, feed_ids, per_feed, batch=50000):
+    """Bulk-insert synthetic seen posts ('<feed>-<n>' hashed like real IDs)"""
+    conn = sqlite3.connect(db.db_file)
+    rows = []
+    for feed_id in feed_ids:
+        for n in range(per_feed):
+            rows.append((feed_id, hashlib.md5(f"{feed_id}-{n}".encode()).digest()))
+            if len(rows) >= batch:
+                conn.executemany('INSERT INTO posts (feed_id, post_id) VALUES (?, ?)', rows)
+                rows = []
+    if rows:
+        conn.executemany('INSERT INTO posts (feed_id, post_id) VALUES (?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+class FakeResponse:
+    """Stand-in for the aiohttp response discord.HTTPException expects"""
+
+    def __init__(self, status, retry_after=None):
+        self.status = status
+        self.reason = 'Too Many Requests' if status == 429 else 'Error'
+        self.headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+
+class FakeChannel:
+    """Discord text channel stand-in that records sends and enforces a route rate limit"""
+
+    def __init__(self, channel_id, name=None, limit=5, per=5.0, latency=0.0, guild=None):
+        self.id = channel_id
+        self.name = name or f"channel-{channel_id}"
+        self.guild = guild
+        self.limit = limit
+        self.per = per
+        self.latency = latency
+        self.calls = 0
+        self.rate_limited = 0
+        self.messages = []
+        self.window = []
+
+    async def send(self, content=None, embed=None, embeds=None):
+        import time
+        import discord
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        self.window = [t for t in self.window if now - t < self.per]
+        if len(self.window) >= self.limit:
+            self.rate_limited += 1
+            retry_after = round(self.per - (now - self.window[0]), 3)
+            raise discord.HTTPException(FakeResponse(429, retry_after), 'You are being rate limited.')
+        self.window.append(now)
+        embeds = embeds or ([embed] if embed else [])
+        self.messages.append((now, embeds))
+        return len(self.messages)
+
+class FakeGuild:
+    """Discord guild stand-in holding FakeChannels, with slow channel creation
+
+    limit and per set the rate limit of the guild's channels.
+    """
+
+    def __init__(self, guild_id=1, channel_names=(), create_latency=0.0, limit=5, per=5.0):
+        self.id = guild_id
+        self.create_latency = create_latency
+        self.limit = limit
+        self.per = per
+        self.creates = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._channels = {}
+        self._next_id = guild_id * 1_000_000
+        for name in channel_names:
+            self._add(name)
+
+    def _add(self, name):
+        self._next_id += 1
+        channel = self._channels[self._next_id] = FakeChannel(
+            self._next_id, name=name, limit=self.limit, per=self.per, guild=self
+        )
+        return channel
+
+    @property
+    def channels(self):
+        return list(self._channels.values())
+
+    @property
+    def text_channels(self):
+        return list(self._channels.values())
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    async def create_text_channel(self, name, topic=None):
+        self.creates += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.create_latency)
+        finally:
+            self.in_flight -= 1
+        return self._add(name)
+
+class FakeGateway:
+    """All guilds of the fake Discord, split into shards"""
+
+    def __init__(self, guilds, shards=1, **guild_options):
+        self.guilds = {guild_id: FakeGuild(guild_id, **guild_options) for guild_id in range(1, guilds + 1)}
+        self.shards = shards
+
+    def channel(self, channel_id):
+        return self.guilds[channel_id // 1_000_000].get_channel(channel_id)
+
+    def channels(self):
+        return [channel for guild in self.guilds.values() for channel in guild.channels]
+
+    def client(self, shard_ids=None):
+        if shard_ids is None:
+            shard_ids = range(self.shards)
+        return FakeClient(self, [g for g in self.guilds.values() if g.id % self.shards in shard_ids])
+
+class FakeClient:
+    """The slice of discord.Client the bot uses, for one process's shards"""
+
+    def __init__(self, gateway, guilds):
+        self.gateway = gateway
+        self.guilds = guilds
+        self.user = 'fake-bot'
+        self._guilds = {guild.id: guild for guild in guilds}
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        guild = self._guilds.get(channel_id // 1_000_000)
+        return guild.get_channel(channel_id) if guild else None
+
+    def get_partial_messageable(self, channel_id):
+        return self.gateway.channel(channel_id)
@@ -0,0 +1,134 @@
+"""Delivery lag under a burst: queueing after the whole cycle vs budgeted turns.
+
+Runs the real DiscordBot cycle against a local FeedServer and a fake Discord
+gateway. In the same cycle --heavy popular feeds (subscribed in every one of
+--guilds guilds, and first in polling order) publish a burst of --burst
+entries, --slow feeds hang until the --timeout fetch deadline, and --feeds
+small feeds (one guild each) publish --new entries. The cycle runs twice on
+fresh databases:
+
+  in order  TURN_ITEMS=0: posts are queued once every feed has been
+            checked, each feed's in one go (the old ordering), so the small
+            feeds wait for the slowest fetch and for the burst
+  turns     each feed's posts are queued in budgeted turns as soon as it
+            has been checked (--turn-items / --turn-seconds)
+
+Lag is measured from the start of the cycle to each post reaching its
+channel (the synthetic entries' publish dates are years old, so
+rss_delivery_lag_seconds would only measure the fixture). Reports lag
+percentiles of the small feeds' posts and when the heavy feeds finished.
+
+Parsing runs in the usual process pool, so on a machine with few cores the
+small feeds' parses still queue behind the heavy ones. Both runs send in
+per-feed turns at the global rate limit; it only binds when --global-rate is
+below what the channels can take (e.g. --global-rate 150).
+
+Usage: python -m benchmarks.sim_fairness [--feeds 200] [--heavy 3] [--burst 500] [--slow 2]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from bot import DiscordBot
+from database import Database
+from delivery import DeliveryQueue
+from feed_fetcher import FeedFetcher
+from benchmarks.bench_e2e import percentiles
+from benchmarks.fixtures import FeedServer, FakeGateway, temp_db_path, remove_db, seed_feeds
+
+async def run(args, turn_items, db_path):
+    heavy = range(args.heavy)
+    small = range(args.heavy, args.heavy + args.feeds)
+    slow = range(args.heavy + args.feeds, args.heavy + args.feeds + args.slow)
+    sizes = {index: args.burst for index in heavy}
+    with FeedServer(feeds=args.heavy + args.feeds + args.slow, entries=args.new + 3, sizes=sizes) as server:
+        gateway = FakeGateway(args.guilds, limit=max(1, int(args.channel_rate)), per=1.0)
+        bot = DiscordBot(None, db=Database(db_path), control=False)
+        bot.bot = gateway.client()
+        bot.delivery = DeliveryQueue(
+            bot.db, bot.resolve_channel, channel_rate=args.channel_rate,
+            global_rate=args.global_rate, global_burst=int(args.global_rate), owner=bot.partitions.owner
+        )
+        bot.rss_monitor.fetcher = FeedFetcher(timeout=args.timeout)
+        bot.turns.items = turn_items
+        bot.turns.seconds = args.turn_seconds
+        feeds = seed_feeds(bot.db, server.urls())
+        bot.renew_partitions()
+        # Small feeds go to guild 1; the heavy ones to every guild
+        await bot.create_channels_for_existing_feeds()
+        for feed in feeds[:args.heavy]:
+            for guild_id in range(2, args.guilds + 1):
+                bot.db.subscribe(feed['id'], guild_id)
+
+        async def cycle():
+            for feed in feeds:
+                bot.scheduler.poll_now(feed['id'])
+            started = time.monotonic()
+            await bot.process_feeds()
+            polled = time.monotonic()
+            await bot.delivery.flush()
+            return started, polled
+
+        try:
+            # Every feed has been seen once before the burst
+            await cycle()
+            sent_before = {channel.id: len(channel.messages) for channel in gateway.channels()}
+            server.publish(args.burst, heavy)
+            server.publish(args.new, small)
+            server.faults.update((index, 'hang') for index in slow)
+            started, polled = await cycle()
+        finally:
+            await bot.delivery.close()
+            await bot.rss_monitor.fetcher.close()
+            bot.db.close()
+
+    lags, heavy_done, heavy_posts = [], 0.0, 0
+    for channel in gateway.channels():
+        index = int(channel.name.rsplit('-', 1)[1])
+        for sent_at, embeds in channel.messages[sent_before.get(channel.id, 0):]:
+            lag = sent_at - started
+            if index < args.heavy:
+                heavy_done = max(heavy_done, lag)
+                heavy_posts += len(embeds)
+            else:
+                lags += [lag] * len(embeds)
+    return {
+        'poll': polled - started,
+        'small': percentiles(lags),
+        'small_posts': len(lags),
+        'heavy_posts': heavy_posts,
+        'heavy_done': heavy_done,
+        'stats': dict(bot.delivery.stats)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=200, help='small feeds')
+    parser.add_argument('--new', type=int, default=2, help='entries each small feed publishes')
+    parser.add_argument('--heavy', type=int, default=3, help='popular feeds publishing a burst')
+    parser.add_argument('--burst', type=int, default=500, help='entries each heavy feed publishes')
+    parser.add_argument('--guilds', type=int, default=20, help='guilds subscribed to the heavy feeds')
+    parser.add_argument('--slow', type=int, default=2, help='feeds that hang until the fetch deadline')
+    parser.add_argument('--timeout', type=float, default=5, help='fetch deadline (s, scaled down)')
+    parser.add_argument('--turn-items', type=int, default=500)
+    parser.add_argument('--turn-seconds', type=float, default=0.02)
+    parser.add_argument('--channel-rate', type=float, default=20, help='messages/s per channel (scaled up)')
+    parser.add_argument('--global-rate', type=float, default=500, help='messages/s overall (scaled up)')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    print(f"{args.heavy} heavy feeds x {args.burst} posts x {args.guilds} guilds, "
+          f"{args.feeds} small feeds x {args.new} posts, {args.slow} hanging feeds")
+    print(f"{'':>9} {'poll':>7} {'small p50':>10} {'p90':>7} {'p99':>7} {'max':>7} {'heavy done':>11} {'posts':>7}")
+    for label, turn_items in (('in order', 0), ('turns', args.turn_items)):
+        path = temp_db_path()
+        try:
+            result = asyncio.run(run(args, turn_items, path))
+        finally:
+            remove_db(path)
+        small = result['small']
+        print(f"{label:>9} {result['poll']:6.2f}s {small['p50']:9.2f}s {small['p90']:6.2f}s {small['p99']:6.2f}s "
+              f"{small['max']:6.2f}s {result['heavy_done']:10.2f}s {result['small_posts'] + result['heavy_posts']:>7}")
+
+if __name__ == "__main__":
+    main()
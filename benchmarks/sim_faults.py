@@ -0,0 +1,118 @@
+"""Dead and slow feeds: exponential backoff alone vs the circuit breaker.
+
+Polls a local server where some feeds hang, some answer 503 and some drop
+the connection half-way through the body, replaying --cycles polling ticks
+in simulated time (real requests, simulated clock). Then the 503 feeds come
+back and the breaker has to notice on its next probes.
+
+Usage: python -m benchmarks.sim_faults [--feeds 40] [--faulty 4] [--cycles 48]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from database import Database
+from feed_fetcher import FeedFetcher
+from rss_monitor import RSSMonitor
+from scheduler import FeedScheduler
+from benchmarks.fixtures import FeedServer, temp_db_path, remove_db, seed_feeds
+
+FAULTS = ('hang', 'error', 'truncate')
+
+async def simulate(db, scheduler, monitor, cycles, tick, clock):
+    """Run cycles polling ticks; returns (seconds spent polling, requests per feed ID)"""
+    requests, spent = {}, 0.0
+    for _ in range(cycles):
+        due = set(scheduler.pop_due())
+        feeds = [feed for feed in db.get_all_feeds() if feed['id'] in due]
+        if feeds:
+            started = time.perf_counter()
+            await monitor.check_feeds(feeds)
+            spent += time.perf_counter() - started
+            for feed in feeds:
+                requests[feed['id']] = requests.get(feed['id'], 0) + 1
+                outcome = monitor.last_outcomes[feed['id']]
+                if outcome['ok']:
+                    scheduler.record_success(feed['id'], outcome['new_posts'], outcome['min_interval'])
+                else:
+                    scheduler.record_failure(feed['id'], outcome['retry_after'])
+        clock[0] += tick
+    return spent, requests
+
+def run(server, faulty, args, breaker):
+    path = temp_db_path()
+    try:
+        db = Database(path)
+        feeds = seed_feeds(db, server.urls())
+        clock = [0.0]
+        scheduler = FeedScheduler(
+            base_interval=args.interval, min_interval=args.interval, max_interval=args.interval,
+            max_backoff=args.max_backoff, probe_interval=args.probe_interval,
+            circuit_failures=args.failures if breaker else 0, clock=lambda: clock[0], seed=1
+        )
+        for feed in feeds:
+            scheduler.add(feed['id'], now=0, delay=0)
+        monitor = RSSMonitor(
+            db, FeedFetcher(timeout=args.timeout, concurrency=len(feeds), per_host=len(feeds)),
+            circuit_failures=args.failures if breaker else 0, probe_timeout=args.probe_timeout
+        )
+
+        async def both_phases():
+            try:
+                server.faults = dict(faulty)
+                failing = await simulate(db, scheduler, monitor, args.cycles, args.interval, clock)
+                # The 503 feeds are fixed; the hung and truncated ones stay broken
+                server.faults = {index: fault for index, fault in faulty.items() if fault != 'error'}
+                recovery = await simulate(db, scheduler, monitor, args.cycles, args.interval, clock)
+                return failing, recovery
+            finally:
+                await monitor.fetcher.close()
+
+        (spent, requests), (recovery_spent, _) = asyncio.run(both_phases())
+        health = {feed['id']: feed for feed in db.search_feeds(limit=len(feeds))['feeds']}
+        db.close()
+        return spent, recovery_spent, requests, health
+    finally:
+        remove_db(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=40)
+    parser.add_argument('--faulty', type=int, default=4, help='feeds per fault kind')
+    parser.add_argument('--cycles', type=int, default=48, help='polling ticks per phase')
+    parser.add_argument('--interval', type=float, default=300, help='simulated seconds per tick')
+    parser.add_argument('--max-backoff', type=float, default=3600, help='simulated seconds')
+    parser.add_argument('--probe-interval', type=float, default=7200, help='simulated seconds')
+    parser.add_argument('--failures', type=int, default=3, help='failures before the circuit opens')
+    parser.add_argument('--timeout', type=float, default=2.0, help='real seconds per request')
+    parser.add_argument('--probe-timeout', type=float, default=0.5, help='real seconds per probe')
+    args = parser.parse_args()
+    # Every failed poll logs an error; only the summary matters here
+    logging.disable(logging.ERROR)
+
+    faulty = {}
+    for kind, fault in enumerate(FAULTS):
+        for n in range(args.faulty):
+            faulty[kind * args.faulty + n] = fault
+
+    with FeedServer(feeds=args.feeds) as server:
+        print(f"{args.feeds} feeds, {args.faulty} each hanging / 503 / truncated; "
+              f"{args.cycles} ticks of {args.interval:.0f}s per phase, {args.timeout}s request timeout")
+        print(f"{'':>16} {'polling':>9} {'recovery':>9} {'faulty requests':>16}   final health (consecutive failures)")
+        for label, breaker in [('backoff only', False), ('circuit breaker', True)]:
+            spent, recovery_spent, requests, health = run(server, faulty, args, breaker)
+            # Feed IDs start at 1 in server index order
+            faulty_requests = sum(requests.get(index + 1, 0) for index in faulty)
+            final = ', '.join(
+                f"{fault} {max(health[index + 1]['consecutive_failures'] for index in faulty if faulty[index] == fault)}"
+                for fault in FAULTS
+            )
+            print(f"{label:>16} {spent:8.2f}s {recovery_spent:8.2f}s {faulty_requests:16}   {final}")
+
+        errors = {fault: next(health[index + 1]['last_error'] for index in faulty if faulty[index] == fault)
+                  for fault in ('hang', 'truncate')}
+        for fault, error in errors.items():
+            print(f"last error ({fault}): {error}")
+
+if __name__ == "__main__":
+    main()
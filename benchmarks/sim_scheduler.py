@@ -0,0 +1,122 @@
+"""Simulated request volume: fixed sweep vs the adaptive FeedScheduler.
+
+Generates a synthetic feed population whose posting rates range from a few
+minutes to a few weeks between posts (some publishing <ttl> hints, some
+permanently failing) and replays --days of polling in simulated time.
+Reports requests and the delay from each post to the poll that sees it,
+also without the <ttl> feeds (which ask to be polled at most hourly).
+
+Usage: python -m benchmarks.sim_scheduler [--feeds 1000] [--days 7]
+"""
+import argparse
+import bisect
+import random
+from scheduler import FeedScheduler
+
+def make_population(count, days, seed):
+    rng = random.Random(seed)
+    horizon = days * 86400
+    feeds = []
+    for feed_id in range(count):
+        # Mean time between posts: log-uniform between 5 minutes and 3 weeks
+        mean_gap = 10 ** rng.uniform(2.5, 6.3)
+        times, t = [], rng.expovariate(1 / mean_gap)
+        while t < horizon:
+            times.append(t)
+            t += rng.expovariate(1 / mean_gap)
+        feeds.append({
+            'id': feed_id,
+            'posts': times,
+            'ttl': 3600 if rng.random() < 0.1 else None,
+            'failing': rng.random() < 0.05
+        })
+    return feeds
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def detection_delays(posts, poll_times):
+    """Delay between each post and the first poll after it"""
+    delays = []
+    for t in posts:
+        i = bisect.bisect_left(poll_times, t)
+        if i < len(poll_times):
+            delays.append(poll_times[i] - t)
+    return delays
+
+def simulate_fixed(feeds, days, interval):
+    polls = [i * interval for i in range(int(days * 86400 / interval) + 1)]
+    delays, unhinted = [], []
+    for feed in feeds:
+        if not feed['failing']:
+            feed_delays = detection_delays(feed['posts'], polls)
+            delays += feed_delays
+            if not feed['ttl']:
+                unhinted += feed_delays
+    return {'requests': len(polls) * len(feeds), 'peak_per_tick': len(feeds), 'delays': delays,
+            'unhinted': unhinted}
+
+def simulate_adaptive(feeds, days, interval, tick, seed):
+    clock = [0.0]
+    scheduler = FeedScheduler(base_interval=interval, clock=lambda: clock[0], seed=seed)
+    by_id = {feed['id']: feed for feed in feeds}
+    scheduler.sync(by_id)
+    polls = {feed_id: [] for feed_id in by_id}
+    last_poll = {feed_id: 0.0 for feed_id in by_id}
+    requests = peak = 0
+
+    while clock[0] <= days * 86400:
+        due = scheduler.pop_due()
+        requests += len(due)
+        peak = max(peak, len(due))
+        for feed_id in due:
+            feed = by_id[feed_id]
+            if feed['failing']:
+                scheduler.record_failure(feed_id)
+                continue
+            posts = feed['posts']
+            new = bisect.bisect_right(posts, clock[0]) - bisect.bisect_right(posts, last_poll[feed_id])
+            last_poll[feed_id] = clock[0]
+            polls[feed_id].append(clock[0])
+            scheduler.record_success(feed_id, new, feed['ttl'])
+        clock[0] += tick
+
+    delays, unhinted = [], []
+    for feed in feeds:
+        if not feed['failing']:
+            feed_delays = detection_delays(feed['posts'], polls[feed['id']])
+            delays += feed_delays
+            if not feed['ttl']:
+                unhinted += feed_delays
+    return {'requests': requests, 'peak_per_tick': peak, 'delays': delays, 'unhinted': unhinted}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--feeds', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--interval', type=float, default=300, help='fixed sweep / base interval (s)')
+    parser.add_argument('--tick', type=float, default=15)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    feeds = make_population(args.feeds, args.days, args.seed)
+    total_posts = sum(len(feed['posts']) for feed in feeds)
+    print(f"{args.feeds} feeds, {total_posts} posts over {args.days:g} days")
+
+    results = {
+        'fixed sweep': simulate_fixed(feeds, args.days, args.interval),
+        'adaptive': simulate_adaptive(feeds, args.days, args.interval, args.tick, args.seed)
+    }
+    # Feeds with a <ttl> ask to be polled hourly at most, so their posts wait longer by design
+    print(f"{'':>12} {'requests':>10} {'peak/tick':>10} {'delay p50':>10} {'delay p95':>10} {'p95 no ttl':>11}")
+    for label, result in results.items():
+        delays = result['delays']
+        print(f"{label:>12} {result['requests']:>10} {result['peak_per_tick']:>10} "
+              f"{percentile(delays, 50) / 60:>9.1f}m {percentile(delays, 95) / 60:>9.1f}m "
+              f"{percentile(result['unhinted'], 95) / 60:>10.1f}m")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Multi-guild fan-out across shards and bot processes, against a fake gateway.
+
+Runs --processes DiscordBot instances in one event loop, each with a fake
+Discord client that sees only the guilds on its shards (guild id % shard
+count) but can reach any channel by ID, the way REST sends work. All bots
+share one database and lease feed partitions from it. Each cycle publishes
+new entries to every feed and checks that every URL was fetched exactly once
+and that every subscribed channel received each new post exactly once.
+Halfway through, one process stops renewing its lease and the others
+take its partitions over.
+
+Usage: python -m benchmarks.sim_sharding [--processes 3] [--guilds 30] [--feeds 60]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from bot import DiscordBot
+from database import Database
+from benchmarks.fixtures import FakeGateway, FeedServer, temp_db_path, remove_db, seed_feeds
+
+async def cycle(bots, server):
+    """Make every owned feed due and run one polling cycle in every live bot"""
+    requests = server.requests
+    for bot in bots:
+        feeds = bot.db.get_all_feeds(bot.partitions.owned, bot.partitions.count)
+        bot.scheduler.sync(feed['id'] for feed in feeds)
+        for feed in feeds:
+            bot.scheduler.poll_now(feed['id'])
+    await asyncio.gather(*(bot.process_feeds() for bot in bots))
+    await asyncio.gather(*(bot.delivery.flush() for bot in bots))
+    return server.requests - requests
+
+def delivered(gateway):
+    """Embed titles received per channel"""
+    return {
+        channel.id: [embed.title for _, embeds in channel.messages for embed in embeds]
+        for guild in gateway.guilds.values() for channel in guild.channels
+    }
+
+async def run(args, db_path, server):
+    gateway = FakeGateway(args.guilds, args.shards)
+    db = Database(db_path)
+    feeds = seed_feeds(db, server.urls())
+
+    rng = random.Random(args.seed)
+    for feed in feeds:
+        for guild_id in rng.sample(sorted(gateway.guilds), args.subscribers):
+            db.subscribe(feed['id'], guild_id)
+    # Every feed has a guild, so none are adopted by a bot's default guild
+    with db.get_connection() as conn:
+        conn.execute('''
+            UPDATE feeds SET guild_id = (SELECT MIN(guild_id) FROM subscriptions s WHERE s.feed_id = feeds.id)
+        ''')
+    subscriptions = len(db.get_subscriptions())
+    print(f"{args.processes} processes, {args.shards} shards, {args.guilds} guilds, "
+          f"{len(feeds)} feeds, {subscriptions} subscriptions")
+
+    bots = []
+    for index in range(args.processes):
+        bot = DiscordBot(None, db=Database(db_path))
+        bot.bot = gateway.client({s for s in range(args.shards) if s % args.processes == index})
+        bot.partitions.lease_seconds = args.lease
+        bots.append(bot)
+
+    # Startup: every process leases partitions (twice, so shares settle) and creates its guilds' channels
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2):
+            for bot in bots:
+                bot.renew_partitions()
+        for bot in bots:
+            await bot.create_channels_for_existing_feeds()
+
+    print(f"{'cycle':>6} {'live':>5} {'fetches':>8} {'delivered':>10} {'expected':>9} "
+          f"{'duplicates':>11} {'time':>7}  partitions per process")
+    previous_total = 0
+    live = list(bots)
+    for number in range(1, args.cycles + 1):
+        if number == args.cycles // 2 + 1 and len(live) > 1:
+            # One process dies: after its lease expires the others take over
+            live = live[:-1]
+            await asyncio.sleep(args.lease + 0.1)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(2):
+                    for bot in live:
+                        bot.renew_partitions()
+
+        new_entries = server.entries if number == 1 else args.new
+        if number > 1:
+            server.publish(args.new)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fetches = await cycle(live, server)
+        elapsed = time.perf_counter() - start
+
+        received = delivered(gateway)
+        total = sum(len(channel_titles) for channel_titles in received.values())
+        duplicates = sum(
+            len(channel_titles) - len(set(channel_titles)) for channel_titles in received.values()
+        )
+        this_cycle, previous_total = total - previous_total, total
+        shares = ' '.join(str(len(bot.partitions.owned)) for bot in live)
+        print(f"{number:>6} {len(live):>5} {fetches:>8} {this_cycle:>10} "
+              f"{subscriptions * new_entries:>9} {duplicates:>11} {elapsed:6.2f}s  {shares}")
+
+    for bot in bots:
+        await bot.delivery.close()
+        await bot.rss_monitor.fetcher.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--shards', type=int, default=6)
+    parser.add_argument('--guilds', type=int, default=30)
+    parser.add_argument('--feeds', type=int, default=60)
+    parser.add_argument('--subscribers', type=int, default=5, help='guilds per feed')
+    parser.add_argument('--entries', type=int, default=10)
+    parser.add_argument('--new', type=int, default=2, help='entries published per cycle')
+    parser.add_argument('--cycles', type=int, default=4)
+    parser.add_argument('--lease', type=float, default=1.0, help='partition lease (s)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    try:
+        with FeedServer(feeds=args.feeds, entries=args.entries) as server:
+            asyncio.run(run(args, db_path, server))
+    finally:
+        remove_db(db_path)
+
+if __name__ == "__main__":
+    main()
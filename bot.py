@@ -1,191 +1,505 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
-import os
-import glob
+import logging
+import signal
+import time
+from functools import partial
 from database import Database
 from rss_monitor import RSSMonitor
+from scheduler import FeedScheduler, circuit_open
+from turns import TurnScheduler
+from delivery import DeliveryQueue
+from control import ControlServer
+from channels import ChannelIndex
+from partitions import PartitionLease
+from search import SearchResults
+from metrics import CYCLE_SECONDS, FEEDS_DUE, CIRCUITS_OPEN, DELIVERY_BACKLOG
+from logs import setup_logging
+from config import (
+    SCHEDULER_TICK_SECONDS, COMPACTION_INTERVAL_HOURS, SHARD_COUNT, SHARD_IDS,
+    PARTITION_LEASE_SECONDS, DEFAULT_GUILD_ID, SHUTDOWN_TIMEOUT
+)
+
+log = logging.getLogger(__name__)
 
 class DiscordBot:
-    def __init__(self, token):
+    def __init__(self, token, db=None, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, control=True):
         intents = discord.Intents. default()
         intents.message_content = True
         intents.guilds = True
         
-        self.bot = commands.Bot(command_prefix='!', intents=intents)
+        # Shards connect as needed; shard_ids splits them across bot processes
+        self.bot = commands.AutoShardedBot(
+            command_prefix='!', intents=intents, shard_count=shard_count, shard_ids=shard_ids
+        )
         self.token = token
-        self.db = Database()
+        self.db = db or Database()
         self.rss_monitor = RSSMonitor(self.db)
-        self.guild_id = None
-        self.created_channels = set()  # Track created channels
+        self.scheduler = FeedScheduler()
+        self.turns = TurnScheduler()
+        self.partitions = PartitionLease(self.db)
+        self.delivery = DeliveryQueue(self.db, self.resolve_channel, owner=self.partitions.owner)
+        # Worker processes share one control endpoint, served by the first
+        self.control = ControlServer(self.handle_actions, status=self.status) if control else None
+        self.poll_lock = asyncio.Lock()  # One polling cycle at a time
+        self.compaction_lock = asyncio.Lock()
+        self.channels = ChannelIndex()
+        self.started_at = time.time()
+        self.ready = False
+        self.closing = False
+        self.stopped = asyncio.Event()
+        self.poll_tasks = set()
+        DELIVERY_BACKLOG.set_function(self.delivery.pending)
         
         # Setup events
         @self.bot.event
         async def on_ready():
-            print(f'✅ Bot logged in as {self.bot.user}')
-            if not self.check_feeds. is_running():
-                self. check_feeds.start()
-            if not self.monitor_new_feeds.is_running():
-                self.monitor_new_feeds.start()
-            
-            # Create channels for existing feeds on startup
-            await self.create_channels_for_existing_feeds()
+            log.info("✅ Bot logged in as %s (%d guilds)", self.bot.user, len(self.bot.guilds))
+            await self.startup()
+        
+        @self.bot.event
+        async def on_guild_join(guild):
+            self.channels.build(guild)
+            await self.ensure_channels(self.db.get_subscriptions(guild_ids=[guild.id]))
+        
+        @self.bot.event
+        async def on_guild_remove(guild):
+            self.channels.guilds.pop(guild.id, None)
+            self.db.remove_guild(guild.id)
+            log.info("👋 Removed from guild %s; dropped its subscriptions", guild.id, extra={'guild_id': guild.id})
+        
+        # Keep the channel index in step with the guild
+        @self.bot.event
+        async def on_guild_channel_create(channel):
+            if isinstance(channel, discord.TextChannel):
+                self.channels.add(channel)
+        
+        @self.bot.event
+        async def on_guild_channel_delete(channel):
+            if isinstance(channel, discord.TextChannel):
+                self.channels.remove(channel)
+                self.db.clear_subscription_channel(channel.id)
+        
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            if isinstance(after, discord.TextChannel) and before.name != after.name:
+                self.channels.rename(before, after)
+        
+        @self.bot.command(name='search')
+        async def search(ctx, *, query=''):
+            """Search posts delivered to this server: !search <words, "a phrase" or prefix*>"""
+            await self.search_posts(ctx, query)
         
-        @tasks.loop(minutes=5)
+        @tasks.loop(seconds=SCHEDULER_TICK_SECONDS)
         async def check_feeds():
-            """Check all RSS feeds every 5 minutes"""
+            """Check the RSS feeds that are due"""
             await self.process_feeds()
         
-        @tasks.loop(seconds=2)
-        async def monitor_new_feeds():
-            """Monitor for new feed additions and create channels immediately"""
-            await self.check_for_new_feeds()
+        @tasks.loop(hours=COMPACTION_INTERVAL_HOURS)
+        async def compact_posts():
+            """Trim old seen posts and reclaim database space"""
+            try:
+                # Shutdown waits for a compaction in progress before closing the database
+                async with self.compaction_lock:
+                    deleted = await asyncio.to_thread(self.db.compact_posts)
+                if deleted:
+                    log.info("🧹 Compacted %d old posts", deleted)
+            except Exception as e:
+                log.error("❌ Error compacting posts: %s", e)
+        
+        @tasks.loop(seconds=PARTITION_LEASE_SECONDS / 3)
+        async def lease_partitions():
+            """Keep this process's share of feed partitions"""
+            try:
+                self.renew_partitions()
+                # Posts left by a process whose lease has since expired
+                self.restore_outbox()
+                # Only the first process is notified by the app; the others pick up their actions here
+                await self.handle_actions()
+                
+                # Feeds polled by other processes may still need a channel in our guilds
+                await self.ensure_channels(self.db.get_subscriptions(
+                    guild_ids=[guild.id for guild in self.bot.guilds], missing_channel=True
+                ))
+            except Exception as e:
+                log.error("❌ Error renewing partitions: %s", e)
         
         self.check_feeds = check_feeds
-        self.monitor_new_feeds = monitor_new_feeds
+        self.compact_posts = compact_posts
+        self.lease_partitions = lease_partitions
     
-    async def create_channels_for_existing_feeds(self):
-        """Create channels for all existing feeds on bot startup"""
-        if not self.bot.guilds:
-            print("⚠️ Bot is not in any guild yet")
+    async def startup(self):
+        """Warm caches, resume the outbox and start the loops (on every gateway ready)"""
+        for guild in self.bot.guilds:
+            self.channels.build(guild)
+        self.renew_partitions()
+        
+        if not self.rss_monitor.seen_cache.warmed:
+            stats = await asyncio.to_thread(self.rss_monitor.warm_seen_cache, self.partitions.owns)
+            log.info("🧠 Seen-post cache warmed (%d feeds)", stats['loads'])
+        
+        # Resume deliveries interrupted by the last shutdown
+        self.restore_outbox()
+        
+        for loop in (self.check_feeds, self.compact_posts, self.lease_partitions):
+            if not loop.is_running():
+                loop.start()
+        
+        # Create channels for existing feeds on startup
+        await self.create_channels_for_existing_feeds()
+        
+        # Apply anything the app requested while the bot was offline, then listen for more
+        self.ready = True
+        await self.handle_actions()
+        if self.control is not None:
+            await self.control.start()
+    
+    def status(self):
+        """Health summary served at /health"""
+        return {
+            'ready': self.ready and not self.closing,
+            'closing': self.closing,
+            'uptime': round(time.time() - self.started_at, 1),
+            'guilds': len(self.bot.guilds),
+            'partitions': len(self.partitions.owned),
+            'feeds': len(self.scheduler.feeds),
+            'backlog': self.delivery.pending()
+        }
+    
+    def stop(self):
+        """Ask serve() to shut down (e.g. from a signal handler)"""
+        self.stopped.set()
+    
+    async def serve(self):
+        """Run the bot until stop() is called or the gateway connection ends, then shut down gracefully"""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows, or not the main thread: rely on KeyboardInterrupt
+        
+        # /health answers (with 503) while the bot logs in
+        if self.control is not None:
+            await self.control.start()
+        
+        gateway = asyncio.create_task(self.bot.start(self.token))
+        stopped = asyncio.create_task(self.stopped.wait())
+        try:
+            await asyncio.wait({gateway, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopped.cancel()
+            await self.shutdown()
+            await self.bot.close()
+            # Raises the login or connection error that ended the gateway, if any
+            await gateway
+    
+    async def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop polling and flush in-flight work; posts not delivered within timeout stay in the outbox.
+        
+        The Discord connection stays open (deliveries need it); serve() closes it afterwards.
+        """
+        if self.closing:
             return
+        self.closing = True
+        log.info("👋 Shutting down...")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
         
-        guild = self.bot.guilds[0]
-        feeds = self.db.get_all_feeds()
+        # No new actions from the app; the pending_actions table keeps them for the next start
+        if self.control is not None:
+            await self.control.stop()
         
-        for feed in feeds:
-            channel = await self.get_or_create_channel(guild, feed['channel_name'])
-            if channel:
-                self.created_channels.add(feed['channel_name'])
+        # Let the poll and compaction in progress finish, then stop the loops between iterations
+        try:
+            await asyncio.wait_for(self.poll_lock.acquire(), max(0, deadline - loop.time()))
+            await asyncio.wait_for(self.compaction_lock.acquire(), max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            log.warning("⚠️ Poll or compaction still running after %ss; stopping it", timeout)
+        for task_loop in (self.check_feeds, self.compact_posts, self.lease_partitions):
+            task_loop.cancel()
+        for task in list(self.poll_tasks):
+            task.cancel()
+        await asyncio.gather(*self.poll_tasks, return_exceptions=True)
+        
+        try:
+            await self.delivery.flush(max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            log.warning("⚠️ %d posts left undelivered; kept in the outbox for the next start",
+                        self.delivery.pending())
+        await self.delivery.close()
+        await self.rss_monitor.fetcher.close()
+        
+        # Other processes take over our feed partitions right away instead of after the lease expires
+        self.partitions.release()
+        self.db.checkpoint()
+        self.db.close()
+        log.info("👋 Shutdown complete")
+    
+    def renew_partitions(self):
+        """Renew the partition lease; feeds of lost partitions leave the scheduler and cache"""
+        gained, lost = self.partitions.renew()
+        if gained or lost:
+            log.info("🧩 Owning %d/%d feed partitions", len(self.partitions.owned), self.partitions.count)
+        if lost:
+            for feed_id in list(self.scheduler.feeds):
+                if not self.partitions.owns(feed_id):
+                    self.scheduler.remove(feed_id)
+                    self.rss_monitor.seen_cache.discard(feed_id)
+    
+    def restore_outbox(self):
+        """Queue the undelivered posts of our partitions that no live process is delivering"""
+        restored = self.delivery.restore(self.partitions)
+        if restored:
+            log.info("📬 Restored %d undelivered posts from the outbox", restored)
     
-    async def check_for_new_feeds(self):
-        """Check for flag files indicating new feeds to create channels for"""
+    def resolve_channel(self, channel_id):
+        """Channel to deliver to; channels of guilds on other shards are reached over REST"""
+        return self.bot.get_channel(channel_id) or self.bot.get_partial_messageable(channel_id)
+    
+    def adopt_feeds(self):
+        """Deliver feeds added without a server ID to the default guild"""
+        guild_id = DEFAULT_GUILD_ID or (self.bot.guilds[0].id if self.bot.guilds else None)
+        if guild_id is not None:
+            self.db.adopt_feeds(guild_id)
+    
+    async def create_channels_for_existing_feeds(self):
+        """Create channels for all existing feeds on bot startup"""
         if not self.bot.guilds:
+            log.warning("⚠️ Bot is not in any guild yet")
             return
         
-        guild = self. bot.guilds[0]
+        self.adopt_feeds()
+        await self.ensure_channels(
+            self.db.get_subscriptions(guild_ids=[guild.id for guild in self.bot.guilds])
+        )
+    
+    async def ensure_channels(self, subscriptions):
+        """Get or create the channel of each subscription in the guilds this process sees.
+        
+        Updates the subscriptions' channel_id in place (and in the database).
+        Subscriptions of guilds on other shards keep their stored channel_id.
+        """
+        by_guild = {}
+        for subscription in subscriptions:
+            by_guild.setdefault(subscription['guild_id'], []).append(subscription)
         
-        # Look for flag files
-        flag_files = glob.glob("create_channel_*.flag")
+        changed = {}
+        for guild_id, guild_subscriptions in by_guild.items():
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            channels, _ = await self.channels.resolve(guild, guild_subscriptions)
+            for subscription in guild_subscriptions:
+                channel = channels.get(subscription['feed_id'])
+                channel_id = channel.id if channel else None
+                if channel_id != subscription['channel_id']:
+                    subscription['channel_id'] = channel_id
+                    changed[(subscription['feed_id'], guild_id)] = channel_id
         
-        for flag_file in flag_files:
+        self.db.set_subscription_channels(changed)
+    
+    async def handle_actions(self):
+        """Apply feed changes requested by the Streamlit app"""
+        # Until startup has run, actions wait in the table (startup applies them)
+        if not self.ready or self.closing:
+            return 0
+        # Actions for feeds of other processes' partitions stay queued; each process
+        # takes its own when notified or on its lease renewal
+        actions = self.db.take_actions(self.partitions.owns)
+        poll = False
+        
+        for action in actions:
             try:
-                # Read channel name from flag file
-                with open(flag_file, 'r') as f:
-                    channel_name = f.read(). strip()
+                feed_id = action['feed_id']
+                
+                if action['action'] == 'feed_added':
+                    self.adopt_feeds()
+                    await self.ensure_channels(self.db.get_subscriptions(feed_ids=[feed_id]))
+                    log.info("✅ Channels ready for new feed: %s", action['payload'].get('channel_name'),
+                             extra={'feed_id': feed_id})
+                    if self.partitions.owns(feed_id):
+                        self.scheduler.poll_now(feed_id)
+                        poll = True
                 
-                # Create channel if not already created
-                if channel_name not in self.created_channels:
-                    channel = await self.get_or_create_channel(guild, channel_name)
-                    if channel:
-                        self.created_channels.add(channel_name)
-                        print(f"✅ Immediately created channel for new feed: {channel_name}")
+                elif action['action'] == 'feeds_imported':
+                    feed_ids = action['payload'].get('feed_ids', [])
+                    self.adopt_feeds()
+                    await self.ensure_channels(self.db.get_subscriptions(feed_ids=feed_ids))
+                    log.info("✅ Channels ready for %d imported feeds", len(feed_ids))
+                    for imported_id in feed_ids:
+                        if self.partitions.owns(imported_id):
+                            self.scheduler.poll_now(imported_id)
+                            poll = True
+                        else:
+                            # Hand the first poll to the feed's owner
+                            self.db.queue_action('refresh', imported_id)
                 
-                # Remove flag file
-                os.remove(flag_file)
+                elif action['action'] == 'feed_removed':
+                    self.scheduler.remove(feed_id)
+                    self.rss_monitor.seen_cache.discard(feed_id)
+                    self.rss_monitor.rules.discard(feed_id)
+                    log.info("🗑️ Stopped monitoring feed %s", feed_id, extra={'feed_id': feed_id})
                 
+                elif action['action'] == 'refresh':
+                    if self.partitions.owns(feed_id):
+                        self.scheduler.poll_now(feed_id)
+                        poll = True
+            
             except Exception as e:
-                print(f"❌ Error processing flag file {flag_file}: {str(e)}")
-                # Try to remove the flag file anyway
-                try:
-                    os.remove(flag_file)
-                except:
-                    pass
+                log.error("❌ Error handling action %s: %s", action['action'], e)
+        
+        if poll and not self.closing:
+            task = asyncio.create_task(self.process_feeds())
+            self.poll_tasks.add(task)
+            task.add_done_callback(self.poll_done)
+        
+        return len(actions)
+    
+    def poll_done(self, task):
+        """Forget a finished poll started by an action, logging its error if it failed"""
+        self.poll_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("❌ Error polling feeds for an action: %s", task.exception())
     
     async def process_feeds(self):
         """Process all RSS feeds and post updates"""
-        if not self.bot.guilds:
-            print("⚠️ Bot is not in any guild yet")
-            return
+        # Actions from the app can start a cycle while the loop's one is running
+        async with self.poll_lock:
+            await self.process_due_feeds()
+    
+    async def process_due_feeds(self):
+        """Poll the due feeds of this process's partitions and fan posts out to subscribers"""
+        feeds = self.db.get_all_feeds(self.partitions.owned, self.partitions.count)
         
-        guild = self.bot.guilds[0]  # Use first guild
-        feeds = self.db.get_all_feeds()
+        # Only poll the feeds whose next check is due; failing feeds keep their backoff across restarts
+        self.scheduler.sync((feed['id'] for feed in feeds),
+                            failures={feed['id']: feed['consecutive_failures'] for feed in feeds})
+        CIRCUITS_OPEN.set(sum(
+            circuit_open(feed['consecutive_failures'], self.rss_monitor.circuit_failures) for feed in feeds
+        ))
+        due = set(self.scheduler.pop_due())
+        FEEDS_DUE.set(len(due))
+        if not due:
+            return
+        started = time.perf_counter()
+        feeds = [feed for feed in feeds if feed['id'] in due]
         
+        # Resolve channels first so posts are only marked seen for feeds we can deliver to
+        self.adopt_feeds()
+        subscriptions = self.db.get_subscriptions(feed_ids=due)
+        await self.ensure_channels(subscriptions)
+        targets = {}
+        for subscription in subscriptions:
+            if subscription['channel_id']:
+                channels = targets.setdefault(subscription['feed_id'], {})
+                channels[subscription['guild_id']] = subscription['channel_id']
         for feed in feeds:
-            try:
-                # Get or create channel
-                channel = await self.get_or_create_channel(guild, feed['channel_name'])
-                
-                if channel:
-                    # Add to created channels set
-                    self.created_channels.add(feed['channel_name'])
-                    
-                    # Check for new posts
-                    new_posts = self.rss_monitor.check_feed(feed['url'], feed['id'])
-                    
-                    # Send new posts to Discord
-                    for post in new_posts:
-                        await self.send_post_embed(channel, post, feed['title'])
-                
-            except Exception as e:
-                print(f"❌ Error processing feed {feed['title']}: {str(e)}")
-    
-    async def get_or_create_channel(self, guild, channel_name):
-        """Get existing channel or create new one"""
-        # Look for existing channel
-        existing_channel = discord.utils.get(guild.channels, name=channel_name)
+            if feed['id'] not in targets:
+                # Nothing to deliver to yet (not a fault of the feed): check again next interval
+                self.scheduler.record_skip(feed['id'])
+        
+        # Fetch and parse all due feeds concurrently (each URL once, whatever the subscribers).
+        # Each feed's new posts are queued for delivery in budgeted turns as soon as it is
+        # processed, so slow or bursting feeds don't hold up the rest
+        def queue_posts(feed, posts):
+            # A post costs one turn unit per subscribed channel
+            channels = targets[feed['id']]
+            self.turns.add(feed['id'], posts, partial(self.deliver_posts, feed, channels), cost=len(channels))
+        
+        active_feeds = [feed for feed in feeds if feed['id'] in targets]
+        new_posts = await self.turns.run(self.rss_monitor.check_feeds(active_feeds, on_posts=queue_posts))
+        self.rss_monitor.record_history(new_posts)
+        
+        stats = self.rss_monitor.last_cycle_stats
+        log.info("📊 Checked %d feeds: %d unchanged (%d not modified), %d bytes saved, %d stopped early",
+                 stats['feeds'], stats['parses_avoided'], stats['not_modified'], stats['bytes_saved'],
+                 stats['streamed'], extra=stats)
+        
+        for feed in active_feeds:
+            outcome = self.rss_monitor.last_outcomes[feed['id']]
+            if outcome['ok']:
+                self.scheduler.record_success(feed['id'], outcome['new_posts'], outcome['min_interval'])
+            else:
+                self.scheduler.record_failure(feed['id'], outcome['retry_after'])
         
-        if existing_channel:
-            return existing_channel
+        turn_stats = self.turns.last_stats
+        if turn_stats['carried']:
+            log.info("🔁 Queued posts of %d feeds in %d turns, %d carried over", turn_stats['feeds'],
+                     turn_stats['turns'], turn_stats['carried'], extra=turn_stats)
         
-        # Create new channel
+        CYCLE_SECONDS.observe(time.perf_counter() - started)
+    
+    async def deliver_posts(self, feed, channels, posts):
+        """Queue posts for rate-limited delivery to every subscribed channel ({guild_id: channel_id})"""
         try:
-            new_channel = await guild.create_text_channel(
-                name=channel_name,
-                topic=f"RSS feed updates for {channel_name}"
-            )
-            print(f"✅ Created channel: {channel_name}")
-            return new_channel
-        except discord.Forbidden:
-            print(f"❌ No permission to create channel: {channel_name}")
-            return None
+            if self.rss_monitor.content_dedup:
+                # Each server skips stories it already got from another feed
+                for guild_id, channel_id in channels.items():
+                    kept = self.rss_monitor.drop_duplicates(guild_id, feed['id'], posts)
+                    self.delivery.fan_out([channel_id], feed['id'], feed['title'], kept)
+                    await self.route_posts(feed, guild_id, channel_id, kept)
+            else:
+                self.delivery.fan_out(list(channels.values()), feed['id'], feed['title'], posts)
+                if any(post.routes for post in posts):
+                    for guild_id, channel_id in channels.items():
+                        await self.route_posts(feed, guild_id, channel_id, posts)
+        
         except Exception as e:
-            print(f"❌ Error creating channel {channel_name}: {str(e)}")
-            return None
+            log.error("❌ Error processing feed %s: %s", feed['title'], e, extra={'feed_id': feed['id']})
     
-    async def send_post_embed(self, channel, post, feed_title):
-        """Send RSS post as Discord embed"""
-        if not channel:
+    async def route_posts(self, feed, guild_id, channel_id, posts):
+        """Also queue posts matching the feed's route rules for their channels in one guild"""
+        routed = {}
+        for post in posts:
+            for channel_name in post.routes:
+                routed.setdefault(channel_name, []).append(post)
+        guild = self.bot.get_guild(guild_id)
+        if not routed or guild is None:
+            # Route channels are resolved by name, so only in guilds on this process's shards
             return
         
+        for channel_name, routed_posts in routed.items():
+            channel = await self.channels.get_or_create(guild, channel_name)
+            if channel is not None and channel.id != channel_id:
+                self.delivery.fan_out([channel.id], feed['id'], feed['title'], routed_posts)
+    
+    async def search_posts(self, ctx, query):
+        """Reply to !search with the first page of matching posts and buttons for the rest"""
+        if ctx.guild is None:
+            await ctx.send("🔍 Use !search in a server to search its feeds")
+            return
+        if not query.strip():
+            await ctx.send('🔍 Usage: !search <words, "a phrase" or prefix*>')
+            return
+        
+        view = SearchResults(self.db, query.strip(), ctx.guild.id, ctx.author.id)
         try:
-            # Create embed
-            embed = discord. Embed(
-                title=post['title'],
-                url=post['link'],
-                description=post.get('summary', '')[:500] + ('...' if len(post.get('summary', '')) > 500 else ''),
-                color=0x00AAFF,
-                timestamp=post.get('published_date')
-            )
-            
-            # Add author if available
-            if post.get('author'):
-                embed.add_field(name="👤 Author", value=post['author'], inline=True)
-            
-            # Add source
-            embed.set_footer(text=f"Source: {feed_title}")
-            
-            # Add thumbnail if available
-            if post.get('image'):
-                embed.set_thumbnail(url=post['image'])
-            
-            await channel.send(embed=embed)
-            print(f"✅ Posted: {post['title'][:50]}...")
-            
-        except discord.Forbidden:
-            print(f"❌ No permission to send message in {channel.name}")
+            embed = await view.load(0)
         except Exception as e:
-            print(f"❌ Error sending embed: {str(e)}")
+            log.error("❌ Error searching posts: %s", e, extra={'guild_id': ctx.guild.id})
+            await ctx.send("❌ Search failed, try again later")
+            return
+        await ctx.send(embed=embed, view=view if view.results['posts'] else None)
+    
+    async def get_or_create_channel(self, guild, channel_name):
+        """Get existing channel or create new one"""
+        return await self.channels.get_or_create(guild, channel_name)
     
     def run(self):
         """Start the bot"""
+        # discord.py logs through the same handler instead of installing its own
+        setup_logging()
         try:
-            self.bot.run(self.token)
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
         except Exception as e:
-            print(f"❌ Error starting bot: {str(e)}")
+            log.error("❌ Error starting bot: %s", e)
 
 # For running the bot standalone
 if __name__ == "__main__":
     from config import DISCORD_TOKEN
     bot = DiscordBot(DISCORD_TOKEN)
-    bot.run()
\ No newline at end of file
+    bot.run()
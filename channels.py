@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import discord
+from config import CHANNEL_CREATE_CONCURRENCY
+
+log = logging.getLogger(__name__)
+
+class ChannelIndex:
+    """Name -> text channel index per guild.
+
+    Built once from the guild's channel list and kept current from the
+    on_guild_channel_create/delete/update events, so looking up a feed's
+    channel no longer scans every channel in the guild.
+    """
+
+    def __init__(self, create_concurrency=CHANNEL_CREATE_CONCURRENCY):
+        self.guilds = {}
+        self.create_concurrency = create_concurrency
+        self._create_slots = None
+
+    def build(self, guild):
+        """(Re)index all text channels of a guild"""
+        index = self.guilds[guild.id] = {}
+        for channel in guild.text_channels:
+            index.setdefault(channel.name, channel)
+        return index
+
+    def add(self, channel):
+        index = self.guilds.get(channel.guild.id)
+        if index is not None:
+            index.setdefault(channel.name, channel)
+
+    def remove(self, channel):
+        index = self.guilds.get(channel.guild.id)
+        if index is None or getattr(index.get(channel.name), 'id', None) != channel.id:
+            return
+        del index[channel.name]
+        # Another channel may share the name (rare, so a scan is fine here)
+        other = discord.utils.get(
+            [c for c in channel.guild.text_channels if c.id != channel.id], name=channel.name
+        )
+        if other is not None:
+            index[channel.name] = other
+
+    def rename(self, before, after):
+        self.remove(before)
+        self.add(after)
+
+    def get(self, guild, name):
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.build(guild)
+        return index.get(name)
+
+    async def get_or_create(self, guild, channel_name):
+        """Get existing channel or create new one"""
+        channel = self.get(guild, channel_name)
+        if channel:
+            return channel
+
+        if self._create_slots is None:
+            self._create_slots = asyncio.Semaphore(self.create_concurrency)
+        async with self._create_slots:
+            # Another task may have created it while we waited
+            channel = self.get(guild, channel_name)
+            if channel:
+                return channel
+
+            try:
+                channel = await guild.create_text_channel(
+                    name=channel_name,
+                    topic=f"RSS feed updates for {channel_name}"
+                )
+                log.info("✅ Created channel: %s", channel_name, extra={'guild_id': guild.id})
+            except discord.Forbidden:
+                log.error("❌ No permission to create channel: %s", channel_name, extra={'guild_id': guild.id})
+                return None
+            except Exception as e:
+                log.error("❌ Error creating channel %s: %s", channel_name, e, extra={'guild_id': guild.id})
+                return None
+
+        # Don't wait for the create event to make the channel visible
+        self.guilds[guild.id].setdefault(channel_name, channel)
+        return channel
+
+    async def resolve(self, guild, subscriptions):
+        """Find (or create) the channel of every subscription in a guild.
+
+        Subscriptions with a stored channel_id are looked up by ID; the rest
+        by name, with missing channels created concurrently (bounded by
+        create_concurrency). Returns ({feed_id: channel}, {feed_id: channel_id})
+        where the second dict holds the channel IDs that need storing.
+        """
+        channels, missing = {}, []
+        for subscription in subscriptions:
+            channel_id = subscription.get('channel_id')
+            channel = guild.get_channel(channel_id) if channel_id else None
+            if channel is None:
+                channel = self.get(guild, subscription['channel_name'])
+            if channel is None:
+                missing.append(subscription)
+            else:
+                channels[subscription['feed_id']] = channel
+
+        created = await asyncio.gather(
+            *(self.get_or_create(guild, subscription['channel_name']) for subscription in missing)
+        )
+        for subscription, channel in zip(missing, created):
+            if channel is not None:
+                channels[subscription['feed_id']] = channel
+
+        changed = {
+            subscription['feed_id']: channels[subscription['feed_id']].id
+            for subscription in subscriptions
+            if subscription['feed_id'] in channels
+            and channels[subscription['feed_id']].id != subscription.get('channel_id')
+        }
+        return channels, changed
@@ -0,0 +1,80 @@
+"""Command-line feed management.
+
+Usage:
+    python cli.py import feeds.opml [--guild 1234] [--concurrency 20] [--dry-run]
+    python cli.py export feeds.opml [--format opml|csv]
+"""
+import argparse
+import asyncio
+import sys
+from database import Database
+from control import notify_bot
+from feed_import import parse_feed_list, validate_feeds, import_feeds, export_opml, export_csv
+from config import IMPORT_CONCURRENCY
+
+def print_progress(result, done, total):
+    if result['ok']:
+        print(f"[{done}/{total}] ✅ {result['url']} ({result['title']})")
+    else:
+        print(f"[{done}/{total}] ❌ {result['url']}: {result['error']}")
+
+async def dry_run(feeds, concurrency):
+    valid = done = 0
+    async for result in validate_feeds(feeds, concurrency=concurrency):
+        done += 1
+        valid += result['ok']
+        print_progress(result, done, len(feeds))
+    print(f"🔍 {valid}/{len(feeds)} feeds valid (nothing imported)")
+
+def run_import(args):
+    with open(args.file, encoding='utf-8') as f:
+        feeds = parse_feed_list(f.read(), args.file)
+    print(f"📥 {len(feeds)} feeds in {args.file}")
+
+    if args.dry_run:
+        asyncio.run(dry_run(feeds, args.concurrency))
+        return 0
+
+    db = Database()
+    summary = asyncio.run(import_feeds(
+        db, feeds, args.guild, concurrency=args.concurrency, on_result=print_progress
+    ))
+
+    feed_ids = [feed['feed_id'] for feed in summary['added']] + summary['subscribed']
+    if feed_ids:
+        # One action for the whole import: the bot creates the channels and polls the feeds
+        notify_bot(db, 'feeds_imported', payload={'feed_ids': feed_ids})
+
+    print(f"✅ Added {len(summary['added'])}, subscribed {len(summary['subscribed'])}, "
+          f"skipped {len(summary['skipped'])} existing, {len(summary['failed'])} failed")
+    return 1 if summary['failed'] else 0
+
+def run_export(args):
+    feeds = Database().get_all_feeds()
+    fmt = args.format or ('csv' if args.file.lower().endswith('.csv') else 'opml')
+    with open(args.file, 'w', encoding='utf-8', newline='') as f:
+        f.write(export_csv(feeds) if fmt == 'csv' else export_opml(feeds))
+    print(f"📤 Exported {len(feeds)} feeds to {args.file}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and export RSS feeds")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='add feeds from an OPML or CSV file')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--guild', type=int, default=None, help='Discord server ID to subscribe')
+    import_parser.add_argument('--concurrency', type=int, default=IMPORT_CONCURRENCY)
+    import_parser.add_argument('--dry-run', action='store_true', help='validate only')
+    import_parser.set_defaults(run=run_import)
+
+    export_parser = commands.add_parser('export', help='write all feeds to an OPML or CSV file')
+    export_parser.add_argument('file')
+    export_parser.add_argument('--format', choices=['opml', 'csv'], default=None)
+    export_parser.set_defaults(run=run_export)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
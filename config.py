@@ -11,4 +11,126 @@ DISCORD_TOKEN = os. getenv('DISCORD_TOKEN', '')
 RSS_CHECK_INTERVAL = int(os.getenv('RSS_CHECK_INTERVAL', '5'))
 
 # Database file
-DATABASE_FILE = os.getenv('DATABASE_FILE', 'rss_feeds.db')
\ No newline at end of file
+DATABASE_FILE = os.getenv('DATABASE_FILE', 'rss_feeds.db')
+
+# Feed fetching (concurrent aiohttp engine)
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '50'))
+FETCH_PER_HOST_LIMIT = int(os.getenv('FETCH_PER_HOST_LIMIT', '4'))
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '20'))
+FETCH_CONNECT_TIMEOUT = float(os.getenv('FETCH_CONNECT_TIMEOUT', '10'))
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '10'))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '20000'))
+
+# In-memory seen-post cache (per-feed Bloom filters)
+SEEN_CACHE_MB = float(os.getenv('SEEN_CACHE_MB', '256'))
+SEEN_CACHE_FP_RATE = float(os.getenv('SEEN_CACHE_FP_RATE', '0.01'))
+
+# Adaptive polling (minutes); RSS_CHECK_INTERVAL is the starting interval per feed
+MIN_CHECK_INTERVAL = float(os.getenv('MIN_CHECK_INTERVAL', '2'))
+MAX_CHECK_INTERVAL = float(os.getenv('MAX_CHECK_INTERVAL', '1440'))
+MAX_BACKOFF_INTERVAL = float(os.getenv('MAX_BACKOFF_INTERVAL', '720'))
+# Polls per expected post, and the longest a feed's post rate alone may stretch
+# its interval to (feed hints like <ttl> may ask for longer, up to MAX_CHECK_INTERVAL)
+POLLS_PER_POST = float(os.getenv('POLLS_PER_POST', '4'))
+FRESHNESS_INTERVAL = float(os.getenv('FRESHNESS_INTERVAL', '10'))
+SCHEDULER_TICK_SECONDS = float(os.getenv('SCHEDULER_TICK_SECONDS', '15'))
+
+# Seen-post retention and compaction
+POST_RETENTION_COUNT = int(os.getenv('POST_RETENTION_COUNT', '500'))
+POST_RETENTION_DAYS = int(os.getenv('POST_RETENTION_DAYS', '90'))
+COMPACTION_INTERVAL_HOURS = float(os.getenv('COMPACTION_INTERVAL_HOURS', '6'))
+COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', '5000'))
+VACUUM_PAGES = int(os.getenv('VACUUM_PAGES', '2000'))
+
+# A feed's first sync (no seen posts yet) delivers only its newest
+# BACKLOG_MAX_POSTS entries; the rest are marked seen. 0 delivers them all
+BACKLOG_MAX_POSTS = int(os.getenv('BACKLOG_MAX_POSTS', '10'))
+
+# Feeds take turns queueing new posts as they are checked: each turn a feed
+# queues up to TURN_ITEMS sends (posts x channels) or works TURN_SECONDS.
+# 0 queues every feed's posts in one go once the whole cycle is checked.
+# Parsing is not budgeted; sends take turns at the global rate limit either way
+TURN_ITEMS = int(os.getenv('TURN_ITEMS', '500'))
+TURN_SECONDS = float(os.getenv('TURN_SECONDS', '0.02'))
+
+# Discord delivery rate limits (messages per second); burst + rate x 5s stays
+# within the per-channel limit of 5 messages per 5 seconds
+DELIVERY_CHANNEL_RATE = float(os.getenv('DELIVERY_CHANNEL_RATE', '0.6'))
+DELIVERY_CHANNEL_BURST = int(os.getenv('DELIVERY_CHANNEL_BURST', '2'))
+DELIVERY_GLOBAL_RATE = float(os.getenv('DELIVERY_GLOBAL_RATE', '40'))
+DELIVERY_GLOBAL_BURST = int(os.getenv('DELIVERY_GLOBAL_BURST', '40'))
+
+# Local control endpoint the Streamlit app uses to notify the bot
+CONTROL_HOST = os.getenv('CONTROL_HOST', '127.0.0.1')
+CONTROL_PORT = int(os.getenv('CONTROL_PORT', '8765'))
+
+# Channels created at once when several feeds need a new channel
+CHANNEL_CREATE_CONCURRENCY = int(os.getenv('CHANNEL_CREATE_CONCURRENCY', '5'))
+
+# Feed parsing processes (0 = one per CPU core)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0'))
+
+# Streaming parsing: feeds that have proven newest-first are parsed while
+# downloading and the download stops after a run of already-seen entries
+STREAM_PARSING = os.getenv('STREAM_PARSING', 'false').lower() in ('1', 'true', 'yes')
+STREAM_SEEN_RUN = int(os.getenv('STREAM_SEEN_RUN', '3'))
+STREAM_ORDERED_POLLS = int(os.getenv('STREAM_ORDERED_POLLS', '3'))
+STREAM_VERIFY_EVERY = int(os.getenv('STREAM_VERIFY_EVERY', '10'))
+STREAM_CHUNK_KB = int(os.getenv('STREAM_CHUNK_KB', '16'))
+
+# Sharding and multiple bot processes. SHARD_COUNT/SHARD_IDS select the
+# shards this process runs (empty = let Discord decide); feeds are split
+# into FEED_PARTITIONS partitions leased by the running bot processes
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()] or None
+FEED_PARTITIONS = int(os.getenv('FEED_PARTITIONS', '64'))
+PARTITION_LEASE_SECONDS = float(os.getenv('PARTITION_LEASE_SECONDS', '60'))
+
+# Service runtime (main.py): worker processes that split the shards and
+# feed partitions, and how long shutdown may spend finishing the poll in
+# progress and flushing queued deliveries (seconds)
+WORKERS = int(os.getenv('WORKERS', '1'))
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '30'))
+
+# Guild that feeds added without a server ID are delivered to (empty = the bot's first guild)
+DEFAULT_GUILD_ID = int(os.getenv('DEFAULT_GUILD_ID', '0')) or None
+
+# Observability: /metrics on the control endpoint and logging
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_FEED_LABELS = os.getenv('METRICS_FEED_LABELS', 'true').lower() in ('1', 'true', 'yes')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# Streamlit dashboard: feeds per page and how long a cached page stays fresh (seconds)
+APP_PAGE_SIZE = int(os.getenv('APP_PAGE_SIZE', '25'))
+APP_CACHE_TTL = float(os.getenv('APP_CACHE_TTL', '30'))
+
+# Feeds validated at once by OPML/CSV import
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', '20'))
+
+# Validation fetches (add_feed, imports) shared per process: reused for
+# FETCH_CACHE_TTL seconds, then revalidated; bodies kept up to FETCH_CACHE_MB
+FETCH_CACHE_MB = float(os.getenv('FETCH_CACHE_MB', '32'))
+FETCH_CACHE_TTL = float(os.getenv('FETCH_CACHE_TTL', '300'))
+
+# Feed health: after CIRCUIT_FAILURES failed polls in a row a feed's circuit
+# opens and it is only probed every CIRCUIT_PROBE_INTERVAL minutes, each
+# probe given CIRCUIT_PROBE_TIMEOUT seconds, until a poll succeeds again
+CIRCUIT_FAILURES = int(os.getenv('CIRCUIT_FAILURES', '5'))
+CIRCUIT_PROBE_INTERVAL = float(os.getenv('CIRCUIT_PROBE_INTERVAL', '360'))
+CIRCUIT_PROBE_TIMEOUT = float(os.getenv('CIRCUIT_PROBE_TIMEOUT', '5'))
+
+# Cross-feed dedup: skip posts whose normalized link or title and summary
+# fingerprint matches a post delivered within DEDUP_WINDOW_HOURS, from any feed
+CONTENT_DEDUP = os.getenv('CONTENT_DEDUP', 'false').lower() in ('1', 'true', 'yes')
+DEDUP_WINDOW_HOURS = float(os.getenv('DEDUP_WINDOW_HOURS', '72'))
+
+# Post history: delivered posts' fields in a full-text index for !search and the
+# app's search box. The newest HISTORY_MAX_POSTS are kept; a search ranks
+# the newest HISTORY_RANK_WINDOW matches by relevance
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HISTORY_MAX_POSTS = int(os.getenv('HISTORY_MAX_POSTS', '2000000'))
+HISTORY_RANK_WINDOW = int(os.getenv('HISTORY_RANK_WINDOW', '1000'))
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '5'))
@@ -0,0 +1,106 @@
+import json
+import logging
+import urllib.request
+from aiohttp import web
+from metrics import REGISTRY
+from profiler import Profiler
+from config import CONTROL_HOST, CONTROL_PORT
+
+log = logging.getLogger(__name__)
+
+def notify_bot(db, action, feed_id=None, payload=None, timeout=0.5):
+    """Record an action for the bot and wake it up.
+
+    The action is stored in the pending_actions table first, so it is still
+    applied (at the bot's next startup) if the bot is not running. Returns
+    True if the bot acknowledged the wake-up.
+    """
+    db.queue_action(action, feed_id, payload)
+    request = urllib.request.Request(
+        f"http://{CONTROL_HOST}:{CONTROL_PORT}/actions", data=b'', method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+class ControlServer:
+    """Local HTTP control endpoint for the bot.
+
+    POST /actions makes the bot drain the pending_actions table right away,
+    so feed changes made in the Streamlit app take effect without polling.
+    GET /health reports the runtime's status (503 until it is ready or once
+    it is shutting down), GET /metrics serves the bot's metrics in the
+    Prometheus text format, and POST /profile/start?mode=cprofile|pyinstrument
+    and POST /profile/stop profile the running bot and return the report.
+    """
+
+    def __init__(self, handle_actions, host=CONTROL_HOST, port=CONTROL_PORT, status=None):
+        self.handle_actions = handle_actions
+        self.host = host
+        self.port = port
+        self.status = status or (lambda: {'ready': True})
+        self.app = web.Application()
+        self.profiler = Profiler()
+        self.app.router.add_post('/actions', self.post_actions)
+        self.app.router.add_get('/health', self.get_health)
+        self.app.router.add_get('/metrics', self.get_metrics)
+        self.app.router.add_post('/profile/start', self.start_profile)
+        self.app.router.add_post('/profile/stop', self.stop_profile)
+        self._runner = None
+
+    async def post_actions(self, request):
+        handled = await self.handle_actions()
+        return web.Response(text=json.dumps({'handled': handled}), content_type='application/json')
+
+    async def get_health(self, request):
+        status = self.status()
+        return web.Response(
+            status=200 if status['ready'] else 503,
+            text=json.dumps(status), content_type='application/json'
+        )
+
+    async def get_metrics(self, request):
+        return web.Response(
+            body=REGISTRY.render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def start_profile(self, request):
+        mode = request.query.get('mode', 'cprofile')
+        try:
+            self.profiler.start(mode, float(request.query.get('interval', '0.001')))
+        except (RuntimeError, ValueError) as e:
+            return web.Response(status=409, text=str(e))
+        log.info("🔬 Profiling started (%s)", mode)
+        return web.Response(text=f"{mode} profiler started\n")
+
+    async def stop_profile(self, request):
+        try:
+            report = self.profiler.stop(int(request.query.get('limit', '40')))
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+        log.info("🔬 Profiling stopped")
+        return web.Response(text=report)
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        try:
+            await site.start()
+        except OSError as e:
+            # Another bot process already serves the endpoint and applies the app's actions
+            log.warning("⚠️ Control endpoint not started: %s", e)
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        log.info("🎛️ Control endpoint listening on http://%s:%s", self.host, self.port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
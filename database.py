@@ -1,17 +1,142 @@
 import sqlite3
 import json
-import feedparser
+import logging
 import re
+import threading
+import time
 from datetime import datetime
+from metrics import DB_QUERY_SECONDS, DB_CONNECT_SECONDS, DB_CONNECTIONS
+from feed_fetcher import fetch_feed
+from fetch_cache import feed_seed
+from fingerprint import bands, distance, to_signed, MAX_DISTANCE
+from filters import rule_error
+from config import (
+    DATABASE_FILE, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE_KB, POST_RETENTION_COUNT, POST_RETENTION_DAYS,
+    COMPACTION_BATCH_SIZE, VACUUM_PAGES, DEDUP_WINDOW_HOURS, HISTORY_MAX_POSTS, HISTORY_RANK_WINDOW
+)
+
+log = logging.getLogger(__name__)
+
+# Maximum number of bound parameters per IN (...) query
+SQL_BATCH_SIZE = 500
+
+# Weight of the newest download time in a feed's rolling latency average
+LATENCY_SMOOTHING = 0.2
+
+# History keeps as much of a summary as the post's embed shows
+HISTORY_SUMMARY_CHARS = 500
+
+# Relevance weights of the indexed history columns (title, summary, author, feed_id)
+HISTORY_RANK = 'bm25(5.0, 1.0, 1.0, 0.0)'
+
+# Guilds with at most this many feeds filter inside the full-text query
+# (their few feeds' posts are found from the index); larger ones filter
+# the matches, which mostly belong to their feeds anyway
+SEARCH_FEED_FILTER_MAX = 100
+
+# Search input: "quoted phrases", words and prefix* words
+SEARCH_TERM = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+SEARCH_WORD = re.compile(r'\w+')
+
+# Seen posts; post_id is the 16-byte MD5 digest of the entry's identity
+POSTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        feed_id INTEGER NOT NULL,
+        post_id BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE,
+        UNIQUE(feed_id, post_id)
+    )
+'''
+
+def pack_post_id(post_id):
+    """Convert a hex post ID to its 16-byte stored form"""
+    return bytes.fromhex(post_id) if isinstance(post_id, str) else post_id
+
+def unpack_post_id(value):
+    """Convert a stored post ID back to hex"""
+    return value.hex() if isinstance(value, bytes) else value
+
+def fts_query(text):
+    """Turn search box input into an FTS5 query matching posts that contain every term
+    
+    Words are quoted so FTS5 operators and punctuation in the input are
+    taken literally; "quoted phrases" and trailing-* prefixes are kept.
+    """
+    terms = []
+    for phrase, word, star in SEARCH_TERM.findall(text):
+        if word:
+            terms.append(f'"{word}"{star}')
+        elif SEARCH_WORD.search(phrase):
+            terms.append('"' + ' '.join(SEARCH_WORD.findall(phrase)) + '"')
+    return ' '.join(terms)
 
 class Database:
-    def __init__(self, db_file='rss_feeds.db'):
+    def __init__(self, db_file=DATABASE_FILE):
         self.db_file = db_file
+        self._local = threading.local()
+        self._connections = {}
+        self._lock = threading.Lock()
+        self.history_available = True
         self.init_database()
     
+    @DB_CONNECT_SECONDS.time()
+    def open_connection(self):
+        """Open and configure a new SQLite connection"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            cached_statements=256,
+            check_same_thread=False
+        )
+        
+        # Only takes effect on a new database; must precede the switch to WAL
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
+        # WAL lets the Streamlit app read while the bot writes
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT * 1000)}')
+        
+        return conn
+    
+    def get_connection(self):
+        """Return this thread's persistent connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.open_connection()
+            self._local.conn = conn
+            
+            with self._lock:
+                # Close connections left behind by threads that have exited
+                alive = {thread.ident for thread in threading.enumerate()}
+                for ident in [ident for ident in self._connections if ident not in alive]:
+                    self._connections.pop(ident).close()
+                self._connections[threading.get_ident()] = conn
+                DB_CONNECTIONS.set(len(self._connections))
+        
+        return conn
+    
+    def checkpoint(self):
+        """Move the WAL's committed writes into the database file and truncate it"""
+        self.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    
+    def close(self):
+        """Close all connections opened by this instance"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+            DB_CONNECTIONS.set(0)
+        self._local = threading.local()
+    
     def init_database(self):
         """Initialize database tables"""
-        conn = sqlite3. connect(self.db_file)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         # Create feeds table
@@ -26,19 +151,250 @@ class Database:
         ''')
         
         # Create posts table (to track seen posts)
+        cursor.execute(POSTS_TABLE_SQL.format(table='posts'))
+        
+        # Posts waiting to be delivered to Discord (embed payloads as JSON)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_id INTEGER NOT NULL,
+                feed_id INTEGER,
+                payload TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Guilds receiving each feed; a feed is fetched once however many subscribe
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS subscriptions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 feed_id INTEGER NOT NULL,
-                post_id TEXT NOT NULL,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE,
-                UNIQUE(feed_id, post_id)
+                UNIQUE(feed_id, guild_id)
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_guild ON subscriptions (guild_id)')
+        
+        # Feed partitions leased by bot processes (feed id % partition count)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partitions (
+                partition INTEGER PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partition_owners (
+                owner TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        
+        # Requests from the Streamlit app for the bot (feed added/removed, refresh)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pending_actions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                action TEXT NOT NULL,
+                feed_id INTEGER,
+                payload TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Per-feed include/exclude/route rules (see filters.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                feed_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                regex INTEGER NOT NULL DEFAULT 0,
+                channel_name TEXT,
+                FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_feed_rules_feed ON feed_rules (feed_id)')
+        
+        # Columns added after the original schema
+        added = self.ensure_columns(cursor, 'feeds', {
+            'etag': 'TEXT',
+            'last_modified': 'TEXT',
+            'content_hash': 'TEXT',
+            'content_length': 'INTEGER',
+            'posts_count': 'INTEGER NOT NULL DEFAULT 0',
+            'entry_count': 'INTEGER',
+            'channel_id': 'INTEGER',
+            'ordered_polls': 'INTEGER NOT NULL DEFAULT 0',
+            'guild_id': 'INTEGER',
+            'last_success': 'TIMESTAMP',
+            'consecutive_failures': 'INTEGER NOT NULL DEFAULT 0',
+            'last_error': 'TEXT',
+            'latency_ms': 'REAL',
+            'rules_version': 'INTEGER NOT NULL DEFAULT 0'
+        })
+        # Bot process that queued (or took over) each undelivered post
+        self.ensure_columns(cursor, 'outbox', {'owner': 'TEXT'})
         
         conn.commit()
-        conn.close()
+        
+        migrated = self.migrate_post_ids(conn)
+        
+        # Retention deletes walk each feed's posts in insertion order
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_feed ON posts (feed_id)')
+        
+        # Recently delivered posts per guild across all feeds, for content dedup:
+        # the normalized link digest and the SimHash split into four bands. The
+        # indexes cover the lookups, so checking a post never reads the table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                id INTEGER PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                feed_id INTEGER NOT NULL,
+                link_hash BLOB,
+                simhash INTEGER,
+                band0 INTEGER,
+                band1 INTEGER,
+                band2 INTEGER,
+                band3 INTEGER,
+                seen_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_link_hash ON fingerprints (link_hash, guild_id, seen_at)
+        ''')
+        for band in ('band0', 'band1', 'band2', 'band3'):
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_fingerprints_{band}
+                ON fingerprints ({band}, guild_id, seen_at, simhash)
+            ''')
+        
+        self.history_available = self.create_history(cursor)
+        
+        # Keep feeds.posts_count current so listing feeds needs no aggregate
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS posts_count_insert AFTER INSERT ON posts
+            BEGIN
+                UPDATE feeds SET posts_count = posts_count + 1 WHERE id = NEW.feed_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS posts_count_delete AFTER DELETE ON posts
+            BEGIN
+                UPDATE feeds SET posts_count = posts_count - 1 WHERE id = OLD.feed_id;
+            END
+        ''')
+        
+        if migrated or 'posts_count' in added:
+            cursor.execute('''
+                UPDATE feeds
+                SET posts_count = (SELECT COUNT(*) FROM posts WHERE posts.feed_id = feeds.id)
+            ''')
+        
+        conn.commit()
+    
+    def create_history(self, cursor):
+        """Create the post history and its full-text index; False if SQLite lacks FTS5"""
+        # Each post's text is stored once, in history; history_fts indexes it
+        # as an external-content table, kept in step by the triggers. The
+        # feed ID is indexed too, so a search can be limited to some feeds
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                feed_id INTEGER NOT NULL,
+                post_id BLOB NOT NULL,
+                title TEXT NOT NULL,
+                link TEXT,
+                author TEXT,
+                summary TEXT,
+                image TEXT,
+                published TEXT,
+                seen_at REAL NOT NULL,
+                FOREIGN KEY (feed_id) REFERENCES feeds (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_feed ON history (feed_id)')
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    title, summary, author, feed_id,
+                    content='history', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO history_fts (history_fts, rank) VALUES ('rank', ?)
+            ''', (HISTORY_RANK,))
+        except sqlite3.OperationalError as e:
+            log.warning("⚠️ Post search disabled, SQLite has no FTS5: %s", e)
+            return False
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_insert AFTER INSERT ON history
+            BEGIN
+                INSERT INTO history_fts (rowid, title, summary, author, feed_id)
+                VALUES (NEW.id, NEW.title, NEW.summary, NEW.author, NEW.feed_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_delete AFTER DELETE ON history
+            BEGIN
+                INSERT INTO history_fts (history_fts, rowid, title, summary, author, feed_id)
+                VALUES ('delete', OLD.id, OLD.title, OLD.summary, OLD.author, OLD.feed_id);
+            END
+        ''')
+        return True
+    
+    def migrate_post_ids(self, conn):
+        """Convert a posts table with 32-char hex TEXT IDs to 16-byte BLOBs"""
+        cursor = conn.cursor()
+        cursor.execute('PRAGMA table_info(posts)')
+        types = {row[1]: row[2].upper() for row in cursor.fetchall()}
+        if types.get('post_id') != 'TEXT':
+            return False
+        
+        log.info("🔧 Migrating posts table to 16-byte post IDs...")
+        with conn:
+            cursor.execute('DROP TRIGGER IF EXISTS posts_count_insert')
+            cursor.execute('DROP TRIGGER IF EXISTS posts_count_delete')
+            cursor.execute(POSTS_TABLE_SQL.format(table='posts_blob'))
+            
+            cursor.execute('SELECT id, feed_id, post_id, created_at FROM posts')
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                conn.executemany(
+                    'INSERT OR IGNORE INTO posts_blob (id, feed_id, post_id, created_at) VALUES (?, ?, ?, ?)',
+                    [(row_id, feed_id, pack_post_id(post_id), created_at)
+                     for row_id, feed_id, post_id, created_at in rows]
+                )
+            
+            cursor.execute('DROP TABLE posts')
+            cursor.execute('ALTER TABLE posts_blob RENAME TO posts')
+        
+        # Switching an existing database to incremental vacuum needs a full VACUUM once
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        
+        return True
+    
+    def ensure_columns(self, cursor, table, columns):
+        """Add any missing columns to an existing table; returns the names added"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        
+        added = []
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                added.append(name)
+        
+        return added
     
     def sanitize_channel_name(self, name):
         """Sanitize name for Discord channel (lowercase, alphanumeric, hyphens)"""
@@ -63,89 +419,211 @@ class Database:
     def get_feed_title(self, url):
         """Get feed title from RSS feed"""
         try:
-            feed = feedparser.parse(url)
-            if feed.feed and hasattr(feed.feed, 'title'):
-                return feed.feed.title
+            feed = fetch_feed(url)['feed']
+            if feed and feed['feed'].get('title'):
+                return feed['feed']['title']
             return url
         except:
             return url
     
-    def add_feed(self, url):
-        """Add new RSS feed"""
+    def add_feed(self, url, guild_id=None):
+        """Add new RSS feed, subscribed by guild_id (or the bot's default guild when None)"""
         try:
             # Validate URL
             if not url.startswith('http'):
                 return {'success': False, 'message': 'Invalid URL format'}
             
-            # Try to parse the feed to validate
-            feed = feedparser.parse(url)
-            if feed.bozo and not feed.entries:
+            # Another guild already has this feed: just subscribe
+            existing = self.get_feed_by_url(url)
+            if existing is not None and guild_id is not None:
+                if not self.subscribe(existing['id'], guild_id):
+                    return {'success': False, 'message': 'Feed already exists'}
+                return {'success': True, 'channel_name': existing['channel_name'],
+                        'feed_id': existing['id'], 'subscribed': True}
+            
+            # Try to parse the feed to validate (kept in the fetch cache for the next add)
+            fetched = fetch_feed(url)
+            feed = fetched['feed']
+            if fetched['error'] or feed is None or (feed['bozo'] and not feed['entries']):
                 return {'success': False, 'message': 'Invalid RSS feed or feed is empty'}
             
             # Get feed title
-            feed_title = feed.feed.get('title', url) if feed.feed else url
+            feed_title = feed['feed'].get('title') or url
             
             # Generate channel name
             channel_name = self.sanitize_channel_name(feed_title)
             
             # Add to database
-            conn = sqlite3. connect(self.db_file)
+            conn = self.get_connection()
             cursor = conn.cursor()
             
-            # Check if channel name already exists
-            cursor.execute('SELECT id FROM feeds WHERE channel_name = ? ', (channel_name,))
-            if cursor.fetchone():
-                # Append number to make it unique
-                counter = 1
-                new_channel_name = f"{channel_name}-{counter}"
-                while True:
-                    cursor.execute('SELECT id FROM feeds WHERE channel_name = ? ', (new_channel_name,))
-                    if not cursor. fetchone():
-                        channel_name = new_channel_name
-                        break
-                    counter += 1
-                    new_channel_name = f"{channel_name}-{counter}"
-            
-            cursor.execute('''
-                INSERT INTO feeds (url, title, channel_name) 
-                VALUES (?, ?, ?)
-            ''', (url, feed_title, channel_name))
-            
-            feed_id = cursor.lastrowid
-            
-            conn.commit()
-            conn.close()
+            with conn:
+                # Hold the write lock from the channel name check to the insert
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                # Append a number if the channel name is taken
+                channel_name = self.unique_channel_names(cursor, [channel_name])[0]
+                
+                cursor.execute('''
+                    INSERT INTO feeds (url, title, channel_name, guild_id) 
+                    VALUES (?, ?, ?, ?)
+                ''', (url, feed_title, channel_name, guild_id))
+                
+                feed_id = cursor.lastrowid
+                self.seed_feed(cursor, feed_id, feed_seed(fetched))
+                
+                if guild_id is not None:
+                    cursor.execute('''
+                        INSERT INTO subscriptions (feed_id, guild_id) VALUES (?, ?)
+                    ''', (feed_id, guild_id))
             
             return {'success': True, 'channel_name': channel_name, 'feed_id': feed_id}
             
         except sqlite3.IntegrityError:
+            self.get_connection().rollback()
             return {'success': False, 'message': 'Feed already exists'}
         except Exception as e:
+            self.get_connection().rollback()
             return {'success': False, 'message': str(e)}
     
-    def remove_feed(self, feed_id):
-        """Remove RSS feed"""
-        conn = sqlite3.connect(self.db_file)
+    def seed_feed(self, cursor, feed_id, seed):
+        """Store a new feed's validators and mark its current entries seen
+        
+        Uses the validation fetch, so the bot's first poll is a conditional
+        GET and the existing backlog is not posted.
+        """
+        cursor.execute('''
+            UPDATE feeds
+            SET etag = ?, last_modified = ?, content_hash = ?, content_length = ?, entry_count = ?
+            WHERE id = ?
+        ''', (seed['etag'], seed['last_modified'], seed['content_hash'], seed['content_length'],
+              seed['entry_count'], feed_id))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO posts (feed_id, post_id) VALUES (?, ?)
+        ''', [(feed_id, pack_post_id(post_id)) for post_id in seed['post_ids']])
+    
+    def unique_channel_names(self, cursor, names):
+        """Make sanitized channel names unique among feeds and each other (name, name-1, name-2, ...)
+        
+        Looks up every name already taken by any of the bases in one query.
+        """
+        bases = json.dumps(sorted(set(names)))
+        cursor.execute('''
+            SELECT f.channel_name FROM json_each(?) AS base
+            JOIN feeds f ON f.channel_name = base.value
+            UNION
+            SELECT f.channel_name FROM json_each(?) AS base
+            JOIN feeds f ON f.channel_name > base.value || '-' AND f.channel_name < base.value || '.'
+        ''', (bases, bases))
+        taken = {row[0] for row in cursor.fetchall()}
+        
+        unique = []
+        for name in names:
+            channel_name, counter = name, 0
+            while channel_name in taken:
+                counter += 1
+                channel_name = f"{name}-{counter}"
+            taken.add(channel_name)
+            unique.append(channel_name)
+        
+        return unique
+    
+    def get_feed_ids_by_url(self, urls):
+        """Map the given URLs that are already feeds to their feed IDs"""
+        conn = self.get_connection()
+        cursor = conn.execute('''
+            SELECT f.url, f.id FROM json_each(?) AS u JOIN feeds f ON f.url = u.value
+        ''', (json.dumps(list(urls)),))
+        return dict(cursor.fetchall())
+    
+    def add_feeds(self, feeds, guild_id=None):
+        """Add already validated feeds ({'url', 'title'}) in a single transaction
+        
+        URLs that are already feeds are subscribed by guild_id instead (or
+        skipped without one). Returns {'added': [{'feed_id', 'url',
+        'channel_name'}], 'subscribed': [feed_id], 'skipped': [url]}.
+        """
+        result = {'added': [], 'subscribed': [], 'skipped': []}
+        conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM feeds WHERE id = ?', (feed_id,))
-        cursor.execute('DELETE FROM posts WHERE feed_id = ?', (feed_id,))
+        with conn:
+            # Hold the write lock from the existence check to the last insert
+            cursor.execute('BEGIN IMMEDIATE')
+            unique_feeds = list({feed['url']: feed for feed in feeds}.values())
+            existing = self.get_feed_ids_by_url(feed['url'] for feed in unique_feeds)
+            
+            new_feeds = []
+            for feed in unique_feeds:
+                feed_id = existing.get(feed['url'])
+                if feed_id is None:
+                    new_feeds.append(feed)
+                    continue
+                if guild_id is not None:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO subscriptions (feed_id, guild_id) VALUES (?, ?)
+                    ''', (feed_id, guild_id))
+                    if cursor.rowcount:
+                        result['subscribed'].append(feed_id)
+                        continue
+                result['skipped'].append(feed['url'])
+            
+            channel_names = self.unique_channel_names(
+                cursor, [self.sanitize_channel_name(feed['title']) for feed in new_feeds]
+            )
+            for feed, channel_name in zip(new_feeds, channel_names):
+                cursor.execute('''
+                    INSERT INTO feeds (url, title, channel_name, guild_id)
+                    VALUES (?, ?, ?, ?)
+                ''', (feed['url'], feed['title'], channel_name, guild_id))
+                feed_id = cursor.lastrowid
+                if feed.get('seed'):
+                    self.seed_feed(cursor, feed_id, feed['seed'])
+                result['added'].append({'feed_id': feed_id, 'url': feed['url'], 'channel_name': channel_name})
+            
+            if guild_id is not None:
+                cursor.executemany('''
+                    INSERT INTO subscriptions (feed_id, guild_id) VALUES (?, ?)
+                ''', [(feed['feed_id'], guild_id) for feed in result['added']])
         
-        conn.commit()
-        conn.close()
+        return result
     
-    def get_all_feeds(self):
-        """Get all RSS feeds"""
-        conn = sqlite3.connect(self.db_file)
+    def remove_feed(self, feed_id):
+        """Remove RSS feed"""
+        conn = self.get_connection()
+        
+        # Posts are removed by ON DELETE CASCADE
+        with conn:
+            conn.execute('DELETE FROM feeds WHERE id = ?', (feed_id,))
+    
+    def get_feed_by_url(self, url):
+        """Get a feed's id and channel name by URL (None if not added)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id, channel_name FROM feeds WHERE url = ?', (url,))
+        row = cursor.fetchone()
+        return {'id': row[0], 'channel_name': row[1]} if row else None
+    
+    @DB_QUERY_SECONDS.time(query='get_all_feeds')
+    def get_all_feeds(self, partitions=None, partition_count=None):
+        """Get all RSS feeds, or only those in the given partitions (feed id % partition_count)"""
+        conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT f.id, f.url, f.title, f.channel_name, 
-                   COUNT(p.id) as posts_count
+        where, params = '', ()
+        if partitions is not None:
+            partitions = sorted(partitions)
+            where = f"WHERE f.id % ? IN ({', '.join('?' * len(partitions))})"
+            params = (partition_count, *partitions)
+        
+        cursor.execute(f'''
+            SELECT f.id, f.url, f.title, f.channel_name, f.posts_count,
+                   f.etag, f.last_modified, f.content_hash, f.content_length,
+                   f.ordered_polls, f.guild_id, f.consecutive_failures, f.rules_version,
+                   (SELECT COUNT(*) FROM subscriptions s WHERE s.feed_id = f.id)
             FROM feeds f
-            LEFT JOIN posts p ON f.id = p.feed_id
-            GROUP BY f.id
-        ''')
+            {where}
+            ORDER BY f.id
+        ''', params)
         
         feeds = []
         for row in cursor.fetchall():
@@ -154,44 +632,748 @@ class Database:
                 'url': row[1],
                 'title': row[2],
                 'channel_name': row[3],
-                'posts_count': row[4]
+                'posts_count': row[4],
+                'etag': row[5],
+                'last_modified': row[6],
+                'content_hash': row[7],
+                'content_length': row[8],
+                'ordered_polls': row[9],
+                'guild_id': row[10],
+                'consecutive_failures': row[11],
+                'rules_version': row[12],
+                'subscribers': row[13]
             })
         
-        conn.close()
         return feeds
     
+    def add_rule(self, feed_id, action, pattern, regex=False, channel_name=None):
+        """Add an include, exclude or route rule to a feed"""
+        if action == 'route' and channel_name:
+            channel_name = self.sanitize_channel_name(channel_name)
+        error = rule_error(action, pattern, regex, channel_name)
+        if error:
+            return {'success': False, 'message': error}
+        
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO feed_rules (feed_id, action, pattern, regex, channel_name)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (feed_id, action, pattern.strip(), int(bool(regex)), channel_name if action == 'route' else None))
+            rule_id = cursor.lastrowid
+            # Processes holding the feed's compiled rules recompile them on its next poll
+            conn.execute('UPDATE feeds SET rules_version = rules_version + 1 WHERE id = ?', (feed_id,))
+        
+        return {'success': True, 'rule_id': rule_id}
+    
+    def remove_rule(self, rule_id):
+        """Remove a feed rule"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                UPDATE feeds SET rules_version = rules_version + 1
+                WHERE id = (SELECT feed_id FROM feed_rules WHERE id = ?)
+            ''', (rule_id,))
+            conn.execute('DELETE FROM feed_rules WHERE id = ?', (rule_id,))
+    
+    @DB_QUERY_SECONDS.time(query='get_rules')
+    def get_rules(self, feed_ids):
+        """Rules of the given feeds, {feed_id: [rule, ...]} in the order they were added"""
+        cursor = self.get_connection().cursor()
+        rules = {}
+        feed_ids = list(feed_ids)
+        
+        for start in range(0, len(feed_ids), SQL_BATCH_SIZE):
+            chunk = feed_ids[start:start + SQL_BATCH_SIZE]
+            cursor.execute(f'''
+                SELECT id, feed_id, action, pattern, regex, channel_name FROM feed_rules
+                WHERE feed_id IN ({', '.join('?' * len(chunk))})
+                ORDER BY id
+            ''', chunk)
+            for row in cursor.fetchall():
+                rules.setdefault(row[1], []).append({
+                    'id': row[0],
+                    'feed_id': row[1],
+                    'action': row[2],
+                    'pattern': row[3],
+                    'regex': bool(row[4]),
+                    'channel_name': row[5]
+                })
+        
+        return rules
+    
+    def get_rules_version(self, feed_id):
+        """A feed's rules_version (0 if it never had rules)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT rules_version FROM feeds WHERE id = ?', (feed_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    @DB_QUERY_SECONDS.time(query='search_feeds')
+    def search_feeds(self, query='', limit=25, offset=0):
+        """One page of feeds whose title, URL or channel name contains query
+        
+        Returns {'feeds': [...], 'total': matching feed count}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        where, params = '', ()
+        if query:
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where = '''
+                WHERE f.title LIKE ? ESCAPE '\\' OR f.url LIKE ? ESCAPE '\\'
+                   OR f.channel_name LIKE ? ESCAPE '\\'
+            '''
+            params = (pattern, pattern, pattern)
+        
+        cursor.execute(f'SELECT COUNT(*) FROM feeds f {where}', params)
+        total = cursor.fetchone()[0]
+        
+        cursor.execute(f'''
+            SELECT f.id, f.url, f.title, f.channel_name, f.posts_count,
+                   f.last_success, f.consecutive_failures, f.last_error, f.latency_ms,
+                   (SELECT COUNT(*) FROM subscriptions s WHERE s.feed_id = f.id)
+            FROM feeds f
+            {where}
+            ORDER BY f.id
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset))
+        
+        feeds = []
+        for row in cursor.fetchall():
+            feeds.append({
+                'id': row[0],
+                'url': row[1],
+                'title': row[2],
+                'channel_name': row[3],
+                'posts_count': row[4],
+                'last_success': row[5],
+                'consecutive_failures': row[6],
+                'last_error': row[7],
+                'latency_ms': row[8],
+                'subscribers': row[9]
+            })
+        
+        return {'feeds': feeds, 'total': total}
+    
+    @DB_QUERY_SECONDS.time(query='update_feed_validators')
+    def update_feed_validators(self, feed_id, etag, last_modified, content_hash, content_length,
+                               entry_count=None, ordered_polls=None):
+        """Store the validators returned by the last successful fetch"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('''
+                UPDATE feeds
+                SET etag = ?, last_modified = ?, content_hash = ?, content_length = ?,
+                    entry_count = COALESCE(?, entry_count),
+                    ordered_polls = COALESCE(?, ordered_polls)
+                WHERE id = ?
+            ''', (etag, last_modified, content_hash, content_length, entry_count, ordered_polls,
+                  feed_id))
+    
+    @DB_QUERY_SECONDS.time(query='update_http_validators')
+    def update_http_validators(self, feed_id, etag, last_modified):
+        """Store new ETag/Last-Modified values for a feed whose body did not change"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('UPDATE feeds SET etag = ?, last_modified = ? WHERE id = ?',
+                         (etag, last_modified, feed_id))
+    
+    @DB_QUERY_SECONDS.time(query='record_feed_health')
+    def record_feed_health(self, results):
+        """Store poll outcomes, [(feed_id, error or None, download seconds or None)], in one transaction
+        
+        Successes reset the failure count, clear the last error and fold the
+        download time into the feed's rolling latency average; failures count
+        up and keep the error.
+        """
+        successes = [(latency, latency, feed_id) for feed_id, error, latency in results if not error]
+        failures = [(error, feed_id) for feed_id, error, latency in results if error]
+        conn = self.get_connection()
+        
+        with conn:
+            conn.executemany(f'''
+                UPDATE feeds
+                SET last_success = CURRENT_TIMESTAMP, consecutive_failures = 0, last_error = NULL,
+                    latency_ms = COALESCE(latency_ms + {LATENCY_SMOOTHING} * (? * 1000 - latency_ms),
+                                          ? * 1000, latency_ms)
+                WHERE id = ?
+            ''', successes)
+            conn.executemany('''
+                UPDATE feeds
+                SET consecutive_failures = consecutive_failures + 1, last_error = ?
+                WHERE id = ?
+            ''', failures)
+    
+    def is_near_duplicate(self, cursor, guild_id, fingerprint, since):
+        """Whether the guild got a post with the same link or a close SimHash since the given time"""
+        simhash = fingerprint['simhash']
+        keys = bands(simhash) if simhash is not None else [None] * 4
+        # One covering index search per band (an OR would read every candidate row from the table)
+        cursor.execute('''
+            SELECT 1, NULL FROM fingerprints WHERE link_hash = ? AND guild_id = ? AND seen_at >= ?
+            UNION ALL SELECT 0, simhash FROM fingerprints WHERE band0 = ? AND guild_id = ? AND seen_at >= ?
+            UNION ALL SELECT 0, simhash FROM fingerprints WHERE band1 = ? AND guild_id = ? AND seen_at >= ?
+            UNION ALL SELECT 0, simhash FROM fingerprints WHERE band2 = ? AND guild_id = ? AND seen_at >= ?
+            UNION ALL SELECT 0, simhash FROM fingerprints WHERE band3 = ? AND guild_id = ? AND seen_at >= ?
+        ''', (fingerprint['link_hash'], guild_id, since,
+              *(value for key in keys for value in (key, guild_id, since))))
+        return any(
+            same_link or (simhash is not None and seen_simhash is not None
+                          and distance(simhash, seen_simhash) <= MAX_DISTANCE)
+            for same_link, seen_simhash in cursor.fetchall()
+        )
+    
+    @DB_QUERY_SECONDS.time(query='claim_fingerprints')
+    def claim_fingerprints(self, guild_id, feed_id, fingerprints, window=DEDUP_WINDOW_HOURS * 3600,
+                           now=None):
+        """Store the fingerprints of posts about to be delivered to a guild, skipping near-duplicates
+        
+        fingerprints are fingerprint.fingerprint() dicts. A post is a
+        duplicate when a post from any feed delivered to the guild in the last
+        window seconds has the same normalized link or a SimHash at most
+        MAX_DISTANCE bits away. Returns one bool per fingerprint: True if it
+        was new and stored.
+        """
+        now = time.time() if now is None else now
+        claimed = []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        with conn:
+            # Check and insert under one write lock so two processes cannot both claim a story
+            cursor.execute('BEGIN IMMEDIATE')
+            for fingerprint in fingerprints:
+                duplicate = self.is_near_duplicate(cursor, guild_id, fingerprint, now - window)
+                claimed.append(not duplicate)
+                if duplicate:
+                    continue
+                simhash = fingerprint['simhash']
+                keys = bands(simhash) if simhash is not None else [None] * 4
+                cursor.execute('''
+                    INSERT INTO fingerprints (
+                        guild_id, feed_id, link_hash, simhash, band0, band1, band2, band3, seen_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (guild_id, feed_id, fingerprint['link_hash'],
+                      None if simhash is None else to_signed(simhash), *keys, now))
+        
+        return claimed
+    
+    def subscribe(self, feed_id, guild_id):
+        """Subscribe a guild to a feed; returns False if it already was"""
+        conn = self.get_connection()
+        
+        with conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO subscriptions (feed_id, guild_id) VALUES (?, ?)
+            ''', (feed_id, guild_id))
+        
+        return cursor.rowcount > 0
+    
+    def adopt_feeds(self, guild_id):
+        """Subscribe guild_id to feeds added without a guild; returns how many"""
+        conn = self.get_connection()
+        
+        with conn:
+            # Keep the channel a single-guild bot already resolved for the feed
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO subscriptions (feed_id, guild_id, channel_id)
+                SELECT id, ?, channel_id FROM feeds WHERE guild_id IS NULL
+            ''', (guild_id,))
+            conn.execute('UPDATE feeds SET guild_id = ? WHERE guild_id IS NULL', (guild_id,))
+        
+        return cursor.rowcount
+    
+    @DB_QUERY_SECONDS.time(query='get_subscriptions')
+    def get_subscriptions(self, feed_ids=None, guild_ids=None, missing_channel=False):
+        """Get subscriptions (feed_id, guild_id, channel_id, channel_name), optionally filtered"""
+        cursor = self.get_connection().cursor()
+        
+        conditions, params = [], []
+        for column, values in (('s.feed_id', feed_ids), ('s.guild_id', guild_ids)):
+            if values is not None:
+                values = list(values)
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params += values
+        if missing_channel:
+            conditions.append('s.channel_id IS NULL')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        cursor.execute(f'''
+            SELECT s.feed_id, s.guild_id, s.channel_id, f.channel_name
+            FROM subscriptions s JOIN feeds f ON f.id = s.feed_id
+            {where}
+            ORDER BY s.feed_id, s.guild_id
+        ''', params)
+        
+        return [
+            {'feed_id': row[0], 'guild_id': row[1], 'channel_id': row[2], 'channel_name': row[3]}
+            for row in cursor.fetchall()
+        ]
+    
+    @DB_QUERY_SECONDS.time(query='set_subscription_channels')
+    def set_subscription_channels(self, channel_ids):
+        """Store the channel resolved for each subscription ({(feed_id, guild_id): channel_id})"""
+        if not channel_ids:
+            return
+        conn = self.get_connection()
+        
+        with conn:
+            conn.executemany(
+                'UPDATE subscriptions SET channel_id = ? WHERE feed_id = ? AND guild_id = ?',
+                [(channel_id, feed_id, guild_id)
+                 for (feed_id, guild_id), channel_id in channel_ids.items()]
+            )
+    
+    def clear_subscription_channel(self, channel_id):
+        """Forget a deleted channel so it is resolved (or recreated) again"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('UPDATE subscriptions SET channel_id = NULL WHERE channel_id = ?', (channel_id,))
+    
+    def remove_guild(self, guild_id):
+        """Drop all subscriptions of a guild the bot has left"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('DELETE FROM subscriptions WHERE guild_id = ?', (guild_id,))
+    
+    @DB_QUERY_SECONDS.time(query='lease_partitions')
+    def lease_partitions(self, owner, count, lease_seconds, now=None):
+        """Renew this owner's partition leases and rebalance; returns the partitions it owns
+        
+        Every live owner aims for an equal share: an owner above its share
+        releases the excess, one below it claims free or expired partitions.
+        Claims are conditional updates, so two processes never own the same
+        partition.
+        """
+        now = time.time() if now is None else now
+        expires = now + lease_seconds
+        conn = self.get_connection()
+        
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO partitions (partition) VALUES (?)',
+                [(partition,) for partition in range(count)]
+            )
+            conn.execute('''
+                UPDATE partitions SET expires_at = ?
+                WHERE owner = ? AND partition < ?
+            ''', (expires, owner, count))
+            
+            # Owners heartbeat even while they hold nothing, so shares shrink for newcomers
+            conn.execute('''
+                INSERT OR REPLACE INTO partition_owners (owner, expires_at) VALUES (?, ?)
+            ''', (owner, expires))
+            conn.execute('DELETE FROM partition_owners WHERE expires_at < ?', (now,))
+            owners = conn.execute('SELECT COUNT(*) FROM partition_owners').fetchone()[0]
+            share = -(-count // owners)
+            
+            owned = [row[0] for row in conn.execute('''
+                SELECT partition FROM partitions
+                WHERE owner = ? AND partition < ?
+                ORDER BY partition
+            ''', (owner, count))]
+            
+            if len(owned) > share:
+                conn.executemany('''
+                    UPDATE partitions SET owner = NULL, expires_at = NULL
+                    WHERE partition = ? AND owner = ?
+                ''', [(partition, owner) for partition in owned[share:]])
+                owned = owned[:share]
+            elif len(owned) < share:
+                free = [row[0] for row in conn.execute('''
+                    SELECT partition FROM partitions
+                    WHERE partition < ? AND (owner IS NULL OR expires_at < ?)
+                    ORDER BY partition LIMIT ?
+                ''', (count, now, share - len(owned)))]
+                for partition in free:
+                    claimed = conn.execute('''
+                        UPDATE partitions SET owner = ?, expires_at = ?
+                        WHERE partition = ? AND (owner IS NULL OR expires_at < ?)
+                    ''', (owner, expires, partition, now))
+                    if claimed.rowcount:
+                        owned.append(partition)
+        
+        return set(owned)
+    
+    def release_partitions(self, owner):
+        """Give up all of an owner's partitions (on shutdown)"""
+        conn = self.get_connection()
+        
+        with conn:
+            conn.execute('''
+                UPDATE partitions SET owner = NULL, expires_at = NULL
+                WHERE owner = ?
+            ''', (owner,))
+            conn.execute('DELETE FROM partition_owners WHERE owner = ?', (owner,))
+    
     def add_post(self, feed_id, post_id):
         """Add post to database (mark as seen)"""
         try:
-            conn = sqlite3. connect(self.db_file)
-            cursor = conn.cursor()
+            conn = self.get_connection()
             
-            cursor.execute('''
-                INSERT INTO posts (feed_id, post_id) 
-                VALUES (?, ?)
-            ''', (feed_id, post_id))
+            with conn:
+                conn.execute('''
+                    INSERT INTO posts (feed_id, post_id) 
+                    VALUES (?, ?)
+                ''', (feed_id, pack_post_id(post_id)))
             
-            conn.commit()
-            conn. close()
             return True
         except sqlite3.IntegrityError:
             # Post already exists
             return False
         except Exception as e:
-            print(f"❌ Error adding post: {str(e)}")
+            log.error("❌ Error adding post: %s", e, extra={'feed_id': feed_id})
             return False
     
+    @DB_QUERY_SECONDS.time(query='record_new_posts')
+    def record_new_posts(self, feed_id, post_ids, skip_lookup=()):
+        """Mark a batch of posts as seen and return the ones that were new, in order
+        
+        IDs in skip_lookup are already known to be unseen (from the seen-post
+        cache) and are inserted without a SELECT first.
+        """
+        # Drop repeats within the batch, keeping the first occurrence
+        candidates = list(dict.fromkeys(post_ids))
+        if not candidates:
+            return []
+        
+        packed = {post_id: pack_post_id(post_id) for post_id in candidates}
+        skip_lookup = set(skip_lookup)
+        lookup = [post_id for post_id in candidates if post_id not in skip_lookup]
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        seen = self.get_seen_post_ids(feed_id, lookup)
+        
+        with conn:
+            # Trust but verify: an ignored insert means the post was seen after all
+            for post_id in candidates:
+                if post_id in skip_lookup:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO posts (feed_id, post_id)
+                        VALUES (?, ?)
+                    ''', (feed_id, packed[post_id]))
+                    if cursor.rowcount == 0:
+                        seen.add(post_id)
+            
+            cursor.executemany('''
+                INSERT OR IGNORE INTO posts (feed_id, post_id)
+                VALUES (?, ?)
+            ''', [(feed_id, packed[post_id]) for post_id in lookup if post_id not in seen])
+        
+        return [post_id for post_id in candidates if post_id not in seen]
+    
+    @DB_QUERY_SECONDS.time(query='get_seen_post_ids')
+    def get_seen_post_ids(self, feed_id, post_ids):
+        """Return the subset of post_ids already seen for a feed"""
+        cursor = self.get_connection().cursor()
+        post_ids = list(post_ids)
+        
+        seen = set()
+        for start in range(0, len(post_ids), SQL_BATCH_SIZE):
+            chunk = post_ids[start:start + SQL_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT post_id FROM posts
+                WHERE feed_id = ? AND post_id IN ({placeholders})
+            ''', (feed_id, *(pack_post_id(post_id) for post_id in chunk)))
+            seen.update(unpack_post_id(row[0]) for row in cursor.fetchall())
+        
+        return seen
+    
+    def get_post_ids(self, feed_id):
+        """Get all seen post IDs of a feed, oldest first"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT post_id FROM posts WHERE feed_id = ? ORDER BY id', (feed_id,))
+        return [unpack_post_id(row[0]) for row in cursor.fetchall()]
+    
+    def iter_post_ids(self):
+        """Stream (feed_id, post_id) for every seen post, grouped by feed, oldest first"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT feed_id, post_id FROM posts ORDER BY feed_id, id')
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for feed_id, post_id in rows:
+                yield feed_id, unpack_post_id(post_id)
+    
     def post_exists(self, feed_id, post_id):
         """Check if post has been seen before"""
-        conn = sqlite3. connect(self.db_file)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT id FROM posts 
             WHERE feed_id = ?  AND post_id = ?
-        ''', (feed_id, post_id))
+        ''', (feed_id, pack_post_id(post_id)))
         
         exists = cursor.fetchone() is not None
-        conn.close()
         
-        return exists
\ No newline at end of file
+        return exists
+    
+    @DB_QUERY_SECONDS.time(query='add_history')
+    def add_history(self, posts, now=None):
+        """Store new posts ([(feed_id, post)]) in the searchable history, in one transaction"""
+        if not posts or not self.history_available:
+            return
+        now = now or time.time()
+        conn = self.get_connection()
+        
+        with conn:
+            conn.executemany('''
+                INSERT INTO history (feed_id, post_id, title, link, author, summary, image, published, seen_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (feed_id, pack_post_id(post['post_id']), post['title'], post['link'] or None, post['author'],
+                 (post['summary'] or '')[:HISTORY_SUMMARY_CHARS] or None, post['image'],
+                 post['published_date'].isoformat(sep=' ') if post['published_date'] else None, now)
+                for feed_id, post in posts
+            ])
+    
+    @DB_QUERY_SECONDS.time(query='search_history')
+    def search_history(self, query, guild_id=None, limit=10, offset=0, window=HISTORY_RANK_WINDOW,
+                       highlight=('**', '**')):
+        """One page of history posts matching query, best match first
+        
+        Only the newest window matches are ranked, so a common word costs
+        the same as a rare one. With guild_id, only posts of feeds the guild
+        subscribes to are searched. Returns {'posts': [...], 'has_more'};
+        each post carries a snippet of its summary with the matches
+        wrapped in highlight.
+        """
+        match = fts_query(query)
+        if not match or not self.history_available:
+            return {'posts': [], 'has_more': False}
+        match = f"{{title summary author}} : ({match})"
+        cursor = self.get_connection().cursor()
+        
+        where, params = '', [match]
+        if guild_id is not None:
+            cursor.execute('''
+                SELECT feed_id FROM subscriptions WHERE guild_id = ? LIMIT ?
+            ''', (guild_id, SEARCH_FEED_FILTER_MAX + 1))
+            feed_ids = [row[0] for row in cursor.fetchall()]
+            if not feed_ids:
+                return {'posts': [], 'has_more': False}
+            if len(feed_ids) <= SEARCH_FEED_FILTER_MAX:
+                params = [f"({match}) AND feed_id : ({' OR '.join(map(str, feed_ids))})"]
+            else:
+                where = 'AND h.feed_id IN (SELECT feed_id FROM subscriptions WHERE guild_id = ?)'
+                params.append(guild_id)
+        cursor.execute(f'''
+            SELECT m.id, h.feed_id, f.title, h.title, h.link, h.author, h.published
+            FROM (
+                SELECT h.id AS id, history_fts.rank AS rank
+                FROM history_fts JOIN history h ON h.id = history_fts.rowid
+                WHERE history_fts MATCH ? {where}
+                ORDER BY history_fts.rowid DESC LIMIT ?
+            ) m
+            JOIN history h ON h.id = m.id
+            JOIN feeds f ON f.id = h.feed_id
+            ORDER BY m.rank, m.id DESC
+            LIMIT ? OFFSET ?
+        ''', (*params, window, limit + 1, offset))
+        rows = cursor.fetchall()
+        
+        posts = [{
+            'id': row[0],
+            'feed_id': row[1],
+            'feed_title': row[2],
+            'title': row[3],
+            'link': row[4],
+            'author': row[5],
+            'published': row[6],
+            'snippet': ''
+        } for row in rows[:limit]]
+        
+        # Snippets only for the page being shown
+        if posts:
+            cursor.execute(f'''
+                SELECT rowid, snippet(history_fts, 1, ?, ?, '…', 24) FROM history_fts
+                WHERE history_fts MATCH ? AND rowid IN ({', '.join('?' * len(posts))})
+            ''', (*highlight, params[0], *(post['id'] for post in posts)))
+            snippets = dict(cursor.fetchall())
+            for post in posts:
+                post['snippet'] = snippets.get(post['id']) or ''
+        
+        return {'posts': posts, 'has_more': len(rows) > limit}
+    
+    @DB_QUERY_SECONDS.time(query='add_outbox')
+    def add_outbox(self, channel_id, feed_id, payloads, owner=None):
+        """Persist undelivered post payloads queued by owner; returns their outbox IDs in order"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        outbox_ids = []
+        
+        with conn:
+            for payload in payloads:
+                cursor.execute('''
+                    INSERT INTO outbox (channel_id, feed_id, payload, owner)
+                    VALUES (?, ?, ?, ?)
+                ''', (channel_id, feed_id, payload, owner))
+                outbox_ids.append(cursor.lastrowid)
+        
+        return outbox_ids
+    
+    def get_outbox(self):
+        """Get all undelivered posts as (id, channel_id, payload, feed_id), oldest first"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id, channel_id, payload, feed_id FROM outbox ORDER BY id')
+        return cursor.fetchall()
+    
+    @DB_QUERY_SECONDS.time(query='claim_outbox')
+    def claim_outbox(self, owner, count, partitions, now=None):
+        """Take over the undelivered posts of some feed partitions whose owner is gone
+        
+        Returns them as (id, channel_id, payload, feed_id), oldest first.
+        Posts of owners still holding a lease are left to them, and each row
+        is claimed in a single update, so no post is queued by two processes.
+        """
+        partitions = list(partitions)
+        if not partitions:
+            return []
+        now = time.time() if now is None else now
+        conn = self.get_connection()
+        
+        with conn:
+            rows = conn.execute(f'''
+                UPDATE outbox SET owner = ?
+                WHERE feed_id % ? IN ({', '.join('?' * len(partitions))})
+                  AND (owner IS NULL
+                       OR owner NOT IN (SELECT owner FROM partition_owners WHERE expires_at >= ?))
+                RETURNING id, channel_id, payload, feed_id
+            ''', (owner, count, *partitions, now)).fetchall()
+        
+        return sorted(rows)
+    
+    @DB_QUERY_SECONDS.time(query='delete_outbox')
+    def delete_outbox(self, outbox_ids):
+        """Remove delivered (or undeliverable) posts from the outbox"""
+        conn = self.get_connection()
+        with conn:
+            conn.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in outbox_ids])
+    
+    def queue_action(self, action, feed_id=None, payload=None):
+        """Record an action for the bot to apply"""
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO pending_actions (action, feed_id, payload)
+                VALUES (?, ?, ?)
+            ''', (action, feed_id, json.dumps(payload or {})))
+        return cursor.lastrowid
+    
+    @DB_QUERY_SECONDS.time(query='take_actions')
+    def take_actions(self, owns=None):
+        """Remove and return pending actions, oldest first
+        
+        With owns (feed_id -> bool), only actions for feeds it accepts and
+        actions without a feed are taken; the rest stay for their owner.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        with conn:
+            # Read and delete under one write lock, and apply only the rows this delete removed,
+            # so an action without a feed is taken by one process only
+            cursor.execute('BEGIN IMMEDIATE')
+            ids = [
+                row[0] for row in cursor.execute('SELECT id, feed_id FROM pending_actions').fetchall()
+                if owns is None or row[1] is None or owns(row[1])
+            ]
+            rows = []
+            for start in range(0, len(ids), SQL_BATCH_SIZE):
+                chunk = ids[start:start + SQL_BATCH_SIZE]
+                rows += cursor.execute(f'''
+                    DELETE FROM pending_actions WHERE id IN ({', '.join('?' * len(chunk))})
+                    RETURNING id, action, feed_id, payload
+                ''', chunk).fetchall()
+        rows.sort()
+        
+        return [
+            {'id': row[0], 'action': row[1], 'feed_id': row[2], 'payload': json.loads(row[3] or '{}')}
+            for row in rows
+        ]
+    
+    @DB_QUERY_SECONDS.time(query='compact_posts')
+    def compact_posts(self, batch_size=COMPACTION_BATCH_SIZE, history_max_posts=HISTORY_MAX_POSTS):
+        """Apply the retention policy to seen posts and reclaim freed pages
+        
+        A feed keeps its newest max(POST_RETENTION_COUNT, 2 x entries it
+        serves) posts plus everything seen within POST_RETENTION_DAYS, so
+        entries still in the feed are never forgotten and reposted.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cutoff = f'-{POST_RETENTION_DAYS} days'
+        deleted = 0
+        
+        cursor.execute('SELECT id, posts_count, entry_count FROM feeds')
+        for feed_id, posts_count, entry_count in cursor.fetchall():
+            keep = max(POST_RETENTION_COUNT, 2 * (entry_count or 0))
+            if posts_count <= keep:
+                continue
+            
+            # Row ID of the oldest post inside the keep window
+            cursor.execute('''
+                SELECT id FROM posts WHERE feed_id = ?
+                ORDER BY id DESC LIMIT 1 OFFSET ?
+            ''', (feed_id, keep - 1))
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            
+            # Small transactions so the bot and the app are never blocked for long
+            while True:
+                with conn:
+                    cursor.execute('''
+                        DELETE FROM posts WHERE id IN (
+                            SELECT id FROM posts
+                            WHERE feed_id = ? AND id < ? AND created_at < datetime('now', ?)
+                            LIMIT ?
+                        )
+                    ''', (feed_id, row[0], cutoff, batch_size))
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+        
+        # Fingerprints only matter within the dedup window; the oldest have the lowest IDs
+        fingerprint_cutoff = time.time() - DEDUP_WINDOW_HOURS * 3600
+        while True:
+            with conn:
+                cursor.execute('''
+                    DELETE FROM fingerprints WHERE id IN (
+                        SELECT id FROM fingerprints WHERE seen_at < ? ORDER BY id LIMIT ?
+                    )
+                ''', (fingerprint_cutoff, batch_size))
+            if cursor.rowcount < batch_size:
+                break
+        
+        # History keeps its newest history_max_posts rows; rows are only appended, so those have the highest IDs
+        cursor.execute('SELECT MAX(id) FROM history')
+        newest = cursor.fetchone()[0] or 0
+        trimmed = 0
+        while newest > history_max_posts:
+            with conn:
+                cursor.execute('''
+                    DELETE FROM history WHERE id IN (
+                        SELECT id FROM history WHERE id <= ? ORDER BY id LIMIT ?
+                    )
+                ''', (newest - history_max_posts, batch_size))
+            trimmed += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+        if trimmed:
+            log.info("🧹 Trimmed %d posts from the search history", trimmed)
+        
+        # executescript steps the pragma to completion (execute frees a single page)
+        conn.executescript(f'PRAGMA incremental_vacuum({VACUUM_PAGES});')
+        
+        return deleted
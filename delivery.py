@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+import discord
+from feed_parser import Post
+from metrics import (
+    SEND_SECONDS, DISCORD_RATE_LIMITED, POSTS_DELIVERED, POSTS_DROPPED, DELIVERY_LAG_SECONDS, feed_label
+)
+from config import (
+    DELIVERY_CHANNEL_RATE, DELIVERY_CHANNEL_BURST, DELIVERY_GLOBAL_RATE, DELIVERY_GLOBAL_BURST
+)
+
+log = logging.getLogger(__name__)
+
+# Discord limits for a single message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# Backoff before a channel retries a send that failed for a transient reason
+# (network error, timeout, Discord 5xx): doubles per failure, up to the max
+SEND_RETRY_SECONDS = 1
+SEND_RETRY_MAX_SECONDS = 300
+
+def build_post_embed(post, feed_title):
+    """Build the Discord embed for an RSS post"""
+    summary = post.get('summary') or ''
+    embed = discord.Embed(
+        title=post['title'][:256],
+        url=post['link'] or None,
+        description=summary[:500] + ('...' if len(summary) > 500 else ''),
+        color=0x00AAFF,
+        timestamp=post.get('published_date')
+    )
+
+    # Add author if available
+    if post.get('author'):
+        embed.add_field(name="👤 Author", value=post['author'][:1024], inline=True)
+
+    # Add source
+    embed.set_footer(text=f"Source: {feed_title}")
+
+    # Add thumbnail if available
+    if post.get('image'):
+        embed.set_thumbnail(url=post['image'])
+
+    return embed
+
+def post_payload(post, feed_title):
+    """(payload, serialized payload, embed size) of a post's embed, built once per Post"""
+    cached = post.embed if isinstance(post, Post) else None
+    if cached is not None and cached[0] == feed_title:
+        return cached[1:]
+    embed = build_post_embed(post, feed_title)
+    payload = embed.to_dict()
+    built = (payload, json.dumps(payload), len(embed))
+    if isinstance(post, Post):
+        post.embed = (feed_title, *built)
+    return built
+
+class TokenBucket:
+    """Token bucket rate limiter that can also be paused after a 429"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.paused_until = 0
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        now = self._refill()
+        wait = max(0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+class FairBucket:
+    """A token bucket whose tokens go to waiting feeds in turn (round robin).
+
+    Senders wait in a line per feed and each token goes to the next feed in
+    line, so a feed sending to many channels gets no more of the bucket than
+    a feed sending to one while both have messages waiting.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.waiters = {}  # feed_id -> deque of futures
+        self.line = deque()
+        self.task = None
+
+    async def acquire(self, feed_id):
+        if not self.line and self.bucket.delay() <= 0:
+            self.bucket.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiters = self.waiters.get(feed_id)
+        if waiters is None:
+            waiters = self.waiters[feed_id] = deque()
+            self.line.append(feed_id)
+        waiters.append(future)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._grant())
+        await future
+
+    async def _grant(self):
+        while self.line:
+            await self.bucket.acquire()
+            feed_id = self.line.popleft()
+            waiters = self.waiters[feed_id]
+            # Senders cancelled while waiting (e.g. on close) give up their place
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if waiters:
+                waiters.popleft().set_result(None)
+            else:
+                self.bucket.tokens += 1
+            if waiters:
+                self.line.append(feed_id)
+            else:
+                del self.waiters[feed_id]
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+class ChannelQueue:
+    """Pending outbox items for one channel, served by a single worker task"""
+
+    def __init__(self, channel_id, rate, burst):
+        self.channel_id = channel_id
+        self.items = deque()
+        self.bucket = TokenBucket(rate, burst)
+        self.ready = asyncio.Event()
+        self.task = None
+        self.sending = False
+        self.failures = 0
+
+class DeliveryQueue:
+    """Rate-limited outbound pipeline for RSS posts.
+
+    Posts are written to the outbox table before they are queued, so anything
+    not yet delivered survives a restart. Each channel has its own queue and
+    token bucket (Discord limits messages per channel route), all sends share
+    a global bucket that feeds take turns at, and up to 10 embeds are packed
+    into one message. Outbox rows are tagged with owner, the process that
+    queued them.
+    """
+
+    def __init__(self, db, resolve_channel, channel_rate=DELIVERY_CHANNEL_RATE,
+                 channel_burst=DELIVERY_CHANNEL_BURST, global_rate=DELIVERY_GLOBAL_RATE,
+                 global_burst=DELIVERY_GLOBAL_BURST, owner=None):
+        self.db = db
+        self.resolve_channel = resolve_channel
+        self.owner = owner
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.global_turns = FairBucket(self.global_bucket)
+        self.queues = {}
+        self.stats = {'queued': 0, 'delivered': 0, 'messages': 0, 'rate_limited': 0, 'retried': 0, 'dropped': 0}
+
+    def pending(self):
+        """Number of queued posts not yet delivered"""
+        return sum(len(queue.items) for queue in self.queues.values())
+
+    def enqueue(self, channel_id, feed_id, feed_title, posts):
+        """Persist posts to the outbox and queue them for delivery"""
+        self.fan_out([channel_id], feed_id, feed_title, posts)
+
+    def fan_out(self, channel_ids, feed_id, feed_title, posts):
+        """Queue the same posts for several channels, building each embed once"""
+        if not posts or not channel_ids:
+            return
+        payloads, serialized, sizes = zip(*(post_payload(post, feed_title) for post in posts))
+        for channel_id in channel_ids:
+            outbox_ids = self.db.add_outbox(channel_id, feed_id, serialized, self.owner)
+            self._queue(channel_id, [
+                (outbox_id, payload, size, feed_id) for outbox_id, payload, size in zip(outbox_ids, payloads, sizes)
+            ])
+
+    def restore(self, partitions=None):
+        """Queue what a previous run left in the outbox.
+        
+        With a PartitionLease, only posts of the feeds it owns that no live
+        process is delivering are claimed, so several processes can share
+        the database; without one, everything in the outbox is queued.
+        """
+        if partitions is None:
+            rows = self.db.get_outbox()
+        else:
+            rows = self.db.claim_outbox(partitions.owner, partitions.count, partitions.owned)
+        restored = 0
+        for outbox_id, channel_id, payload, feed_id in rows:
+            payload = json.loads(payload)
+            self._queue(channel_id, [(outbox_id, payload, len(discord.Embed.from_dict(payload)), feed_id)])
+            restored += 1
+        return restored
+
+    def _queue(self, channel_id, items):
+        queue = self.queues.get(channel_id)
+        if queue is None:
+            queue = self.queues[channel_id] = ChannelQueue(
+                channel_id, self.channel_rate, self.channel_burst
+            )
+        before = len(queue.items)
+        queue.items.extend(items)
+        self.stats['queued'] += len(queue.items) - before
+        queue.ready.set()
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._worker(queue))
+
+    def _take_batch(self, queue):
+        """Pop up to 10 embeds that fit in one message"""
+        batch, chars = [], 0
+        while queue.items and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            size = queue.items[0][2]
+            if batch and chars + size > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            batch.append(queue.items.popleft())
+            chars += size
+        return batch
+
+    async def _worker(self, queue):
+        while True:
+            if not queue.items:
+                queue.ready.clear()
+                await queue.ready.wait()
+                continue
+
+            channel = self.resolve_channel(queue.channel_id)
+            if channel is None:
+                self._drop_channel(queue)
+                continue
+
+            await queue.bucket.acquire()
+            # The next message goes out on its first post's feed's turn
+            await self.global_turns.acquire(queue.items[0][3])
+
+            batch = self._take_batch(queue)
+            queue.sending = True
+            try:
+                embeds = [discord.Embed.from_dict(item[1]) for item in batch]
+                with SEND_SECONDS.time():
+                    await channel.send(embeds=embeds)
+            except discord.NotFound:
+                # Channel was deleted (channels on other shards are only found out when sending)
+                queue.items.extendleft(reversed(batch))
+                self._drop_channel(queue)
+                continue
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    # Put the batch back and wait out the limit
+                    queue.items.extendleft(reversed(batch))
+                    retry_after = float(getattr(e.response, 'headers', {}).get('Retry-After', 1))
+                    queue.bucket.pause(retry_after)
+                    self.stats['rate_limited'] += 1
+                    DISCORD_RATE_LIMITED.inc()
+                    log.warning("⏳ Rate limited in channel %s, retrying in %ss", queue.channel_id, retry_after,
+                                extra={'channel_id': queue.channel_id})
+                    continue
+                if e.status >= 500:
+                    self._retry_later(queue, batch, e)
+                    continue
+                # Undeliverable (e.g. no permission): drop rather than retry forever
+                log.error("❌ Error sending embeds to channel %s: %s", queue.channel_id, e,
+                          extra={'channel_id': queue.channel_id})
+                self.stats['dropped'] += len(batch)
+                POSTS_DROPPED.inc(len(batch))
+            except Exception as e:
+                # Network errors and timeouts: the posts stay queued and in the outbox
+                self._retry_later(queue, batch, e)
+                continue
+            else:
+                queue.failures = 0
+                self.stats['delivered'] += len(batch)
+                self.stats['messages'] += 1
+                POSTS_DELIVERED.inc(len(batch))
+                self.observe_lag(batch)
+                log.info("✅ Posted %d posts to channel %s", len(batch), queue.channel_id,
+                         extra={'channel_id': queue.channel_id})
+            finally:
+                queue.sending = False
+
+            self.db.delete_outbox([item[0] for item in batch])
+
+    def _retry_later(self, queue, batch, error):
+        """Put a batch that failed for a transient reason back and pause its channel with backoff"""
+        queue.items.extendleft(reversed(batch))
+        queue.failures += 1
+        retry_after = min(SEND_RETRY_MAX_SECONDS, SEND_RETRY_SECONDS * 2 ** (queue.failures - 1))
+        queue.bucket.pause(retry_after)
+        self.stats['retried'] += 1
+        log.warning("⏳ Error sending embeds to channel %s, retrying in %ss: %s", queue.channel_id, retry_after,
+                    str(error) or error.__class__.__name__, extra={'channel_id': queue.channel_id})
+
+    def _drop_channel(self, queue):
+        """Drop every queued post of a channel that no longer exists; they can never be delivered"""
+        dropped = [item[0] for item in queue.items]
+        queue.items.clear()
+        self.db.delete_outbox(dropped)
+        self.stats['dropped'] += len(dropped)
+        POSTS_DROPPED.inc(len(dropped))
+        log.warning("⚠️ Dropped %d posts for missing channel %s", len(dropped), queue.channel_id,
+                    extra={'channel_id': queue.channel_id})
+
+    def observe_lag(self, batch):
+        """Record how long after publication each delivered post of a batch was posted"""
+        now = time.time()
+        for _, payload, _, feed_id in batch:
+            if payload.get('timestamp'):
+                try:
+                    published = datetime.fromisoformat(payload['timestamp']).timestamp()
+                except ValueError:
+                    continue
+                DELIVERY_LAG_SECONDS.observe(max(0.0, now - published), feed=feed_label(feed_id))
+
+    async def flush(self, timeout=None):
+        """Wait until every queued post has been handed to Discord"""
+        async def drained():
+            while any(queue.items or queue.sending for queue in self.queues.values()):
+                await asyncio.sleep(0.05)
+        await asyncio.wait_for(drained(), timeout)
+
+    async def close(self):
+        """Stop all workers; undelivered posts stay in the outbox"""
+        self.global_turns.close()
+        for queue in self.queues.values():
+            if queue.task is not None:
+                queue.task.cancel()
+        await asyncio.gather(
+            *(queue.task for queue in self.queues.values() if queue.task is not None),
+            return_exceptions=True
+        )
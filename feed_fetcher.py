@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import aiohttp
+from feed_parser import parse_feed, FeedStream
+from fetch_cache import FETCH_CACHE
+from config import (
+    FETCH_CONCURRENCY, FETCH_PER_HOST_LIMIT, FETCH_TIMEOUT, FETCH_CONNECT_TIMEOUT, PARSE_WORKERS,
+    STREAM_CHUNK_KB
+)
+
+USER_AGENT = 'RSS-Manager/1.0 (+https://github.com/clueNA/RSS-Manager)'
+
+class InlineExecutor(Executor):
+    """Runs each call right away in the calling thread (for one-off fetches outside the bot)"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+class FeedFetcher:
+    """Concurrent feed downloader built on aiohttp.
+
+    Downloads run on the event loop with a global concurrency limit and a
+    per-host connection limit; parsing runs in a process pool (or the given
+    executor) so large feeds neither block the loop nor hold its GIL.
+    With a FetchCache, fetch_and_parse calls made without validators reuse
+    or revalidate recent fetches of the same URL. Every request has a hard
+    deadline: timeout seconds for the whole download (or the timeout given
+    for that request) and connect_timeout seconds to connect.
+    """
+
+    def __init__(self, concurrency=FETCH_CONCURRENCY, per_host=FETCH_PER_HOST_LIMIT,
+                 timeout=FETCH_TIMEOUT, executor=None, parse_workers=PARSE_WORKERS, cache=None,
+                 connect_timeout=FETCH_CONNECT_TIMEOUT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        self.executor = executor
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self._own_executor = executor is None
+        self.cache = cache
+        self._session = None
+        self._semaphore = None
+
+    async def get_session(self):
+        """Create the shared HTTP session lazily (must run inside the loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'User-Agent': USER_AGENT}
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    def get_executor(self):
+        """Start the parsing process pool lazily"""
+        if self.executor is None:
+            # spawn: workers must not inherit the bot's threads and sockets
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.executor
+
+    async def close(self):
+        """Close the HTTP session and the parsing pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self):
+        await self.get_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def request_timeout(self, timeout):
+        """ClientTimeout for a request with its own deadline (None keeps the session's)"""
+        if timeout is None:
+            return self.timeout
+        return aiohttp.ClientTimeout(total=timeout, sock_connect=min(self.connect_timeout, timeout))
+
+    async def fetch(self, url, etag=None, last_modified=None, content_hash=None, timeout=None):
+        """Download a feed body, revalidating against previously stored validators"""
+        session = await self.get_session()
+        result = {
+            'url': url, 'status': None, 'body': None, 'headers': {}, 'error': None,
+            'not_modified': False, 'content_hash': None, 'fetch_seconds': None
+        }
+
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers,
+                                       timeout=self.request_timeout(timeout)) as response:
+                    result['status'] = response.status
+                    result['headers'] = {k.lower(): v for k, v in response.headers.items()}
+                    if response.status == 304:
+                        result['not_modified'] = True
+                    elif response.status == 200:
+                        result['body'] = await response.read()
+                    else:
+                        result['error'] = f"HTTP {response.status}"
+            except asyncio.TimeoutError:
+                result['error'] = 'Timed out'
+            except aiohttp.ClientPayloadError:
+                result['error'] = 'Incomplete response body'
+            except aiohttp.ClientError as e:
+                result['error'] = str(e) or e.__class__.__name__
+            result['fetch_seconds'] = time.perf_counter() - started
+
+        if result['body'] is not None:
+            result['content_hash'] = hashlib.sha256(result['body']).hexdigest()
+            # Same bytes as last time: nothing to parse
+            if content_hash and result['content_hash'] == content_hash:
+                result['not_modified'] = True
+
+        return result
+
+    async def parse(self, body, headers=None, check_stream=False):
+        """Parse a feed body into a compact feed record off the event loop"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.get_executor(), parse_feed, body, headers, check_stream
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            if self._own_executor:
+                self.executor = None
+            raise
+
+    async def fetch_and_parse(self, url, etag=None, last_modified=None, content_hash=None,
+                              check_stream=False, timeout=None):
+        """Download and parse a single feed; unchanged feeds are not parsed"""
+        # Callers with their own validators want to know about changes, not a cached copy
+        cached = None
+        if self.cache is not None and not (etag or last_modified or content_hash):
+            cached = self.cache.get(url)
+            if cached is not None:
+                if self.cache.fresh(cached):
+                    self.cache.stats['hits'] += 1
+                    return self._cached_result(url, cached)
+                etag = cached['headers'].get('etag')
+                last_modified = cached['headers'].get('last-modified')
+                content_hash = cached['content_hash']
+
+        result = await self.fetch(url, etag, last_modified, content_hash, timeout)
+        result['feed'] = None
+        result['streamed'] = False
+
+        if cached is not None and result['not_modified']:
+            self.cache.touch(url)
+            self.cache.stats['revalidated'] += 1
+            return self._cached_result(url, cached)
+
+        if result['body'] is not None and not result['not_modified']:
+            await self._parse_result(result, check_stream)
+            if self.cache is not None and result['feed'] is not None and not result['error']:
+                self.cache.stats['misses'] += 1
+                self.cache.put(url, result)
+
+        return result
+
+    def _cached_result(self, url, cached):
+        return {
+            'url': url, 'status': 200, 'body': cached['body'], 'headers': cached['headers'],
+            'error': None, 'not_modified': False, 'content_hash': cached['content_hash'],
+            'feed': cached['feed'], 'streamed': False, 'cached': True, 'fetch_seconds': None
+        }
+
+    async def fetch_stream(self, url, etag=None, last_modified=None, should_stop=None, timeout=None):
+        """Download and parse a feed incrementally, stopping early when told to.
+
+        Entries are parsed as chunks arrive and passed to should_stop(records);
+        once it returns True the rest of the download is abandoned and
+        result['feed'] holds only the entries read so far. Documents the
+        streaming parser cannot handle are read in full and parsed as usual.
+        """
+        session = await self.get_session()
+        result = {
+            'url': url, 'status': None, 'body': None, 'headers': {}, 'error': None,
+            'not_modified': False, 'content_hash': None, 'feed': None,
+            'streamed': True, 'truncated': False, 'fetch_seconds': None, 'parse_seconds': 0.0
+        }
+
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        stream = FeedStream()
+        chunks = []
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers,
+                                       timeout=self.request_timeout(timeout)) as response:
+                    result['status'] = response.status
+                    result['headers'] = {k.lower(): v for k, v in response.headers.items()}
+                    if response.status == 304:
+                        result['not_modified'] = True
+                    elif response.status != 200:
+                        result['error'] = f"HTTP {response.status}"
+                    else:
+                        async for chunk in response.content.iter_chunked(STREAM_CHUNK_KB * 1024):
+                            chunks.append(chunk)
+                            parse_started = time.perf_counter()
+                            try:
+                                records = stream.feed(chunk)
+                            except ET.ParseError:
+                                records, stream = None, None
+                            result['parse_seconds'] += time.perf_counter() - parse_started
+                            if stream is None:
+                                # Not plain XML (e.g. HTML entities): read the rest for feedparser
+                                chunks.append(await response.content.read())
+                                break
+                            if records and should_stop is not None and should_stop(records):
+                                result['truncated'] = True
+                                break
+            except asyncio.TimeoutError:
+                result['error'] = 'Timed out'
+            except aiohttp.ClientPayloadError:
+                result['error'] = 'Incomplete response body'
+            except aiohttp.ClientError as e:
+                result['error'] = str(e) or e.__class__.__name__
+            # Download time, not counting the incremental parsing in between
+            result['fetch_seconds'] = time.perf_counter() - started - result['parse_seconds']
+
+        if result['error'] or result['not_modified']:
+            return result
+
+        result['body'] = b''.join(chunks)
+        if result['truncated']:
+            result['feed'] = stream.result()
+            return result
+
+        result['content_hash'] = hashlib.sha256(result['body']).hexdigest()
+        parse_started = time.perf_counter()
+        try:
+            result['feed'] = stream.close() if stream is not None else None
+        except ET.ParseError:
+            result['feed'] = None
+        result['parse_seconds'] += time.perf_counter() - parse_started
+        if result['feed'] is None:
+            result['streamed'] = False
+            await self._parse_result(result, check_stream=True)
+        return result
+
+    async def _parse_result(self, result, check_stream):
+        started = time.perf_counter()
+        try:
+            result['feed'] = await self.parse(result['body'], result['headers'], check_stream)
+        except Exception as e:
+            result['error'] = f"Parse error: {str(e) or e.__class__.__name__}"
+        result['parse_seconds'] = result.get('parse_seconds', 0.0) + time.perf_counter() - started
+
+    async def fetch_all(self, feeds, stop_checks=None, check_stream=False, timeouts=None, on_result=None):
+        """Download and parse many feeds concurrently, preserving order.
+
+        ``feeds`` are feed dicts as returned by ``Database.get_all_feeds``.
+        Feeds with an entry in ``stop_checks`` ({feed_id: should_stop}) are
+        streamed with ``fetch_stream``; the rest are parsed in full.
+        ``timeouts`` ({feed_id: seconds}) shortens the deadline of some feeds.
+        ``on_result(feed, result)`` is called as each feed finishes.
+        """
+        stop_checks = stop_checks or {}
+        timeouts = timeouts or {}
+        
+        async def fetch(feed):
+            if feed['id'] in stop_checks:
+                result = await self.fetch_stream(
+                    feed['url'], feed.get('etag'), feed.get('last_modified'), stop_checks[feed['id']],
+                    timeouts.get(feed['id'])
+                )
+            else:
+                result = await self.fetch_and_parse(
+                    feed['url'], feed.get('etag'), feed.get('last_modified'), feed.get('content_hash'),
+                    check_stream, timeouts.get(feed['id'])
+                )
+            if on_result is not None:
+                on_result(feed, result)
+            return result
+        
+        return await asyncio.gather(*(fetch(feed) for feed in feeds))
+
+def fetch_feed(url, cache=FETCH_CACHE):
+    """Fetch and parse one feed from synchronous code (e.g. add_feed), through the shared fetch cache"""
+    async def run():
+        async with FeedFetcher(executor=InlineExecutor(), cache=cache) as fetcher:
+            return await fetcher.fetch_and_parse(url)
+    return asyncio.run(run())
@@ -0,0 +1,140 @@
+import asyncio
+import csv
+import io
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+from feed_fetcher import FeedFetcher
+from fetch_cache import FETCH_CACHE, feed_seed
+from config import IMPORT_CONCURRENCY, FETCH_PER_HOST_LIMIT
+
+def parse_opml(text):
+    """Feeds ({'url', 'title'}) from the outlines of an OPML document, in order"""
+    root = ET.fromstring(text)
+    feeds = []
+    for outline in root.iter('outline'):
+        url = (outline.get('xmlUrl') or '').strip()
+        if url:
+            feeds.append({'url': url, 'title': outline.get('title') or outline.get('text') or ''})
+    return feeds
+
+def parse_csv(text):
+    """Feeds from CSV: a header row naming a 'url' (and optional 'title') column, or URLs in the first column"""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    if 'url' in header:
+        url_col = header.index('url')
+        title_col = header.index('title') if 'title' in header else None
+        rows = rows[1:]
+    else:
+        url_col, title_col = 0, None
+
+    feeds = []
+    for row in rows:
+        url = row[url_col].strip() if len(row) > url_col else ''
+        title = row[title_col].strip() if title_col is not None and len(row) > title_col else ''
+        if url:
+            feeds.append({'url': url, 'title': title})
+    return feeds
+
+def parse_feed_list(text, filename=''):
+    """Parse an OPML or CSV feed list, going by the file name or the content"""
+    if filename.lower().endswith(('.opml', '.xml')) or text.lstrip().startswith('<'):
+        return parse_opml(text)
+    return parse_csv(text)
+
+def export_opml(feeds):
+    """OPML document listing the given feeds"""
+    outlines = '\n'.join(
+        f'    <outline type="rss" text={quoteattr(feed["title"])} title={quoteattr(feed["title"])} '
+        f'xmlUrl={quoteattr(feed["url"])}/>'
+        for feed in feeds
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<opml version="2.0">\n'
+        '  <head><title>RSS Manager feeds</title></head>\n'
+        f'  <body>\n{outlines}\n  </body>\n'
+        '</opml>\n'
+    )
+
+def export_csv(feeds):
+    """CSV with url, title and channel_name columns"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['url', 'title', 'channel_name'])
+    for feed in feeds:
+        writer.writerow([feed['url'], feed['title'], feed.get('channel_name', '')])
+    return output.getvalue()
+
+async def validate_feeds(feeds, concurrency=IMPORT_CONCURRENCY, per_host=FETCH_PER_HOST_LIMIT,
+                         executor=None):
+    """Fetch and parse feeds concurrently, yielding a result for each as soon as it is known.
+
+    Results are {'url', 'title', 'ok', 'error', 'seed'}; the title comes
+    from the feed itself, then from the feed list, then the URL, and seed is
+    the feed's conditional-GET state and seen post IDs (see feed_seed).
+    Parsing uses the fetcher's process pool unless an executor is given.
+    """
+    fetcher = FeedFetcher(concurrency=concurrency, per_host=per_host, executor=executor,
+                          cache=FETCH_CACHE)
+
+    async def validate(feed):
+        result = {
+            'url': feed['url'], 'title': feed.get('title') or feed['url'], 'ok': False, 'error': None,
+            'seed': None
+        }
+        if not feed['url'].startswith('http'):
+            result['error'] = 'Invalid URL format'
+            return result
+
+        fetched = await fetcher.fetch_and_parse(feed['url'])
+        parsed = fetched['feed']
+        if fetched['error']:
+            result['error'] = fetched['error']
+        elif parsed is None or (parsed['bozo'] and not parsed['entries']):
+            result['error'] = 'Invalid RSS feed or feed is empty'
+        else:
+            result['ok'] = True
+            result['title'] = parsed['feed'].get('title') or result['title']
+            result['seed'] = feed_seed(fetched)
+        return result
+
+    try:
+        for next_result in asyncio.as_completed([validate(feed) for feed in feeds]):
+            yield await next_result
+    finally:
+        await fetcher.close()
+
+async def import_feeds(db, feeds, guild_id=None, concurrency=IMPORT_CONCURRENCY,
+                       per_host=FETCH_PER_HOST_LIMIT, executor=None, on_result=None):
+    """Validate a feed list concurrently and add the valid feeds in one transaction.
+
+    URLs that are already feeds are not fetched again: they are subscribed
+    by guild_id, or skipped. on_result(result, done, total) is called as
+    each validation finishes. Returns add_feeds' result plus 'failed':
+    [{'url', 'error'}].
+    """
+    unique = list({feed['url']: feed for feed in feeds}.values())
+    existing = db.get_feed_ids_by_url(feed['url'] for feed in unique)
+    to_validate = [feed for feed in unique if feed['url'] not in existing]
+
+    valid, failed = [], []
+    done = 0
+    async for result in validate_feeds(to_validate, concurrency, per_host, executor):
+        done += 1
+        if result['ok']:
+            valid.append({'url': result['url'], 'title': result['title'], 'seed': result['seed']})
+        else:
+            failed.append({'url': result['url'], 'error': result['error']})
+        if on_result is not None:
+            on_result(result, done, len(to_validate))
+
+    # Keep the list's order for feed IDs and channel name numbering
+    order = {feed['url']: index for index, feed in enumerate(unique)}
+    valid.sort(key=lambda feed: order[feed['url']])
+    summary = db.add_feeds(valid + [feed for feed in unique if feed['url'] in existing], guild_id)
+    summary['failed'] = failed
+    return summary
@@ -0,0 +1,333 @@
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Compiled once; used for every title and summary of a new post
+HTML_TAG = re.compile('<.*?>')
+
+# Channel-level fields kept from the parsed feed (used for polling hints)
+FEED_FIELDS = ('title', 'ttl', 'sy_updateperiod', 'sy_updatefrequency')
+
+# Entry fields extract_post and content dedup read; everything else feedparser produces is dropped
+ENTRY_FIELDS = (
+    'title', 'link', 'author', 'author_detail', 'authors', 'summary',
+    'published_parsed', 'updated_parsed', 'media_thumbnail', 'media_content', 'links',
+    'feedburner_origlink'
+)
+
+# Streaming parser: element names (namespace stripped) that hold entries / channel fields
+STREAM_ENTRY_TAGS = ('item', 'entry')
+STREAM_CHANNEL_TAGS = ('channel', 'feed')
+STREAM_FEED_FIELDS = {
+    'title': 'title', 'ttl': 'ttl',
+    'updatePeriod': 'sy_updateperiod', 'updateFrequency': 'sy_updatefrequency'
+}
+MEDIA_NS = '{http://search.yahoo.com/mrss/}'
+
+# Entries whose extracted posts must match feedparser's for a feed to be streamed
+STREAM_CHECK_ENTRIES = 5
+
+def parse_feed(body, headers=None, check_stream=False):
+    """Parse raw feed bytes into a compact, picklable feed record.
+
+    Runs in the parsing process pool, so only what the bot needs crosses the
+    process boundary: a few channel fields and, per entry, its post ID and
+    the raw fields needed to build a post. With check_stream, the record also
+    says whether the feed is 'ordered': newest first, and parsed the same by
+    FeedStream, so later polls may stream it.
+    """
+    # Imported on first use: the bot parses in its process pool, so its own startup skips feedparser
+    import feedparser
+    feed = compact_feed(feedparser.parse(body, response_headers=headers))
+    if check_stream:
+        feed['ordered'] = is_newest_first(feed) and stream_matches(body, feed)
+    return feed
+
+def compact_feed(parsed):
+    """Reduce a feedparser result to {'bozo', 'feed', 'entries'}"""
+    return {
+        'bozo': bool(parsed.bozo),
+        'feed': {key: parsed.feed[key] for key in FEED_FIELDS if key in parsed.feed},
+        'entries': [
+            {
+                'post_id': generate_post_id(entry),
+                'entry': {key: entry[key] for key in ENTRY_FIELDS if key in entry}
+            }
+            for entry in parsed.entries
+        ]
+    }
+
+def generate_post_id(entry):
+    """Generate unique ID for post"""
+    # Try to use GUID or ID from feed
+    if 'id' in entry:
+        return hashlib.md5(entry['id'].encode()).hexdigest()
+    
+    # Fallback to link
+    if 'link' in entry:
+        return hashlib.md5(entry['link'].encode()).hexdigest()
+    
+    # Fallback to title + published date
+    unique_string = entry.get('title', '') + str(entry.get('published', ''))
+    return hashlib.md5(unique_string.encode()).hexdigest()
+
+def extract_post(entry):
+    """Extract relevant data from an RSS entry (a feedparser entry or compact entry dict)"""
+    return {
+        'title': entry_title(entry),
+        'link': entry.get('link', ''),
+        'author': entry_author(entry),
+        'summary': entry_summary(entry),
+        'published_date': entry_published(entry),
+        'image': entry_image(entry)
+    }
+
+def entry_title(entry):
+    return clean_html(entry.get('title', 'No Title'))
+
+def entry_author(entry):
+    if entry.get('author'):
+        return entry['author']
+    if entry.get('author_detail') and entry['author_detail'].get('name'):
+        return entry['author_detail']['name']
+    if entry.get('authors'):
+        return entry['authors'][0].get('name', '')
+    return None
+
+def entry_summary(entry):
+    # feedparser maps <description> to summary
+    if 'summary' in entry:
+        return clean_html(entry['summary'])
+    return None
+
+def entry_published(entry):
+    for key in ('published_parsed', 'updated_parsed'):
+        if entry.get(key):
+            try:
+                return datetime(*entry[key][:6])
+            except (TypeError, ValueError):
+                return None
+    return None
+
+def entry_image(entry):
+    if entry.get('media_thumbnail'):
+        return entry['media_thumbnail'][0].get('url')
+    if entry.get('media_content'):
+        return entry['media_content'][0].get('url')
+    for link in entry.get('links', ()):
+        if link.get('type', '').startswith('image/'):
+            return link.get('href')
+    return None
+
+# Post fields and the functions that extract them from a raw entry
+POST_FIELDS = {
+    'title': entry_title,
+    'link': lambda entry: entry.get('link', ''),
+    'author': entry_author,
+    'summary': entry_summary,
+    'published_date': entry_published,
+    'image': entry_image
+}
+
+POST_KEYS = frozenset(POST_FIELDS) | {'post_id', 'fingerprint'}
+
+_UNSET = object()
+
+class Post:
+    """A new post: its ID and raw entry, with each field extracted on first read.
+    
+    Reads like the post dicts it replaces (post['summary'] or post.summary).
+    The feed's rules read title and summary, and CONTENT_DEDUP reads them
+    with the link for the fingerprint; the other fields are only extracted
+    when the post's embed is built for delivery, which the search history
+    reuses, so a post no channel gets (e.g. a duplicate story) never has
+    them cleaned. embed caches that payload; routes are the extra channels
+    its feed's rules send it to.
+    """
+    __slots__ = ('post_id', 'entry', 'fingerprint', 'embed', 'routes') + tuple(f'_{name}' for name in POST_FIELDS)
+    
+    def __init__(self, post_id, entry):
+        self.post_id = post_id
+        self.entry = entry
+        self.fingerprint = None
+        self.embed = None
+        self.routes = ()
+        for name in POST_FIELDS:
+            setattr(self, f'_{name}', _UNSET)
+    
+    def __getitem__(self, key):
+        if key in POST_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in POST_KEYS else default
+    
+    def __repr__(self):
+        return f"Post({self.post_id!r})"
+
+def _lazy_field(name, extract):
+    def read(self):
+        value = getattr(self, f'_{name}')
+        if value is _UNSET:
+            value = extract(self.entry)
+            setattr(self, f'_{name}', value)
+        return value
+    return property(read)
+
+for _name, _extract in POST_FIELDS.items():
+    setattr(Post, _name, _lazy_field(_name, _extract))
+
+def clean_html(text):
+    """Remove HTML tags from text"""
+    if not text:
+        return ''
+    
+    # Remove HTML tags
+    text = HTML_TAG.sub('', text)
+    
+    # Remove extra whitespace
+    text = ' '.join(text.split())
+    
+    return text
+
+def is_newest_first(feed):
+    """True if every entry is dated and no entry is newer than the one before it"""
+    dates = [
+        record['entry'].get('published_parsed') or record['entry'].get('updated_parsed')
+        for record in feed['entries']
+    ]
+    if not all(dates):
+        return False
+    return all(tuple(a) >= tuple(b) for a, b in zip(dates, dates[1:]))
+
+def stream_matches(body, feed):
+    """True if FeedStream yields the same posts as feedparser for this document"""
+    try:
+        stream = FeedStream()
+        stream.feed(body)
+        streamed = stream.close()['entries']
+    except ET.ParseError:
+        return False
+    
+    if [r['post_id'] for r in streamed] != [r['post_id'] for r in feed['entries']]:
+        return False
+    return all(
+        extract_post(a['entry']) == extract_post(b['entry'])
+        for a, b in zip(streamed[:STREAM_CHECK_ENTRIES], feed['entries'])
+    )
+
+def parse_date(text):
+    """Parse an RFC 822 or ISO 8601 date into a UTC struct_time (like feedparser)"""
+    try:
+        date = parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        try:
+            date = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.utctimetuple()
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def element_text(element):
+    return ''.join(element.itertext()).strip()
+
+class FeedStream:
+    """Incremental RSS/Atom parser fed with raw chunks of a download.
+
+    feed() returns the compact entry records completed by each chunk (the
+    same shape parse_feed produces), so the caller can stop downloading as
+    soon as it has seen enough. Only well-formed XML is supported; callers
+    fall back to feedparser on ET.ParseError.
+    """
+    
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=('start', 'end'))
+        self.path = []
+        self.channel = {}
+        self.entries = []
+    
+    def feed(self, data):
+        """Parse a chunk; returns the entry records it completed"""
+        self.parser.feed(data)
+        return self._drain()
+    
+    def close(self):
+        """Finish a complete document; returns the compact feed record"""
+        self.parser.close()
+        self._drain()
+        return self.result()
+    
+    def result(self):
+        """Compact feed record of everything parsed so far"""
+        feed = {'bozo': False, 'feed': dict(self.channel), 'entries': list(self.entries)}
+        feed['ordered'] = is_newest_first(feed)
+        return feed
+    
+    def _drain(self):
+        records = []
+        for event, element in self.parser.read_events():
+            name = local_name(element.tag)
+            if event == 'start':
+                self.path.append(name)
+                continue
+            self.path.pop()
+            parent = self.path[-1] if self.path else None
+            
+            if name in STREAM_ENTRY_TAGS and parent in STREAM_CHANNEL_TAGS + ('RDF',):
+                entry = self._entry(element)
+                records.append({'post_id': generate_post_id(entry), 'entry': entry})
+                element.clear()
+            elif parent in STREAM_CHANNEL_TAGS and name in STREAM_FEED_FIELDS:
+                self.channel[STREAM_FEED_FIELDS[name]] = element_text(element)
+        
+        self.entries.extend(records)
+        return records
+    
+    def _entry(self, element):
+        """Map an <item>/<entry> element to the fields feedparser would produce"""
+        entry = {}
+        links = []
+        for child in element:
+            name = local_name(child.tag)
+            media = child.tag.startswith(MEDIA_NS)
+            
+            if media and name == 'thumbnail':
+                entry.setdefault('media_thumbnail', []).append({'url': child.get('url')})
+            elif media and name == 'content':
+                entry.setdefault('media_content', []).append({'url': child.get('url')})
+            elif name == 'title':
+                entry['title'] = element_text(child)
+            elif name == 'link':
+                if child.get('href') is None:
+                    entry['link'] = element_text(child)
+                    links.append({'rel': 'alternate', 'type': 'text/html', 'href': entry['link']})
+                else:
+                    rel = child.get('rel', 'alternate')
+                    links.append({'rel': rel, 'type': child.get('type', ''), 'href': child.get('href')})
+                    if rel == 'alternate':
+                        entry.setdefault('link', child.get('href'))
+            elif name == 'enclosure':
+                links.append({'rel': 'enclosure', 'type': child.get('type', ''), 'href': child.get('url')})
+            elif name in ('guid', 'id'):
+                entry['id'] = element_text(child)
+            elif name in ('description', 'summary'):
+                entry['summary'] = element_text(child)
+            elif name in ('author', 'creator'):
+                author = child.find('{*}name')
+                entry.setdefault('author', element_text(author if author is not None else child))
+            elif name in ('pubDate', 'published', 'issued'):
+                entry['published_parsed'] = parse_date(element_text(child))
+            elif name in ('updated', 'modified', 'date'):
+                entry['updated_parsed'] = parse_date(element_text(child))
+        
+        if links:
+            entry['links'] = links
+        return entry
+
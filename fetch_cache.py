@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from config import FETCH_CACHE_MB, FETCH_CACHE_TTL
+
+class FetchCache:
+    """Recent feed fetches keyed by URL: body, validators and the parsed feed.
+
+    Fetches younger than ttl seconds are served without a request; older
+    ones are revalidated with their ETag/Last-Modified. Entries are
+    evicted least recently used first once the bodies exceed the budget.
+    """
+
+    def __init__(self, max_mb=FETCH_CACHE_MB, ttl=FETCH_CACHE_TTL, clock=time.monotonic):
+        self.budget_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, url):
+        entry = self.entries.get(url)
+        if entry is not None:
+            self.entries.move_to_end(url)
+        return entry
+
+    def fresh(self, entry):
+        return self.clock() - entry['fetched_at'] < self.ttl
+
+    def put(self, url, result):
+        """Remember a successful, fully parsed fetch"""
+        self.discard(url)
+        size = len(result['body'])
+        if size > self.budget_bytes:
+            return
+
+        while self.used_bytes + size > self.budget_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.used_bytes -= len(evicted['body'])
+            self.stats['evictions'] += 1
+
+        self.entries[url] = {
+            'body': result['body'],
+            'headers': result['headers'],
+            'content_hash': result['content_hash'],
+            'feed': result['feed'],
+            'fetched_at': self.clock()
+        }
+        self.used_bytes += size
+
+    def touch(self, url):
+        """The server confirmed the cached copy (304): it is fresh again"""
+        entry = self.entries.get(url)
+        if entry is not None:
+            entry['fetched_at'] = self.clock()
+
+    def discard(self, url):
+        entry = self.entries.pop(url, None)
+        if entry is not None:
+            self.used_bytes -= len(entry['body'])
+
+# Shared by every validation fetch in the process (add_feed, imports)
+FETCH_CACHE = FetchCache()
+
+def feed_seed(result):
+    """Conditional-GET state and seen post IDs for a newly added feed, from its validation fetch"""
+    headers = result['headers']
+    return {
+        'etag': headers.get('etag'),
+        'last_modified': headers.get('last-modified'),
+        'content_hash': result['content_hash'],
+        'content_length': len(result['body']) if result['body'] is not None else None,
+        'entry_count': len(result['feed']['entries']),
+        'post_ids': list(dict.fromkeys(record['post_id'] for record in result['feed']['entries']))
+    }
@@ -0,0 +1,123 @@
+import re
+
+# What a rule does with the posts it matches: keep only matching posts,
+# drop them, or also send them to another channel
+RULE_ACTIONS = ('include', 'exclude', 'route')
+
+# User regexes are combined into one pattern, so they may not use group
+# names or numbered backreferences (their numbers change when combined)
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+def keyword_pattern(keywords):
+    """One regex matching any of the keywords as a whole word.
+
+    The keywords are merged into a trie first, so shared prefixes are
+    tried once: the regex engine walks it like an automaton instead of
+    trying every keyword at every position.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword.lower():
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return r'(?<!\w)' + trie_pattern(trie) + r'(?!\w)'
+
+def trie_pattern(node):
+    branches = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    if '' in node:
+        return '(?:' + '|'.join(branches) + ')?'
+    return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+def rule_error(action, pattern, regex=False, channel_name=None):
+    """Why a rule cannot be added, or None if it is valid"""
+    if action not in RULE_ACTIONS:
+        return f"Unknown action {action!r}"
+    if not pattern or not pattern.strip():
+        return 'Pattern is empty'
+    if action == 'route' and not channel_name:
+        return 'A route rule needs a channel'
+    if regex:
+        if BACKREFERENCE.search(pattern):
+            return 'Backreferences are not supported'
+        try:
+            # Twice, as it will be combined with other rules
+            re.compile(f'(?:{pattern})|(?:{pattern})')
+        except re.error as e:
+            return f"Invalid regex: {e}"
+    return None
+
+def combined_pattern(rules):
+    """One case-insensitive regex matching any of the rules (keywords first, as a trie)"""
+    keywords = [rule['pattern'].strip() for rule in rules if not rule['regex']]
+    parts = [keyword_pattern(keywords)] if keywords else []
+    parts += [f"(?:{rule['pattern']})" for rule in rules if rule['regex']]
+    return re.compile('|'.join(parts), re.IGNORECASE)
+
+class FeedRules:
+    """A feed's rules compiled into one matcher per effect.
+
+    All include rules are one regex, all exclude rules another, and the
+    route rules one per target channel, so checking a post costs a scan of
+    its text per effect and route channel rather than one per rule.
+
+    Routes are not one alternation with a group per channel: Python's re
+    still tries every alternative at each position, and has to scan the
+    whole text for all of them, while each channel's search stops at its
+    first match. With a few dozen route channels bench_rules found the
+    single scan no faster, and it misses routes that match where an
+    earlier one does unless each of them is searched for again.
+    """
+
+    def __init__(self, rules):
+        by_action = {action: [rule for rule in rules if rule['action'] == action] for action in RULE_ACTIONS}
+        self.include = combined_pattern(by_action['include']) if by_action['include'] else None
+        self.exclude = combined_pattern(by_action['exclude']) if by_action['exclude'] else None
+        routes = {}
+        for rule in by_action['route']:
+            routes.setdefault(rule['channel_name'], []).append(rule)
+        self.routes = [(channel_name, combined_pattern(channel_rules))
+                       for channel_name, channel_rules in routes.items()]
+
+    def __bool__(self):
+        return bool(self.include or self.exclude or self.routes)
+
+    def match(self, text):
+        """None if the post is filtered out, else the channel names it is routed to"""
+        if self.exclude is not None and self.exclude.search(text):
+            return None
+        if self.include is not None and not self.include.search(text):
+            return None
+        return tuple(channel_name for channel_name, pattern in self.routes if pattern.search(text))
+
+class RuleCache:
+    """Compiled rules per feed, recompiled when the feed's rules_version changes.
+
+    Editing a feed's rules bumps its rules_version (stored with the feed),
+    so every process picks the change up on its next poll of the feed.
+    """
+
+    def __init__(self):
+        self.rules = {}  # feed_id -> (rules_version, FeedRules)
+
+    def refresh(self, db, versions):
+        """Load and compile the rules of feeds ({feed_id: rules_version}) whose cached copy is stale"""
+        stale = [
+            feed_id for feed_id, version in versions.items()
+            if version and self.rules.get(feed_id, (None,))[0] != version
+        ]
+        if not stale:
+            return
+        loaded = db.get_rules(stale)
+        for feed_id in stale:
+            self.rules[feed_id] = (versions[feed_id], FeedRules(loaded.get(feed_id, [])))
+
+    def get(self, feed_id):
+        """A feed's compiled rules, or None if it has none"""
+        cached = self.rules.get(feed_id)
+        return cached[1] if cached and cached[1] else None
+
+    def discard(self, feed_id):
+        self.rules.pop(feed_id, None)
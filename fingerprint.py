@@ -0,0 +1,127 @@
+import hashlib
+import re
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', 'ref', 'ref_src',
+    'cmpid', 'ncid', 'soc_src', 'soc_trk', '_ga', 'amp'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_', 'hsa_', '_hs')
+
+# Host prefixes that serve the same article as the bare host
+HOST_PREFIXES = ('www.', 'm.', 'amp.')
+
+WORD = re.compile(r'\w+')
+
+# Text syndication adds around a story: footers, "read more" links, ellipses,
+# wire datelines ("LONDON (Reuters) - ") and source suffixes on titles
+BOILERPLATE = [
+    re.compile(r'the post .{0,300}? appeared first on .{0,200}$', re.IGNORECASE),
+    re.compile(r'\b(read more|continue reading|comments)\W*$', re.IGNORECASE),
+    re.compile(r'\[(\.\.\.|…)\]\s*$'),
+    re.compile(r'^[A-Z][A-Z ,.]*\([^)]{1,30}\)\s*[-–—]\s*')
+]
+TITLE_SOURCE = re.compile(r'\s[-–—|]\s[^-–—|]{1,40}$')
+
+SIMHASH_BITS = 64
+SIMHASH_MASK = (1 << SIMHASH_BITS) - 1
+
+# Fingerprints at most MAX_DISTANCE bits apart are near-duplicates; split
+# into MAX_DISTANCE + 1 bands, two such fingerprints share at least one band
+MAX_DISTANCE = 3
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = SIMHASH_BITS // BANDS
+
+# Texts shorter than this many words (e.g. a bare "Weekly update" title)
+# are too generic to fingerprint; only their links are compared
+MIN_WORDS = 8
+
+def canonical_link(entry):
+    """The entry's canonical article URL: FeedBurner's original link, a rel="canonical" link, or its link"""
+    if entry.get('feedburner_origlink'):
+        return entry['feedburner_origlink']
+    for link in entry.get('links', ()):
+        if link.get('rel') == 'canonical' and link.get('href'):
+            return link['href']
+    return entry.get('link', '')
+
+def normalize_link(url):
+    """Reduce an article URL to the form syndicated copies share.
+
+    Scheme, fragment, www./m./amp. host prefixes, AMP path suffixes,
+    trailing slashes and tracking parameters are dropped, the host is
+    lowercased and the remaining query parameters are sorted.
+    """
+    url = (url or '').strip()
+    if not url:
+        return ''
+    parts = urlsplit(url if '//' in url else '//' + url)
+
+    host = (parts.hostname or '').lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path
+    for suffix in ('/amp', '/amp/', '.amp'):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+            break
+    path = path.rstrip('/')
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return host + path + ('?' + urlencode(query) if query else '')
+
+def link_hash(url):
+    """16-byte digest of a normalized article URL"""
+    return hashlib.md5(normalize_link(url).encode()).digest()
+
+def simhash(text):
+    """64-bit SimHash of a text's words and word pairs (None when it has fewer than MIN_WORDS words)"""
+    words = WORD.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big'), '064b')
+        for feature in features
+    ]
+    # Each bit is set when most features set it
+    half = len(bits) / 2
+    return int(''.join('1' if column.count('1') > half else '0' for column in zip(*bits)), 2)
+
+def bands(value):
+    """The BANDS slices of a SimHash used as lookup keys"""
+    band_mask = (1 << BAND_BITS) - 1
+    return [(value >> (band * BAND_BITS)) & band_mask for band in range(BANDS)]
+
+def distance(a, b):
+    """Number of differing bits between two SimHashes"""
+    return bin((a ^ b) & SIMHASH_MASK).count('1')
+
+def to_signed(value):
+    """Store a 64-bit SimHash in SQLite's signed INTEGER"""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+def content_text(title, summary):
+    """Title and summary without the boilerplate syndication adds"""
+    title = TITLE_SOURCE.sub('', (title or '').strip())
+    summary = (summary or '').strip()
+    for pattern in BOILERPLATE:
+        summary = pattern.sub('', summary)
+    return f"{title} {summary}"
+
+def fingerprint(link, title, summary):
+    """{'link_hash', 'simhash'} of a post from its canonical link and cleaned title and summary"""
+    return {
+        'link_hash': link_hash(link) if link else None,
+        'simhash': simhash(content_text(title, summary))
+    }
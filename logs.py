@@ -0,0 +1,35 @@
+import json
+import logging
+from config import LOG_LEVEL, LOG_FORMAT
+
+# Attributes every LogRecord has; anything else came from extra={...}
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the fields passed with extra="""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update({
+            key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES
+        })
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send all logging (the bot's and discord.py's) to stderr as text or JSON lines"""
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s'))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
@@ -1,25 +1,99 @@
-import threading
-import time
-from bot import DiscordBot
-from config import DISCORD_TOKEN
-
-def run_bot():
-    """Run Discord bot in separate thread"""
-    bot = DiscordBot(DISCORD_TOKEN)
+"""Service entry point: the feed poller, delivery queue and control API on one asyncio runtime.
+
+Usage:
+    python main.py [--workers 4] [--dashboard]
+
+With --workers N, N processes split the Discord shards between them and
+lease equal shares of the feed partitions. The first worker serves the
+control endpoint. SIGINT/SIGTERM shut every worker down gracefully.
+--dashboard also starts the Streamlit app as a child process.
+"""
+import argparse
+import logging
+import multiprocessing
+import signal
+import subprocess
+import sys
+from logs import setup_logging
+from config import DISCORD_TOKEN, WORKERS, SHARD_COUNT, SHARD_IDS, SHUTDOWN_TIMEOUT
+
+log = logging.getLogger(__name__)
+
+def worker_shards(index, workers, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS):
+    """(shard_count, shard_ids) for one of workers processes"""
+    if workers == 1:
+        return shard_count, shard_ids
+    shard_ids = shard_ids or list(range(shard_count or workers))
+    return shard_count or workers, shard_ids[index::workers]
+
+def run_worker(index=0, workers=1):
+    """Run one bot process until it is signalled to stop"""
+    # Imported here: the supervisor process never needs discord.py
+    from bot import DiscordBot
+    setup_logging()
+    shard_count, shard_ids = worker_shards(index, workers)
+    bot = DiscordBot(DISCORD_TOKEN, shard_count=shard_count, shard_ids=shard_ids, control=index == 0)
+    if workers > 1:
+        log.info("🚀 Worker %d/%d starting (shards %s)", index + 1, workers, shard_ids)
     bot.run()
 
-if __name__ == "__main__":
-    # Start Discord bot in a separate thread
-    bot_thread = threading.Thread(target=run_bot, daemon=True)
-    bot_thread.start()
-    
-    print("🤖 Discord bot started in background")
-    print("🌐 Starting Streamlit app...")
-    print("💡 Run: streamlit run app.py")
-    
-    # Keep main thread alive
+def start_dashboard():
+    """Start the Streamlit app in its own process (streamlit is never imported here)"""
+    log.info("🌐 Starting Streamlit app...")
+    return subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', 'app.py', '--server.headless', 'true'])
+
+def supervise(workers):
+    """Run worker processes until they exit, forwarding SIGTERM to them"""
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=run_worker, args=(index, workers), name=f"worker-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    # Ctrl+C reaches the workers through the process group; SIGTERM is forwarded
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            # Its feed partitions are picked up by the others once its lease expires
+            log.warning("⚠️ %s exited with code %s", process.name, process.exitcode)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the RSS Discord bot")
+    parser.add_argument('--workers', type=int, default=WORKERS, help='bot processes splitting the feeds')
+    parser.add_argument('--dashboard', action='store_true', help='also start the Streamlit app')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    workers = max(1, args.workers)
+    # Every worker needs at least one shard of its own
+    shards = len(SHARD_IDS) if SHARD_IDS else SHARD_COUNT
+    if shards and workers > shards:
+        log.warning("⚠️ Only %d shards for %d workers; running %d workers", shards, workers, shards)
+        workers = shards
+
+    dashboard = start_dashboard() if args.dashboard else None
     try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n👋 Shutting down...")
\ No newline at end of file
+        if workers == 1:
+            run_worker()
+        else:
+            supervise(workers)
+    finally:
+        if dashboard is not None:
+            dashboard.terminate()
+            try:
+                dashboard.wait(SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                dashboard.kill()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from config import METRICS_ENABLED, METRICS_FEED_LABELS
+
+# Latency buckets in seconds (Prometheus defaults plus room for slow feeds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def feed_label(feed_id):
+    """Label value for per-feed metrics (one shared series when METRICS_FEED_LABELS is off)"""
+    return str(feed_id) if METRICS_FEED_LABELS else 'all'
+
+class Registry:
+    """Metrics exposed on /metrics in the Prometheus text format.
+
+    When disabled, updates return immediately and nothing is recorded.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return ''.join(metric.render() for metric in self.metrics)
+
+REGISTRY = Registry()
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.registry = registry
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in self._items():
+            lines += self._samples(key, value)
+        return '\n'.join(lines) + '\n'
+
+    def _samples(self, key, value):
+        return [f'{self.name}{format_labels(self.label_names, key)} {format_value(value)}']
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = None
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Read the (unlabelled) value from function() at scrape time"""
+        self.function = function
+
+    def _items(self):
+        if self.function is not None:
+            return [((), self.function())]
+        return super()._items()
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Time a block (with ...) or every call of a function (as a decorator)"""
+        return Timer(self, labels)
+
+    def _samples(self, key, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            labels = format_labels(self.label_names, key, [('le', format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.label_names, key)
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self.histogram.observe(self.elapsed, **self.labels)
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Timer(self.histogram, self.labels):
+                return function(*args, **kwargs)
+        return wrapper
+
+# Polling pipeline
+FETCH_SECONDS = Histogram('rss_fetch_seconds', 'Feed download time', ['feed'])
+PARSE_SECONDS = Histogram('rss_parse_seconds', 'Feed parse time (including the wait for a parse worker)', ['feed'])
+DEDUP_SECONDS = Histogram('rss_dedup_seconds', 'Seen-post lookup and insert time', ['feed'])
+HTTP_RESPONSES = Counter('rss_http_responses_total', 'Feed responses by HTTP status', ['status'])
+CYCLE_SECONDS = Histogram('rss_cycle_seconds', 'Duration of a polling cycle with due feeds')
+FEEDS_DUE = Gauge('rss_feeds_due', 'Feeds due in the last polling cycle')
+CIRCUITS_OPEN = Gauge('rss_circuits_open', 'Feeds of this process whose circuit is open')
+
+# Delivery lag buckets in seconds, from seconds to a day
+LAG_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 3 * 3600, 12 * 3600, 86400)
+
+# Discord delivery
+DELIVERY_LAG_SECONDS = Histogram('rss_delivery_lag_seconds', 'Time from a post being published to it being posted',
+                                 ['feed'], buckets=LAG_BUCKETS)
+SEND_SECONDS = Histogram('rss_discord_send_seconds', 'Discord message send time')
+DELIVERY_BACKLOG = Gauge('rss_delivery_backlog', 'Posts queued for delivery')
+DISCORD_RATE_LIMITED = Counter('rss_discord_rate_limited_total', 'Discord 429 responses')
+POSTS_DELIVERED = Counter('rss_posts_delivered_total', 'Posts sent to Discord')
+POSTS_DROPPED = Counter('rss_posts_dropped_total', 'Posts that could not be delivered')
+POSTS_DUPLICATE = Counter('rss_posts_duplicate_total', 'New posts not sent because a server already got the story')
+
+# SQLite
+DB_QUERY_SECONDS = Histogram('rss_db_query_seconds', 'Database method time', ['query'])
+DB_CONNECT_SECONDS = Histogram('rss_db_connect_seconds', 'Time to open and configure a connection')
+DB_CONNECTIONS = Gauge('rss_db_connections', 'Open SQLite connections')
@@ -0,0 +1,34 @@
+import os
+import socket
+import uuid
+from config import FEED_PARTITIONS, PARTITION_LEASE_SECONDS
+
+class PartitionLease:
+    """The share of feed partitions this bot process owns.
+
+    Feeds are split into partitions by feed id; each running process leases
+    an equal share from the database and renews it periodically. A process
+    that stops renewing loses its partitions once the lease expires, and the
+    others pick them up.
+    """
+
+    def __init__(self, db, count=FEED_PARTITIONS, lease_seconds=PARTITION_LEASE_SECONDS, owner=None):
+        self.db = db
+        self.count = count
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.owned = set()
+
+    def owns(self, feed_id):
+        return feed_id % self.count in self.owned
+
+    def renew(self, now=None):
+        """Renew and rebalance the lease; returns (gained, lost) partitions"""
+        owned = self.db.lease_partitions(self.owner, self.count, self.lease_seconds, now)
+        gained, lost = owned - self.owned, self.owned - owned
+        self.owned = owned
+        return gained, lost
+
+    def release(self):
+        self.db.release_partitions(self.owner)
+        self.owned = set()
@@ -0,0 +1,62 @@
+import cProfile
+import io
+import pstats
+import time
+
+class Profiler:
+    """Profiler that can be switched on and off while the bot runs.
+
+    Profiles the thread that starts it (the bot's event loop when started
+    from the control endpoint). 'cprofile' uses the standard library;
+    'pyinstrument' is a low-overhead sampling profiler and needs
+    ``pip install pyinstrument``.
+    """
+
+    MODES = ('cprofile', 'pyinstrument')
+
+    def __init__(self):
+        self.mode = None
+        self.started = None
+        self._profiler = None
+
+    @property
+    def running(self):
+        return self._profiler is not None
+
+    def start(self, mode='cprofile', interval=0.001):
+        if self.running:
+            raise RuntimeError(f"{self.mode} profiler already running")
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as SamplingProfiler
+            except ImportError:
+                raise RuntimeError("pyinstrument is not installed")
+            profiler = SamplingProfiler(interval=interval, async_mode='enabled')
+            profiler.start()
+        else:
+            raise ValueError(f"Unknown profiler mode: {mode} (expected one of {', '.join(self.MODES)})")
+
+        self._profiler = profiler
+        self.mode = mode
+        self.started = time.monotonic()
+
+    def stop(self, limit=40):
+        """Stop profiling and return a text report"""
+        if not self.running:
+            raise RuntimeError("Profiler is not running")
+        profiler, mode = self._profiler, self.mode
+        elapsed = time.monotonic() - self.started
+        self._profiler = self.mode = self.started = None
+
+        if mode == 'cprofile':
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+            report = output.getvalue()
+        else:
+            profiler.stop()
+            report = profiler.output_text()
+        return f"{mode} profile of {elapsed:.1f}s\n{report}"
@@ -1,123 +1,361 @@
-import feedparser
-import hashlib
-from datetime import datetime
-from database import Database
-import re
+import logging
+from feed_fetcher import FeedFetcher, fetch_feed
+from feed_parser import Post, generate_post_id, extract_post, clean_html
+from seen_cache import SeenPostCache
+from filters import RuleCache
+from fingerprint import fingerprint, canonical_link
+from scheduler import poll_interval_hint, retry_after_hint, circuit_open
+from metrics import FETCH_SECONDS, PARSE_SECONDS, DEDUP_SECONDS, HTTP_RESPONSES, POSTS_DUPLICATE, feed_label
+from config import (
+    STREAM_PARSING, STREAM_SEEN_RUN, STREAM_ORDERED_POLLS, STREAM_VERIFY_EVERY, CIRCUIT_FAILURES,
+    CIRCUIT_PROBE_TIMEOUT, CONTENT_DEDUP, HISTORY_ENABLED, BACKLOG_MAX_POSTS
+)
+
+log = logging.getLogger(__name__)
+
+def newest_entries(entries, post_ids, count):
+    """The count newest of post_ids (by date if all are dated, else the first in the feed), in feed order"""
+    dates = {
+        post_id: entries[post_id].get('published_parsed') or entries[post_id].get('updated_parsed')
+        for post_id in post_ids
+    }
+    if all(dates.values()):
+        keep = set(sorted(post_ids, key=lambda post_id: tuple(dates[post_id]), reverse=True)[:count])
+        return [post_id for post_id in post_ids if post_id in keep]
+    return post_ids[:count]
 
 class RSSMonitor:
-    def __init__(self, db):
+    def __init__(self, db, fetcher=None, seen_cache=None, stream=STREAM_PARSING,
+                 circuit_failures=CIRCUIT_FAILURES, probe_timeout=CIRCUIT_PROBE_TIMEOUT,
+                 content_dedup=CONTENT_DEDUP, history=HISTORY_ENABLED, backlog_max_posts=BACKLOG_MAX_POSTS):
         self.db = db
+        self.content_dedup = content_dedup
+        self.history = history
+        self.backlog_max_posts = backlog_max_posts
+        self.fetcher = fetcher or FeedFetcher()
+        self.seen_cache = seen_cache or SeenPostCache()
+        self.rules = RuleCache()
+        self.stream = stream
+        self.circuit_failures = circuit_failures
+        self.probe_timeout = probe_timeout
+        self.last_cycle_stats = {}
+        self.last_outcomes = {}
     
     def check_feed(self, feed_url, feed_id):
         """Check RSS feed for new posts"""
         new_posts = []
         
-        try:
-            # Parse RSS feed
-            feed = feedparser. parse(feed_url)
+        # Fetch with the same deadlines as the bot's polls
+        result = fetch_feed(feed_url, cache=None)
+        error = result['error'] or self.feed_error(result['feed'])
+        if not error:
+            try:
+                new_posts = self.process_entries(result['feed'], feed_url, feed_id)
+                self.rules.refresh(self.db, {feed_id: self.db.get_rules_version(feed_id)})
+                new_posts = self.apply_rules(feed_id, new_posts)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+        
+        if error:
+            log.error("❌ Error checking feed %s: %s", feed_url, error, extra={'feed_id': feed_id})
+        self.db.record_feed_health([(feed_id, error, result['fetch_seconds'])])
+        return new_posts
+    
+    async def check_feeds(self, feeds, on_posts=None):
+        """Check many feeds concurrently; returns {feed_id: new_posts}
+
+        on_posts(feed, posts) is called with each feed's new posts as soon as
+        that feed is processed, without waiting for the slower feeds.
+        """
+        stop_checks = {
+            feed['id']: self.stream_stop_check(feed['id'])
+            for feed in feeds if self.use_stream(feed)
+        }
+        # Feeds with an open circuit get a short deadline: a probe, not another full timeout
+        timeouts = {
+            feed['id']: self.probe_timeout
+            for feed in feeds if self.is_open(feed)
+        }
+        self.rules.refresh(self.db, {feed['id']: feed.get('rules_version') for feed in feeds})
+        
+        stats = {
+            'feeds': len(feeds),
+            'not_modified': 0,
+            'parses_avoided': 0,
+            'bytes_downloaded': 0,
+            'bytes_saved': 0,
+            'streamed': 0
+        }
+        
+        new_posts = {feed['id']: [] for feed in feeds}
+        outcomes = {}
+        
+        # Each feed is processed as soon as its own fetch is done
+        def on_result(feed, result):
+            outcome = outcomes[feed['id']] = {
+                'ok': False,
+                'error': None,
+                'fetch_seconds': result['fetch_seconds'],
+                'new_posts': 0,
+                'min_interval': None,
+                'retry_after': retry_after_hint(result['headers'])
+            }
+            self.observe(feed['id'], result)
             
-            # Check if feed is valid
-            if feed.bozo and not feed.entries:
-                print(f"⚠️ Invalid or empty feed: {feed_url}")
-                return new_posts
+            # A truncated or non-feed body counts as a failure too
+            outcome['error'] = result['error']
+            if not outcome['error'] and not result['not_modified']:
+                outcome['error'] = self.feed_error(result['feed'])
+            if outcome['error']:
+                log.error("❌ Error checking feed %s: %s", feed['url'], outcome['error'],
+                          extra={'feed_id': feed['id'], 'status': result['status']})
+                return
             
-            # Process each entry
-            for entry in feed.entries:
-                # Generate unique ID for post
-                post_id = self. generate_post_id(entry)
-                
-                # Check if post already exists
-                if not self.db.post_exists(feed_id, post_id):
-                    # Extract post data
-                    post_data = self.extract_post_data(entry)
-                    post_data['post_id'] = post_id
-                    
-                    # Add to database
-                    self.db.add_post(feed_id, post_id)
-                    
-                    # Add to new posts list
-                    new_posts.append(post_data)
+            if result['body'] is not None:
+                stats['bytes_downloaded'] += len(result['body'])
             
-            return new_posts
+            # 304 or identical body: skip parsing and dedup entirely
+            if result['not_modified']:
+                stats['parses_avoided'] += 1
+                if result['status'] == 304:
+                    stats['not_modified'] += 1
+                    stats['bytes_saved'] += feed.get('content_length') or 0
+                else:
+                    # Same body under new validators: keep them so the next poll can get a 304
+                    etag, last_modified = result['headers'].get('etag'), result['headers'].get('last-modified')
+                    if (etag, last_modified) != (feed.get('etag'), feed.get('last_modified')):
+                        self.db.update_http_validators(feed['id'], etag, last_modified)
+                outcome['ok'] = True
+                outcome['min_interval'] = poll_interval_hint(result['headers'])
+                return
             
+            try:
+                new_posts[feed['id']] = self.process_entries(
+                    result['feed'], feed['url'], feed['id'], first_sync=not feed.get('posts_count')
+                )
+                # A download stopped early says nothing about the full document
+                truncated = result.get('truncated')
+                if truncated:
+                    stats['streamed'] += 1
+                self.db.update_feed_validators(
+                    feed['id'],
+                    result['headers'].get('etag'),
+                    result['headers'].get('last-modified'),
+                    None if truncated else result['content_hash'],
+                    feed.get('content_length') if truncated else len(result['body']),
+                    None if truncated else len(result['feed']['entries']),
+                    self.next_ordered_polls(feed, result['feed'], new_posts[feed['id']])
+                )
+                outcome['ok'] = True
+                outcome['new_posts'] = len(new_posts[feed['id']])
+                outcome['min_interval'] = poll_interval_hint(result['headers'], result['feed'])
+                new_posts[feed['id']] = self.apply_rules(feed['id'], new_posts[feed['id']])
+            except Exception as e:
+                outcome['error'] = str(e) or e.__class__.__name__
+                log.error("❌ Error checking feed %s: %s", feed['url'], e, extra={'feed_id': feed['id']})
+            if on_posts is not None and new_posts[feed['id']]:
+                on_posts(feed, new_posts[feed['id']])
+        
+        await self.fetcher.fetch_all(feeds, stop_checks, check_stream=self.stream,
+                                     timeouts=timeouts, on_result=on_result)
+        
+        self.record_health(feeds, outcomes)
+        self.last_outcomes = outcomes
+        self.last_cycle_stats = stats
+        return new_posts
+    
+    def is_open(self, feed, failures=None):
+        """Whether the feed's circuit is open (given failures, or its stored count)"""
+        if failures is None:
+            failures = feed.get('consecutive_failures') or 0
+        return circuit_open(failures, self.circuit_failures)
+    
+    def feed_error(self, feed):
+        """Why a fetched body is not a usable feed (e.g. a truncated or HTML response), if it is not"""
+        if feed is None or (feed['bozo'] and not feed['entries']):
+            return 'Invalid or empty feed'
+        return None
+    
+    def record_health(self, feeds, outcomes):
+        """Persist this cycle's outcomes and log circuits that opened or closed"""
+        for feed in feeds:
+            outcome = outcomes[feed['id']]
+            failures = feed.get('consecutive_failures') or 0
+            if outcome['error'] and self.is_open(feed, failures + 1) and not self.is_open(feed):
+                log.warning("🔌 Circuit opened for %s after %d failures, probing it from now on",
+                            feed['url'], failures + 1, extra={'feed_id': feed['id']})
+            elif not outcome['error'] and self.is_open(feed):
+                log.info("✅ Feed %s recovered after %d failures", feed['url'], failures,
+                         extra={'feed_id': feed['id']})
+        
+        self.db.record_feed_health([
+            (feed['id'], outcomes[feed['id']]['error'], outcomes[feed['id']]['fetch_seconds'])
+            for feed in feeds
+        ])
+    
+    def record_history(self, new_posts):
+        """Add a cycle's delivered posts ({feed_id: posts}) to the search history in one batch
+        
+        Only posts queued for delivery are kept: their embeds have already
+        extracted every field the history stores, so posts dropped as
+        duplicates are never cleaned just to be indexed.
+        """
+        if not self.history:
+            return
+        try:
+            self.db.add_history([
+                (feed_id, post) for feed_id, posts in new_posts.items() for post in posts if post.embed is not None
+            ])
         except Exception as e:
-            print(f"❌ Error checking feed {feed_url}: {str(e)}")
+            # Search is a convenience; delivery goes ahead without it
+            log.error("❌ Error adding posts to the search history: %s", e)
+    
+    def observe(self, feed_id, result):
+        """Record a fetch result's status and timings"""
+        HTTP_RESPONSES.inc(status=result['status'] or 'error')
+        label = feed_label(feed_id)
+        if result.get('fetch_seconds') is not None:
+            FETCH_SECONDS.observe(result['fetch_seconds'], feed=label)
+        if result.get('parse_seconds'):
+            PARSE_SECONDS.observe(result['parse_seconds'], feed=label)
+    
+    def use_stream(self, feed):
+        """Stream a feed once it has been newest-first for a while, re-checking it in full now and then"""
+        ordered_polls = feed.get('ordered_polls') or 0
+        return (self.stream and ordered_polls >= STREAM_ORDERED_POLLS
+                and ordered_polls % STREAM_VERIFY_EVERY != 0)
+    
+    def next_ordered_polls(self, feed, parsed, new_posts):
+        """Count consecutive polls where the feed was newest-first with new posts on top"""
+        if not self.stream:
+            return None
+        post_ids = list(dict.fromkeys(record['post_id'] for record in parsed['entries']))
+        new_ids = {post['post_id'] for post in new_posts}
+        if parsed.get('ordered') and set(post_ids[:len(new_ids)]) == new_ids:
+            return (feed.get('ordered_polls') or 0) + 1
+        return 0
+    
+    def stream_stop_check(self, feed_id):
+        """Callback for fetch_stream: stop after STREAM_SEEN_RUN seen entries in a row"""
+        run = 0
+        
+        def should_stop(records):
+            nonlocal run
+            with DEDUP_SECONDS.time(feed=feed_label(feed_id)):
+                seen = self.get_seen_post_ids(feed_id, [record['post_id'] for record in records])
+            for record in records:
+                run = run + 1 if record['post_id'] in seen else 0
+                if run >= STREAM_SEEN_RUN:
+                    return True
+            return False
+        
+        return should_stop
+    
+    def get_seen_post_ids(self, feed_id, post_ids):
+        """Return the subset of post_ids already seen, consulting the seen-post cache first"""
+        split = self.seen_cache.split(feed_id, post_ids, self.db)
+        if split is None:
+            return self.db.get_seen_post_ids(feed_id, post_ids)
+        
+        seen, unseen, maybe_seen = split
+        return set(seen) | self.db.get_seen_post_ids(feed_id, maybe_seen)
+    
+    def process_entries(self, feed, feed_url, feed_id, first_sync=False):
+        """Record unseen entries of a compact parsed feed and return them as posts
+        
+        On a feed's first sync only its newest backlog_max_posts entries
+        become posts; the rest are marked seen without being extracted.
+        """
+        new_posts = []
+        
+        # Check if feed is valid
+        if feed['bozo'] and not feed['entries']:
+            log.warning("⚠️ Invalid or empty feed: %s", feed_url, extra={'feed_id': feed_id})
             return new_posts
+        
+        # Post IDs were generated by the parser
+        entries = {}
+        for record in feed['entries']:
+            entries.setdefault(record['post_id'], record['entry'])
+        
+        # Mark unseen posts in one batch; only those need cleaning and extracting
+        with DEDUP_SECONDS.time(feed=feed_label(feed_id)):
+            new_ids = self.record_new_posts(feed_id, list(entries))
+        if first_sync and self.backlog_max_posts and len(new_ids) > self.backlog_max_posts:
+            log.info("⏭️ First sync of %s: posting the newest %d of %d entries", feed_url,
+                     self.backlog_max_posts, len(new_ids), extra={'feed_id': feed_id})
+            new_ids = newest_entries(entries, new_ids, self.backlog_max_posts)
+        
+        # Fields are extracted when something reads them
+        for post_id in new_ids:
+            post = Post(post_id, entries[post_id])
+            if self.content_dedup:
+                post.fingerprint = fingerprint(canonical_link(post.entry), post.title, post.summary)
+            new_posts.append(post)
+        
+        return new_posts
     
-    def generate_post_id(self, entry):
-        """Generate unique ID for post"""
-        # Try to use GUID or ID from feed
-        if hasattr(entry, 'id'):
-            return hashlib.md5(entry.id.encode()).hexdigest()
+    def apply_rules(self, feed_id, posts):
+        """The posts the feed's include/exclude rules keep, with their route channels set"""
+        rules = self.rules.get(feed_id)
+        if rules is None or not posts:
+            return posts
+        kept = []
+        for post in posts:
+            # One pass over title and summary per rule effect
+            routes = rules.match(f"{post.title}\n{post.summary or ''}")
+            if routes is not None:
+                post.routes = routes
+                kept.append(post)
+        if len(kept) < len(posts):
+            log.info("🔎 Rules of feed %s filtered out %d of %d new posts", feed_id, len(posts) - len(kept),
+                     len(posts), extra={'feed_id': feed_id})
+        return kept
+    
+    def drop_duplicates(self, guild_id, feed_id, posts):
+        """The posts whose story the guild has not received from any feed within the dedup window"""
+        if not self.content_dedup or not posts:
+            return posts
+        claimed = self.db.claim_fingerprints(guild_id, feed_id, [post['fingerprint'] for post in posts])
+        kept = [post for post, new in zip(posts, claimed) if new]
+        if len(kept) < len(posts):
+            POSTS_DUPLICATE.inc(len(posts) - len(kept))
+            log.info("🔁 Skipped %d duplicate posts of feed %s for guild %s", len(posts) - len(kept),
+                     feed_id, guild_id, extra={'feed_id': feed_id, 'guild_id': guild_id})
+        return kept
+    
+    def record_new_posts(self, feed_id, post_ids):
+        """Store unseen post IDs, consulting the seen-post cache before SQLite"""
+        split = self.seen_cache.split(feed_id, post_ids, self.db)
+        if split is None:
+            return self.db.record_new_posts(feed_id, post_ids)
         
-        # Fallback to link
-        if hasattr(entry, 'link'):
-            return hashlib.md5(entry.link.encode()). hexdigest()
+        seen, unseen, maybe_seen = split
+        if not unseen and not maybe_seen:
+            return []
         
-        # Fallback to title + published date
-        unique_string = entry.get('title', '') + str(entry.get('published', ''))
-        return hashlib.md5(unique_string.encode()). hexdigest()
+        seen = set(seen)
+        candidates = [post_id for post_id in post_ids if post_id not in seen]
+        new_ids = self.db.record_new_posts(feed_id, candidates, skip_lookup=unseen)
+        
+        # Everything checked is now in the posts table, new or not
+        self.seen_cache.record(feed_id, candidates)
+        self.seen_cache.stats['false_positives'] += len(set(new_ids).intersection(maybe_seen))
+        return new_ids
+    
+    def warm_seen_cache(self, keep=None):
+        """Load seen post IDs for all feeds (or those keep(feed_id) accepts) into the cache"""
+        self.seen_cache.warm(self.db, keep)
+        return self.seen_cache.stats
+    
+    def generate_post_id(self, entry):
+        """Generate unique ID for post"""
+        return generate_post_id(entry)
     
     def extract_post_data(self, entry):
         """Extract relevant data from RSS entry"""
-        post_data = {
-            'title': self.clean_html(entry.get('title', 'No Title')),
-            'link': entry.get('link', ''),
-            'author': None,
-            'summary': None,
-            'published_date': None,
-            'image': None
-        }
-        
-        # Extract author
-        if hasattr(entry, 'author'):
-            post_data['author'] = entry.author
-        elif hasattr(entry, 'author_detail') and entry.author_detail. get('name'):
-            post_data['author'] = entry.author_detail['name']
-        elif hasattr(entry, 'authors') and entry.authors:
-            post_data['author'] = entry.authors[0]. get('name', '')
-        
-        # Extract summary/description
-        if hasattr(entry, 'summary'):
-            post_data['summary'] = self.clean_html(entry.summary)
-        elif hasattr(entry, 'description'):
-            post_data['summary'] = self.clean_html(entry.description)
-        
-        # Extract published date
-        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-            try:
-                post_data['published_date'] = datetime(*entry.published_parsed[:6])
-            except:
-                pass
-        elif hasattr(entry, 'updated_parsed') and entry.updated_parsed:
-            try:
-                post_data['published_date'] = datetime(*entry.updated_parsed[:6])
-            except:
-                pass
-        
-        # Extract image
-        if hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
-            post_data['image'] = entry.media_thumbnail[0].get('url')
-        elif hasattr(entry, 'media_content') and entry.media_content:
-            post_data['image'] = entry. media_content[0].get('url')
-        elif hasattr(entry, 'links'):
-            for link in entry.links:
-                if link.get('type', '').startswith('image/'):
-                    post_data['image'] = link.get('href')
-                    break
-        
-        return post_data
+        return extract_post(entry)
     
     def clean_html(self, text):
         """Remove HTML tags from text"""
-        if not text:
-            return ''
-        
-        # Remove HTML tags
-        clean = re.compile('<.*?>')
-        text = re.sub(clean, '', text)
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        return text
\ No newline at end of file
+        return clean_html(text)
@@ -0,0 +1,236 @@
+import heapq
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from config import (
+    RSS_CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL, MAX_BACKOFF_INTERVAL,
+    CIRCUIT_FAILURES, CIRCUIT_PROBE_INTERVAL, POLLS_PER_POST, FRESHNESS_INTERVAL
+)
+
+# Seconds per sy:updatePeriod value
+SY_UPDATE_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 604800,
+    'monthly': 2592000,
+    'yearly': 31536000
+}
+
+# Weight of the newest post-rate sample in the moving average
+RATE_SMOOTHING = 0.3
+
+# Random spread applied to every interval (fraction of the interval)
+JITTER = 0.1
+
+class FeedScheduler:
+    """Priority queue of feeds ordered by their next due time.
+
+    Each feed's interval follows its observed post rate (polls_per_post polls
+    per expected post, so a post waits a fraction of the gap between posts),
+    but the rate alone never stretches it past freshness_interval. It never
+    polls faster than the feed's own hints allow
+    (<ttl>, sy:updatePeriod, Cache-Control, Retry-After) and backs off
+    exponentially while it is failing. After circuit_failures failures in a
+    row the feed's circuit opens: it is only probed every probe_interval
+    until a poll succeeds. Intervals are jittered so feeds spread out
+    instead of firing in bursts.
+    """
+
+    def __init__(self, base_interval=RSS_CHECK_INTERVAL * 60, min_interval=MIN_CHECK_INTERVAL * 60,
+                 max_interval=MAX_CHECK_INTERVAL * 60, max_backoff=MAX_BACKOFF_INTERVAL * 60,
+                 circuit_failures=CIRCUIT_FAILURES, probe_interval=CIRCUIT_PROBE_INTERVAL * 60,
+                 polls_per_post=POLLS_PER_POST, freshness_interval=FRESHNESS_INTERVAL * 60,
+                 clock=time.time, seed=None):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.polls_per_post = max(polls_per_post, 1)
+        self.freshness_interval = min(max(freshness_interval, self.min_interval), self.max_interval)
+        self.max_backoff = max_backoff
+        self.circuit_failures = circuit_failures
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.heap = []
+        self.feeds = {}
+
+    def __len__(self):
+        return len(self.feeds)
+
+    def __contains__(self, feed_id):
+        return feed_id in self.feeds
+
+    def add(self, feed_id, now=None, delay=None, failures=0):
+        """Start scheduling a feed; by default its first poll lands at a random point of one interval.
+
+        failures carries over a feed's stored consecutive failures, so a
+        feed whose circuit was open stays on the probe schedule.
+        """
+        if feed_id in self.feeds:
+            return
+        now = self.clock() if now is None else now
+        self.feeds[feed_id] = {
+            'interval': self.base_interval,
+            'rate': 1 / self.base_interval,
+            'min_interval': 0,
+            'failures': failures,
+            'last_check': None,
+            'due': None
+        }
+        if delay is None:
+            spread = self.probe_interval if self.is_open(feed_id) else self.base_interval
+            delay = self.random.uniform(0, spread)
+        self._push(feed_id, now + delay)
+
+    def remove(self, feed_id):
+        """Stop scheduling a feed (its heap entry is skipped lazily)"""
+        self.feeds.pop(feed_id, None)
+
+    def sync(self, feed_ids, now=None, failures=None):
+        """Add new feeds and drop removed ones; failures maps feed IDs to stored failure counts"""
+        feed_ids = set(feed_ids)
+        failures = failures or {}
+        for feed_id in list(self.feeds):
+            if feed_id not in feed_ids:
+                self.remove(feed_id)
+        for feed_id in feed_ids:
+            self.add(feed_id, now, failures=failures.get(feed_id, 0))
+
+    def is_open(self, feed_id):
+        """Whether a feed's circuit is open (it is only being probed)"""
+        state = self.feeds.get(feed_id)
+        return state is not None and circuit_open(state['failures'], self.circuit_failures)
+
+    def poll_now(self, feed_id, now=None):
+        """Make a feed due immediately"""
+        now = self.clock() if now is None else now
+        if feed_id not in self.feeds:
+            self.add(feed_id, now, delay=0)
+        else:
+            self._push(feed_id, now)
+
+    def pop_due(self, now=None):
+        """Remove and return the IDs of all feeds that are due.
+
+        Popped feeds are not rescheduled until record_success,
+        record_failure or record_skip is called for them.
+        """
+        now = self.clock() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, feed_id = heapq.heappop(self.heap)
+            state = self.feeds.get(feed_id)
+            if state is None or state['due'] != when:
+                continue  # removed or rescheduled
+            state['due'] = None
+            due.append(feed_id)
+        return due
+
+    def seconds_until_due(self, now=None):
+        """Seconds until the next feed is due (None when nothing is scheduled)"""
+        now = self.clock() if now is None else now
+        while self.heap:
+            when, feed_id = self.heap[0]
+            state = self.feeds.get(feed_id)
+            if state is not None and state['due'] == when:
+                return max(0, when - now)
+            heapq.heappop(self.heap)
+        return None
+
+    def record_success(self, feed_id, new_posts, min_interval=None, now=None):
+        """Reschedule a feed after a successful poll"""
+        state = self.feeds.get(feed_id)
+        if state is None:
+            return
+        now = self.clock() if now is None else now
+
+        if state['last_check'] is not None:
+            elapsed = max(now - state['last_check'], 1)
+            sample = new_posts / elapsed
+            state['rate'] = RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * state['rate']
+        state['last_check'] = now
+        state['failures'] = 0
+        if min_interval is not None:
+            state['min_interval'] = min_interval
+
+        # Several polls per expected post, no longer apart than the freshness bound;
+        # the feed's own hints may still ask for longer
+        interval = 1 / (state['rate'] * self.polls_per_post) if state['rate'] > 0 else self.freshness_interval
+        interval = min(interval, self.freshness_interval)
+        floor = max(self.min_interval, state['min_interval'])
+        state['interval'] = min(max(interval, floor), self.max_interval)
+        self._push(feed_id, now + self._jitter(state['interval']))
+
+    def record_failure(self, feed_id, retry_after=None, now=None):
+        """Reschedule a failing feed with exponential backoff, or on the probe schedule once its circuit is open"""
+        state = self.feeds.get(feed_id)
+        if state is None:
+            return
+        now = self.clock() if now is None else now
+
+        state['failures'] += 1
+        if self.is_open(feed_id):
+            # Never probe more often than the feed would be polled when healthy
+            delay = max(self.probe_interval, state['interval'])
+        else:
+            delay = min(state['interval'] * 2 ** state['failures'], self.max_backoff)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self._push(feed_id, now + self._jitter(delay))
+
+    def record_skip(self, feed_id, now=None):
+        """Reschedule a feed that was not polled (e.g. no channel yet) one interval out, failures unchanged"""
+        state = self.feeds.get(feed_id)
+        if state is None:
+            return
+        now = self.clock() if now is None else now
+        self._push(feed_id, now + self._jitter(state['interval']))
+
+    def _jitter(self, delay):
+        return delay * self.random.uniform(1 - JITTER, 1 + JITTER)
+
+    def _push(self, feed_id, when):
+        self.feeds[feed_id]['due'] = when
+        heapq.heappush(self.heap, (when, feed_id))
+
+def circuit_open(failures, threshold=CIRCUIT_FAILURES):
+    """Whether failures consecutive failed polls are enough to open a feed's circuit"""
+    return threshold > 0 and failures >= threshold
+
+def retry_after_hint(headers):
+    """Seconds requested by a Retry-After header, if any"""
+    value = (headers or {}).get('retry-after')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def poll_interval_hint(headers, feed=None):
+    """Shortest polling interval (seconds) the publisher asks for, if any"""
+    hints = []
+
+    match = re.search(r'max-age\s*=\s*(\d+)', (headers or {}).get('cache-control', ''))
+    if match:
+        hints.append(int(match.group(1)))
+
+    if feed is not None and feed.get('feed'):
+        channel = feed['feed']
+        ttl = channel.get('ttl')
+        if ttl and str(ttl).strip().isdigit():
+            hints.append(int(ttl) * 60)
+
+        period = SY_UPDATE_PERIODS.get(str(channel.get('sy_updateperiod', '')).strip().lower())
+        if period:
+            try:
+                frequency = max(int(channel.get('sy_updatefrequency', 1)), 1)
+            except (TypeError, ValueError):
+                frequency = 1
+            hints.append(period / frequency)
+
+    return max(hints) if hints else None
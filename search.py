@@ -0,0 +1,59 @@
+import asyncio
+import discord
+from config import SEARCH_PAGE_SIZE
+
+# Discord limits for an embed field
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+
+def search_embed(query, page, results):
+    """Embed listing one page of search_history results"""
+    embed = discord.Embed(title=f"🔍 {query}"[:256], color=0x00AAFF)
+    if not results['posts']:
+        embed.description = "No posts found" if page == 0 else "No more posts"
+        return embed
+
+    for post in results['posts']:
+        source = f"[{post['feed_title']}]({post['link']})" if post['link'] else post['feed_title']
+        if post['published']:
+            source += f" · {post['published'][:10]}"
+        snippet = post['snippet'][:MAX_FIELD_VALUE - len(source) - 1]
+        embed.add_field(name=post['title'][:MAX_FIELD_NAME] or 'No Title',
+                        value=f"{snippet}\n{source}" if snippet else source, inline=False)
+    embed.set_footer(text=f"Page {page + 1}")
+    return embed
+
+class SearchResults(discord.ui.View):
+    """Previous/Next buttons for !search results; each page is queried when it is shown"""
+
+    def __init__(self, db, query, guild_id, author_id, page_size=SEARCH_PAGE_SIZE, timeout=300):
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.query = query
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.page_size = page_size
+        self.page = 0
+        self.results = None
+
+    async def load(self, page):
+        """Query one page and update the buttons; returns its embed"""
+        self.results = await asyncio.to_thread(
+            self.db.search_history, self.query, self.guild_id, self.page_size, page * self.page_size
+        )
+        self.page = page
+        self.previous.disabled = page == 0
+        self.next.disabled = not self.results['has_more']
+        return search_embed(self.query, page, self.results)
+
+    async def interaction_check(self, interaction):
+        # Only whoever searched turns the pages
+        return interaction.user.id == self.author_id
+
+    @discord.ui.button(label="⬅️ Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction, button):
+        await interaction.response.edit_message(embed=await self.load(max(0, self.page - 1)), view=self)
+
+    @discord.ui.button(label="Next ➡️", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction, button):
+        await interaction.response.edit_message(embed=await self.load(self.page + 1), view=self)
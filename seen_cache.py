@@ -0,0 +1,193 @@
+import math
+from collections import OrderedDict, deque
+from config import SEEN_CACHE_MB, SEEN_CACHE_FP_RATE
+
+# Smallest filter allocated for a feed, in expected items
+MIN_CAPACITY = 256
+
+# Exact recent post IDs remembered per feed until its poll size is known,
+# and their approximate cost in bytes
+RECENT_CAPACITY = 128
+RECENT_ID_BYTES = 120
+
+class BloomFilter:
+    """Fixed-size Bloom filter over MD5 post IDs"""
+
+    __slots__ = ('capacity', 'size', 'hashes', 'bits', 'count')
+
+    def __init__(self, capacity, fp_rate=SEEN_CACHE_FP_RATE):
+        self.capacity = max(capacity, MIN_CAPACITY)
+        self.size = max(64, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def _positions(self, post_id):
+        # Post IDs are already uniform hashes, so split them for double hashing
+        value = int.from_bytes(post_id, 'big') if isinstance(post_id, bytes) else int(post_id, 16)
+        h1 = (value >> 64) & 0xFFFFFFFFFFFFFFFF
+        h2 = (value & 0xFFFFFFFFFFFFFFFF) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, post_id):
+        for pos in self._positions(post_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, post_id):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(post_id))
+
+class FeedSeenSet:
+    """Seen-post membership for one feed: a Bloom filter plus the most recent exact IDs"""
+
+    __slots__ = ('bloom', 'recent', 'order', 'recent_capacity')
+
+    def __init__(self, bloom, recent_capacity=RECENT_CAPACITY):
+        self.bloom = bloom
+        self.recent = set()
+        self.order = deque()
+        self.recent_capacity = recent_capacity
+
+    @property
+    def nbytes(self):
+        return self.bloom.nbytes + self.recent_capacity * RECENT_ID_BYTES
+
+    def add(self, post_id):
+        self.bloom.add(post_id)
+        if post_id not in self.recent:
+            self.recent.add(post_id)
+            self.order.append(post_id)
+            if len(self.order) > self.recent_capacity:
+                self.recent.discard(self.order.popleft())
+
+class SeenPostCache:
+    """Per-feed seen-post sets kept within a memory budget.
+
+    A feed serves mostly the same entries on every poll, so recently seen IDs
+    are answered exactly from memory. Of the rest, an ID missing from the
+    Bloom filter has definitely never been seen and is inserted without a
+    lookup; only Bloom positives are confirmed in SQLite. Sets are evicted
+    least recently used first; an evicted or overfull feed is reloaded from
+    the database on its next check.
+    """
+
+    def __init__(self, budget_bytes=SEEN_CACHE_MB * 1024 * 1024, fp_rate=SEEN_CACHE_FP_RATE):
+        self.budget_bytes = budget_bytes
+        self.fp_rate = fp_rate
+        self.feeds = OrderedDict()
+        self.used_bytes = 0
+        self.warmed = False
+        self.stats = {
+            'recent_hits': 0,
+            'definite_misses': 0,
+            'maybe_seen': 0,
+            'false_positives': 0,
+            'cold_lookups': 0,
+            'loads': 0,
+            'evictions': 0
+        }
+
+    def _store(self, feed_id, seen_set):
+        self.discard(feed_id)
+        if seen_set.nbytes > self.budget_bytes:
+            return None
+
+        while self.used_bytes + seen_set.nbytes > self.budget_bytes and self.feeds:
+            _, evicted = self.feeds.popitem(last=False)
+            self.used_bytes -= evicted.nbytes
+            self.stats['evictions'] += 1
+
+        self.feeds[feed_id] = seen_set
+        self.used_bytes += seen_set.nbytes
+        return seen_set
+
+    def build(self, feed_id, post_ids):
+        """Create a feed's seen set from its seen post IDs, oldest first"""
+        post_ids = list(post_ids)
+        # Leave headroom so the filter absorbs new posts before it needs a reload
+        seen_set = FeedSeenSet(BloomFilter(2 * len(post_ids), self.fp_rate))
+        for post_id in post_ids:
+            seen_set.add(post_id)
+        self.stats['loads'] += 1
+        return self._store(feed_id, seen_set)
+
+    def get(self, feed_id):
+        seen_set = self.feeds.get(feed_id)
+        if seen_set is not None:
+            self.feeds.move_to_end(feed_id)
+        return seen_set
+
+    def discard(self, feed_id):
+        seen_set = self.feeds.pop(feed_id, None)
+        if seen_set is not None:
+            self.used_bytes -= seen_set.nbytes
+
+    def warm(self, db, keep=None):
+        """Build seen sets for every feed (or those keep(feed_id) accepts) from the posts table"""
+        current_id, current_ids = None, []
+        for feed_id, post_id in db.iter_post_ids():
+            if keep is not None and not keep(feed_id):
+                continue
+            if feed_id != current_id:
+                if current_id is not None:
+                    self.build(current_id, current_ids)
+                current_id, current_ids = feed_id, []
+            current_ids.append(post_id)
+        if current_id is not None:
+            self.build(current_id, current_ids)
+        self.warmed = True
+
+    def split(self, feed_id, post_ids, db):
+        """Classify post IDs as (seen, definitely unseen, possibly seen).
+
+        Returns None when the feed has no seen set and it cannot be loaded,
+        in which case every ID must be checked in the database.
+        """
+        seen_set = self.get(feed_id)
+        if seen_set is None or seen_set.bloom.full:
+            seen_set = self.build(feed_id, db.get_post_ids(feed_id))
+            if seen_set is None:
+                self.stats['cold_lookups'] += len(post_ids)
+                return None
+
+        # Remember twice what the feed serves, so one poll never pushes out the next
+        needed = 2 * len(post_ids)
+        if needed > seen_set.recent_capacity:
+            # Stored again at its new size, evicting other feeds' sets to stay within the budget
+            self.discard(feed_id)
+            seen_set.recent_capacity = needed
+            if self._store(feed_id, seen_set) is None:
+                self.stats['cold_lookups'] += len(post_ids)
+                return None
+
+        seen, unseen, maybe_seen = [], [], []
+        recent, bloom = seen_set.recent, seen_set.bloom
+        for post_id in post_ids:
+            if post_id in recent:
+                seen.append(post_id)
+            elif post_id in bloom:
+                maybe_seen.append(post_id)
+            else:
+                unseen.append(post_id)
+
+        self.stats['recent_hits'] += len(seen)
+        self.stats['definite_misses'] += len(unseen)
+        self.stats['maybe_seen'] += len(maybe_seen)
+        return seen, unseen, maybe_seen
+
+    def record(self, feed_id, post_ids):
+        """Add checked post IDs to the feed's seen set"""
+        seen_set = self.feeds.get(feed_id)
+        if seen_set is None:
+            return
+        for post_id in post_ids:
+            seen_set.add(post_id)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import deque
+from config import TURN_ITEMS, TURN_SECONDS
+
+# Most items handed to a feed's handler at once; the time budget is checked between chunks
+TURN_CHUNK = 50
+
+class FeedWork:
+    """A feed's remaining items in this cycle and what to do with them"""
+    __slots__ = ('feed_id', 'items', 'handler', 'cost', 'deficit', 'turns')
+
+    def __init__(self, feed_id, items, handler, cost):
+        self.feed_id = feed_id
+        self.items = deque(items)
+        self.handler = handler
+        self.cost = max(1, cost)
+        self.deficit = 0
+        self.turns = 0
+
+class TurnScheduler:
+    """Interleaves per-feed work in round-robin turns (deficit round robin).
+
+    Each turn a feed may spend up to `items` units of work, where an item
+    costs `cost` units (e.g. one per channel a post goes to), and at most
+    `seconds`. Whatever is left goes to the back of the line with the unused
+    allowance, for its next turn. Work can be added while run() is waiting on
+    its producer, so feeds are served as they arrive, and the event loop
+    runs between turns. With items=0 there is no budget: run() waits for the
+    producer, then does each feed's work in one go, in the order it was added.
+    """
+
+    def __init__(self, items=TURN_ITEMS, seconds=TURN_SECONDS, clock=time.perf_counter):
+        self.items = items
+        self.seconds = seconds
+        self.clock = clock
+        self.line = deque()
+        self.ready = asyncio.Event()
+        self.last_stats = {'feeds': 0, 'turns': 0, 'carried': 0}
+
+    def add(self, feed_id, items, handler, cost=1):
+        """Queue a feed's items; handler(chunk) is awaited for each chunk of them"""
+        if items:
+            self.line.append(FeedWork(feed_id, items, handler, cost))
+            self.ready.set()
+
+    async def run(self, producer=None):
+        """Work through everything added, including what is added until producer is done; returns its result"""
+        stats = self.last_stats = {'feeds': 0, 'turns': 0, 'carried': 0}
+        producer = asyncio.ensure_future(producer) if producer is not None else None
+        try:
+            if self.items <= 0 and producer is not None:
+                await asyncio.wait((producer,))
+            while True:
+                if not self.line:
+                    if producer is None or producer.done():
+                        break
+                    self.ready.clear()
+                    waiter = asyncio.ensure_future(self.ready.wait())
+                    await asyncio.wait((producer, waiter), return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    continue
+                await self.turn(self.line.popleft(), stats)
+        finally:
+            if producer is not None and not producer.done():
+                producer.cancel()
+        return producer.result() if producer is not None else None
+
+    async def turn(self, work, stats):
+        if work.turns == 0:
+            stats['feeds'] += 1
+        work.turns += 1
+        stats['turns'] += 1
+        if self.items <= 0:
+            await work.handler(list(work.items))
+            return
+
+        work.deficit += self.items
+        started = self.clock()
+        while work.items and work.deficit >= work.cost and self.clock() - started < self.seconds:
+            count = min(len(work.items), work.deficit // work.cost, TURN_CHUNK)
+            work.deficit -= count * work.cost
+            await work.handler([work.items.popleft() for _ in range(count)])
+
+        if work.items:
+            if work.turns == 1:
+                stats['carried'] += 1
+            self.line.append(work)
+        # Let fetches, delivery workers and the gateway run before the next turn
+        await asyncio.sleep(0)